@@ -0,0 +1,56 @@
+"""add the auth tenant closure table
+
+Revision ID: 2864e92c63cc
+Revises: a62f0d7088b9
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.schema import Column
+
+# revision identifiers, used by Alembic.
+revision = '2864e92c63cc'
+down_revision = 'a62f0d7088b9'
+
+TABLE_NAME = 'auth_tenant_closure'
+DESCENDANT_INDEX = 'auth_tenant_closure__idx__descendant_uuid'
+
+
+def upgrade():
+    op.create_table(
+        TABLE_NAME,
+        Column(
+            'ancestor_uuid',
+            sa.String(38),
+            sa.ForeignKey('auth_tenant.uuid', ondelete='CASCADE'),
+            primary_key=True,
+        ),
+        Column(
+            'descendant_uuid',
+            sa.String(38),
+            sa.ForeignKey('auth_tenant.uuid', ondelete='CASCADE'),
+            primary_key=True,
+        ),
+        Column('depth', sa.Integer, nullable=False),
+    )
+    op.create_index(DESCENDANT_INDEX, TABLE_NAME, ['descendant_uuid'])
+    op.execute(
+        '''
+        WITH RECURSIVE closure(ancestor_uuid, descendant_uuid, depth) AS (
+            SELECT uuid, uuid, 0 FROM auth_tenant
+        UNION ALL
+            SELECT closure.ancestor_uuid, auth_tenant.uuid, closure.depth + 1
+            FROM closure
+            JOIN auth_tenant ON auth_tenant.parent_uuid = closure.descendant_uuid
+            WHERE auth_tenant.uuid != auth_tenant.parent_uuid
+        )
+        INSERT INTO auth_tenant_closure (ancestor_uuid, descendant_uuid, depth)
+        SELECT ancestor_uuid, descendant_uuid, depth FROM closure
+        '''
+    )
+
+
+def downgrade():
+    op.drop_index(DESCENDANT_INDEX, table_name=TABLE_NAME)
+    op.drop_table(TABLE_NAME)
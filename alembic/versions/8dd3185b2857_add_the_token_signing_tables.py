@@ -0,0 +1,43 @@
+"""add the token signing key and token revocation tables
+
+Revision ID: 8dd3185b2857
+Revises: c51a7c8ebe47
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.schema import Column
+
+# revision identifiers, used by Alembic.
+revision = '8dd3185b2857'
+down_revision = 'c51a7c8ebe47'
+
+KEY_TABLE_NAME = 'auth_token_signing_key'
+REVOCATION_TABLE_NAME = 'auth_token_revocation'
+EXPIRE_T_INDEX = 'auth_token_revocation__idx__expire_t'
+REVOKED_AT_INDEX = 'auth_token_revocation__idx__revoked_at'
+
+
+def upgrade():
+    op.create_table(
+        KEY_TABLE_NAME,
+        Column('kid', sa.String(36), primary_key=True),
+        Column('private_key', sa.Text, nullable=False),
+        Column('created_at', sa.Integer, nullable=False),
+    )
+    op.create_table(
+        REVOCATION_TABLE_NAME,
+        Column('uuid', sa.String(38), primary_key=True),
+        Column('expire_t', sa.Integer, nullable=False),
+        Column('revoked_at', sa.Integer, nullable=False),
+    )
+    op.create_index(EXPIRE_T_INDEX, REVOCATION_TABLE_NAME, ['expire_t'])
+    op.create_index(REVOKED_AT_INDEX, REVOCATION_TABLE_NAME, ['revoked_at'])
+
+
+def downgrade():
+    op.drop_index(REVOKED_AT_INDEX, table_name=REVOCATION_TABLE_NAME)
+    op.drop_index(EXPIRE_T_INDEX, table_name=REVOCATION_TABLE_NAME)
+    op.drop_table(REVOCATION_TABLE_NAME)
+    op.drop_table(KEY_TABLE_NAME)
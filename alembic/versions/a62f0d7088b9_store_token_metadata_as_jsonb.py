@@ -0,0 +1,40 @@
+"""store token metadata as jsonb
+
+Revision ID: a62f0d7088b9
+Revises: d749428f1ea3
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+# revision identifiers, used by Alembic.
+revision = 'a62f0d7088b9'
+down_revision = 'd749428f1ea3'
+
+TABLE = 'auth_token'
+COL = 'metadata'
+INDEXES = {
+    'auth_token__idx__metadata_tenant_uuid': "(metadata->>'tenant_uuid')",
+    'auth_token__idx__metadata_uuid': "(metadata->>'uuid')",
+}
+
+
+def upgrade():
+    op.alter_column(
+        TABLE,
+        COL,
+        type_=JSONB,
+        postgresql_using="COALESCE(NULLIF(metadata, ''), '{}')::jsonb",
+    )
+    op.alter_column(TABLE, COL, server_default=sa.text("'{}'"))
+    for name, expression in INDEXES.items():
+        op.create_index(name, TABLE, [sa.text(expression)])
+
+
+def downgrade():
+    for name in INDEXES:
+        op.drop_index(name, table_name=TABLE)
+    op.alter_column(TABLE, COL, server_default=None)
+    op.alter_column(TABLE, COL, type_=sa.Text, postgresql_using='metadata::text')
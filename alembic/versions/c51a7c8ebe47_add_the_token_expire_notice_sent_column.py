@@ -0,0 +1,34 @@
+"""add the token expire notice sent column
+
+Revision ID: c51a7c8ebe47
+Revises: 2864e92c63cc
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c51a7c8ebe47'
+down_revision = '2864e92c63cc'
+
+TABLE_NAME = 'auth_token'
+EXPIRE_T_INDEX = 'auth_token__idx__expire_t'
+
+
+def upgrade():
+    op.add_column(
+        TABLE_NAME,
+        sa.Column(
+            'expire_notice_sent',
+            sa.Boolean,
+            nullable=False,
+            server_default='false',
+        ),
+    )
+    op.create_index(EXPIRE_T_INDEX, TABLE_NAME, ['expire_t'])
+
+
+def downgrade():
+    op.drop_index(EXPIRE_T_INDEX, table_name=TABLE_NAME)
+    op.drop_column(TABLE_NAME, 'expire_notice_sent')
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Compare the ACL matching engines for different ACL sizes
+
+usage: python3 benchmarks/access_check.py
+"""
+
+import random
+import re
+import timeit
+
+from wazo_auth.access import (
+    AccessCheck,
+    access_to_pattern,
+    access_to_regex,
+    get_access_check,
+)
+from wazo_auth.token import Token
+
+AUTH_ID = '2b4c5a3e-5cc6-4a37-8a3b-d1d9c4e5c1f0'
+SIZES = (10, 100, 1000)
+SERVICES = ['auth', 'calld', 'confd', 'dird', 'chatd', 'webhookd', 'call-logd']
+RESOURCES = ['users', 'lines', 'calls', 'contacts', 'rooms', 'groups', 'policies']
+ACTIONS = ['read', 'create', 'update', 'delete']
+
+
+def generate_acl(size, rnd):
+    acl = []
+    while len(acl) < size:
+        service = rnd.choice(SERVICES)
+        resource = '{}{}'.format(rnd.choice(RESOURCES), len(acl))
+        kind = rnd.random()
+        if kind < 0.1:
+            access = '{}.{}.#'.format(service, resource)
+        elif kind < 0.3:
+            access = '{}.{}.*.{}'.format(service, resource, rnd.choice(ACTIONS))
+        elif kind < 0.4:
+            access = '{}.users.me.{}.{}'.format(service, resource, rnd.choice(ACTIONS))
+        elif kind < 0.45:
+            access = '!{}.{}.*.delete'.format(service, resource)
+        else:
+            access = '{}.{}.{}'.format(service, resource, rnd.choice(ACTIONS))
+        acl.append(access)
+    return acl
+
+
+def generate_required_accesses(acl, rnd, count=200):
+    result = []
+    for _ in range(count):
+        access = rnd.choice(acl).lstrip('!')
+        access = access.replace('*', '42').replace('#', 'foo.bar')
+        if rnd.random() < 0.3:
+            access = access.replace('me', AUTH_ID)
+        if rnd.random() < 0.3:
+            access = access + '.missing'
+        result.append(access)
+    return result
+
+
+class OneRegexPerAccess:
+    def __init__(self, auth_id, acl):
+        self._positives = [access_to_regex(a, auth_id) for a in acl if a[0] != '!']
+        self._negatives = [access_to_regex(a[1:], auth_id) for a in acl if a[0] == '!']
+
+    def matches_required_access(self, required_access):
+        if any(regex.match(required_access) for regex in self._negatives):
+            return False
+        return any(regex.match(required_access) for regex in self._positives)
+
+
+class CombinedRegex:
+    def __init__(self, auth_id, acl):
+        self._positive = self._compile([a for a in acl if a[0] != '!'], auth_id)
+        self._negative = self._compile([a[1:] for a in acl if a[0] == '!'], auth_id)
+
+    def _compile(self, acl, auth_id):
+        patterns = '|'.join(access_to_pattern(access, auth_id) for access in acl)
+        return re.compile('^(?:{})$'.format(patterns))
+
+    def matches_required_access(self, required_access):
+        if self._negative.match(required_access):
+            return False
+        return bool(self._positive.match(required_access))
+
+
+def main():
+    rnd = random.Random(42)
+    engines = [
+        ('one regex per access', OneRegexPerAccess),
+        ('combined regex', CombinedRegex),
+        ('access check', AccessCheck),
+    ]
+    for size in SIZES:
+        acl = generate_acl(size, rnd)
+        required_accesses = generate_required_accesses(acl, rnd)
+        print('ACL of {} entries'.format(size))
+        for name, engine in engines:
+            access_check = engine(AUTH_ID, acl)
+
+            def run():
+                for required_access in required_accesses:
+                    access_check.matches_required_access(required_access)
+
+            best = min(timeit.repeat(run, number=20, repeat=5))
+            per_check = best / (20 * len(required_accesses)) * 1e6
+            print('  {:<22} {:8.2f} us/check'.format(name, per_check))
+
+        scopes = set(required_accesses)
+        token = Token(None, AUTH_ID, None, None, None, None, acl, {}, None, None, None)
+
+        def lookup_per_scope():
+            for scope in scopes:
+                get_access_check(AUTH_ID, tuple(acl)).matches_required_access(scope)
+
+        def batch():
+            token.matches_required_accesses(scopes)
+
+        print('  {} scopes at once'.format(len(scopes)))
+        for name, run in [('lookup per scope', lookup_per_scope), ('batch', batch)]:
+            best = min(timeit.repeat(run, number=20, repeat=5))
+            print('    {:<20} {:8.2f} us/request'.format(name, best / 20 * 1e6))
+
+
+if __name__ == '__main__':
+    main()
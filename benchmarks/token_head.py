@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Compare the work done by HEAD /token/<token> before and after the fast path
+
+The database is replaced by an in-memory DAO, only the time spent in
+wazo-auth is measured, with and without the token cache.
+
+usage: python3 benchmarks/token_head.py
+"""
+
+import time
+import timeit
+import uuid
+
+from unittest.mock import Mock
+
+from wazo_auth.cache import LRUCache
+from wazo_auth.services import TokenService
+
+TENANT_UUID = str(uuid.uuid4())
+USER_UUID = str(uuid.uuid4())
+ACL = ['confd.users.me.#', 'calld.#', 'auth.users.me.#', '!auth.users.me.password']
+ACL += ['service{}.resource.*.read'.format(i) for i in range(50)]
+CONFIG = {'default_token_lifetime': 7200}
+
+
+class InMemoryTokenDAO:
+    def __init__(self):
+        self._tokens = {}
+
+    def add(self):
+        token_uuid = str(uuid.uuid4())
+        self._tokens[token_uuid] = {
+            'uuid': token_uuid,
+            'auth_id': USER_UUID,
+            'pbx_user_uuid': USER_UUID,
+            'xivo_uuid': str(uuid.uuid4()),
+            'issued_t': time.time(),
+            'expire_t': time.time() + 7200,
+            'acl': list(ACL),
+            'metadata': {
+                'uuid': USER_UUID,
+                'tenant_uuid': TENANT_UUID,
+                'auth_id': USER_UUID,
+                'pbx_user_uuid': USER_UUID,
+                'xivo_uuid': str(uuid.uuid4()),
+                'purpose': 'user',
+            },
+            'session_uuid': str(uuid.uuid4()),
+            'remote_addr': '127.0.0.1',
+            'user_agent': 'benchmark',
+        }
+        return token_uuid
+
+    def get(self, token_uuid):
+        return dict(self._tokens[token_uuid])
+
+    def get_access(self, token_uuid):
+        token = self._tokens[token_uuid]
+        return {
+            'auth_id': token['auth_id'],
+            'expire_t': token['expire_t'],
+            'acl': token['acl'],
+            'metadata': {
+                'uuid': token['metadata']['uuid'],
+                'tenant_uuid': token['metadata']['tenant_uuid'],
+            },
+        }
+
+
+def head_before(token_service, token_uuid, scope, tenant):
+    token = token_service.get(token_uuid, scope).to_dict()
+    token_service.assert_has_tenant_permission(token, tenant)
+
+
+def head_after(token_service, token_uuid, scope, tenant):
+    token_service.check(token_uuid, scope, tenant)
+
+
+def main():
+    token_dao = InMemoryTokenDAO()
+    dao = Mock(token=token_dao)
+    user_service = Mock()
+    user_service.user_has_sub_tenant.return_value = True
+    token_uuid = token_dao.add()
+
+    for cache_size in (0, 100):
+        token_service = TokenService(
+            CONFIG, dao, Mock(), Mock(), user_service, LRUCache(max_size=cache_size)
+        )
+        print('token cache size: {}'.format(cache_size))
+        for name, head in [('before', head_before), ('after', head_after)]:
+
+            def run():
+                head(token_service, token_uuid, 'calld.calls.read', TENANT_UUID)
+
+            best = min(timeit.repeat(run, number=10000, repeat=5))
+            print('  {:<8} {:8.2f} us/request'.format(name, best / 10000 * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Measure the memory used by the cached tokens and the expiration timers
+
+The timers of the live tokens are then fired second by second to check that
+none of them fires late.
+
+usage: python3 benchmarks/token_memory.py
+"""
+
+import time
+import tracemalloc
+import uuid
+
+from wazo_auth.cache import LRUCache
+from wazo_auth.token import TimingWheel, Token
+
+CACHED_TOKENS = 100000
+LIVE_TOKENS = 500000
+TOKEN_LIFETIME = 7200
+ACL = ['confd.users.me.#', 'calld.#', '!auth.users.me.password.edit']
+
+
+def measure(fn):
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        result = fn()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, after - before
+
+
+def fill_token_cache():
+    tenant_uuid = str(uuid.uuid4())
+    cache = LRUCache(max_size=CACHED_TOKENS)
+    now = time.time()
+    for i in range(CACHED_TOKENS):
+        token_uuid = user_uuid = '{:036}'.format(i)
+        token = Token(
+            token_uuid,
+            auth_id=user_uuid,
+            pbx_user_uuid=None,
+            xivo_uuid=tenant_uuid,
+            issued_t=now,
+            expire_t=now + 3600,
+            acl=ACL,
+            metadata={'uuid': user_uuid, 'tenant_uuid': tenant_uuid},
+            session_uuid='{:036}'.format(i),
+            user_agent='',
+            remote_addr='',
+        )
+        cache.set(token_uuid, token, expire_at=token.expire_t)
+    return cache
+
+
+def main():
+    _, used = measure(fill_token_cache)
+    print('{} cached tokens'.format(CACHED_TOKENS))
+    print('  {:8.0f} bytes/token'.format(used / CACHED_TOKENS))
+
+    now = 1000000.0
+    token_uuids = ['{:036}'.format(i) for i in range(LIVE_TOKENS)]
+    wheel = TimingWheel(resolution=1.0, now=now)
+
+    def fill_wheel():
+        for i, token_uuid in enumerate(token_uuids):
+            expire_t = now + i % TOKEN_LIFETIME
+            wheel.add(token_uuid, expire_t + 0.5, expire_t)
+
+    _, used = measure(fill_wheel)
+    print('{} expiration timers'.format(LIVE_TOKENS))
+    print('  {:8.0f} bytes/timer'.format(used / LIVE_TOKENS))
+
+    late = 0
+    start = time.monotonic()
+    for second in range(1, TOKEN_LIFETIME + 2):
+        for _, expire_t in wheel.advance(now + second):
+            if now + second - expire_t > 1:
+                late += 1
+    elapsed = time.monotonic() - start
+    print('  {:8.2f} us/timer fired, {} late'.format(elapsed / LIVE_TOKENS * 1e6, late))
+
+
+if __name__ == '__main__':
+    main()
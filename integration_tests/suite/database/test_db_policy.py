@@ -10,6 +10,8 @@ from hamcrest import (
     empty,
     equal_to,
     has_entries,
+    has_items,
+    has_length,
     not_,
 )
 from xivo_test_helpers.hamcrest.raises import raises
@@ -105,6 +107,19 @@ class TestPolicyDAO(base.DAOTestCase):
         result = self._policy_dao.get(uuid=UNKNOWN_UUID)
         assert_that(result, empty())
 
+    def test_default_admin_policy_can_read_the_status_and_signed_token_keys(self):
+        policy = self.get_policy(self._default_admin_policy_uuid)
+        assert_that(
+            policy,
+            has_entries(
+                acl=has_items(
+                    'auth.status.read',
+                    'auth.tokens.keys.read',
+                    'auth.tokens.revoked.read',
+                )
+            ),
+        )
+
     def test_get_sort_and_pagination(self):
         with self._new_policy('a', 'z') as a, self._new_policy(
             'b', 'y'
@@ -228,6 +243,35 @@ class TestPolicyDAO(base.DAOTestCase):
             ),
         )
 
+    @fixtures.db.policy(name='backend', acl=['backend.acl', 'shared.acl'])
+    @fixtures.db.policy(acl=['group.acl', 'shared.acl'])
+    @fixtures.db.policy(acl=['user.acl', 'shared.acl'])
+    @fixtures.db.group()
+    @fixtures.db.user(username='alice')
+    def test_get_effective_acl(
+        self, user_uuid, group_uuid, user_policy, group_policy, _
+    ):
+        assert_that(self._policy_dao.get_effective_acl('alice'), empty())
+
+        self._user_dao.add_policy(user_uuid, user_policy)
+        self._group_dao.add_policy(group_uuid, group_policy)
+        self._group_dao.add_user(group_uuid, user_uuid)
+
+        with self.recorded_queries() as statements:
+            result = self._policy_dao.get_effective_acl('alice', 'backend')
+
+        assert_that(
+            result,
+            contains_inanyorder('user.acl', 'group.acl', 'backend.acl', 'shared.acl'),
+        )
+        assert_that(statements, has_length(1))
+
+        result = self._policy_dao.get_effective_acl('alice')
+        assert_that(result, contains_inanyorder('user.acl', 'group.acl', 'shared.acl'))
+
+        result = self._policy_dao.get_effective_acl('unknown', 'backend')
+        assert_that(result, contains_inanyorder('backend.acl', 'shared.acl'))
+
     @fixtures.db.policy()
     def test_delete(self, uuid):
         assert_that(
@@ -10,10 +10,14 @@ from hamcrest import (
     calling,
     contains,
     contains_inanyorder,
+    contains_string,
     empty,
     equal_to,
     has_entries,
+    has_item,
+    has_items,
     has_properties,
+    not_,
     raises,
 )
 
@@ -106,6 +110,48 @@ class TestTenantDAO(base.DAOTestCase):
             ),
         )
 
+    @fixtures.db.tenant()
+    def test_scoped_list_does_not_query_the_top_tenant(self, tenant_uuid):
+        self._tenant_dao.find_top_tenant()
+
+        with self.recorded_queries() as statements:
+            self._tenant_dao.list_visible_tenants(tenant_uuid)
+            self._tenant_dao.list_visible_tenants(self.top_tenant_uuid)
+            self._create_tenant(parent_uuid=tenant_uuid)
+            self._create_tenant()
+
+        top_tenant_query = 'auth_tenant.uuid = auth_tenant.parent_uuid'
+        assert_that(statements, not_(has_item(contains_string(top_tenant_query))))
+
+    @fixtures.db.tenant()
+    def test_list_parents(self, tenant_uuid):
+        top_uuid = self._top_tenant_uuid()
+        sub_tenant_uuid = self._create_tenant(parent_uuid=tenant_uuid)
+
+        result = self._tenant_dao.list_parents()
+
+        assert_that(
+            result,
+            has_items(
+                (top_uuid, top_uuid),
+                (tenant_uuid, top_uuid),
+                (sub_tenant_uuid, tenant_uuid),
+            ),
+        )
+
+    @fixtures.db.tenant()
+    @fixtures.db.tenant()
+    def test_is_under(self, tenant_uuid, other_uuid):
+        top_uuid = self._top_tenant_uuid()
+        sub_tenant_uuid = self._create_tenant(parent_uuid=tenant_uuid)
+
+        assert_that(self._tenant_dao.is_under(sub_tenant_uuid, tenant_uuid))
+        assert_that(self._tenant_dao.is_under(sub_tenant_uuid, top_uuid))
+        assert_that(self._tenant_dao.is_under(sub_tenant_uuid))
+        assert_that(self._tenant_dao.is_under(tenant_uuid, tenant_uuid))
+        assert_that(not self._tenant_dao.is_under(tenant_uuid, sub_tenant_uuid))
+        assert_that(not self._tenant_dao.is_under(sub_tenant_uuid, other_uuid))
+
     @fixtures.db.tenant(name='c')
     @fixtures.db.tenant(name='b')
     @fixtures.db.tenant(name='a')
@@ -193,6 +239,24 @@ class TestTenantDAO(base.DAOTestCase):
             raises(exceptions.MasterTenantConflictException),
         )
 
+    @fixtures.db.tenant()
+    def test_tenant_closure(self, tenant_uuid):
+        top_uuid = self._top_tenant_uuid()
+        sub_tenant_uuid = self._create_tenant(parent_uuid=tenant_uuid)
+
+        assert_that(
+            self._list_ancestors(sub_tenant_uuid),
+            contains_inanyorder((top_uuid, 2), (tenant_uuid, 1), (sub_tenant_uuid, 0)),
+        )
+        assert_that(
+            self._list_ancestors(tenant_uuid),
+            contains_inanyorder((top_uuid, 1), (tenant_uuid, 0)),
+        )
+
+        self._tenant_dao.delete(sub_tenant_uuid)
+
+        assert_that(self._list_ancestors(sub_tenant_uuid), empty())
+
     @fixtures.db.tenant()
     def test_delete(self, tenant_uuid):
         self._tenant_dao.delete(tenant_uuid)
@@ -279,6 +343,15 @@ class TestTenantDAO(base.DAOTestCase):
         kwargs.setdefault('contact_uuid', None)
         return self._tenant_dao.create(**kwargs)
 
+    def _list_ancestors(self, tenant_uuid):
+        return (
+            self.session.query(
+                models.TenantClosure.ancestor_uuid, models.TenantClosure.depth
+            )
+            .filter(models.TenantClosure.descendant_uuid == tenant_uuid)
+            .all()
+        )
+
     def _top_tenant_uuid(self):
         return (
             self.session.query(models.Tenant.uuid)
@@ -7,9 +7,15 @@ import uuid
 from hamcrest import (
     all_of,
     assert_that,
+    contains,
+    contains_inanyorder,
+    contains_string,
+    empty,
     equal_to,
     has_entries,
+    has_item,
     has_items,
+    has_length,
     has_properties,
     not_,
 )
@@ -19,6 +25,8 @@ from wazo_auth.database import models
 from ..helpers import base, fixtures
 
 SESSION_UUID_1 = str(uuid.uuid4())
+TENANT_UUID = str(uuid.uuid4())
+USER_UUID = str(uuid.uuid4())
 
 
 class TestTokenDAO(base.DAOTestCase):
@@ -47,6 +55,27 @@ class TestTokenDAO(base.DAOTestCase):
             result, has_entries(uuid=token_uuid, session_uuid=session_uuid, **body)
         )
 
+    def test_create_does_not_query_the_top_tenant(self):
+        now = int(time.time())
+        body = {
+            'auth_id': 'test',
+            'pbx_user_uuid': None,
+            'xivo_uuid': None,
+            'issued_t': now,
+            'expire_t': now + 120,
+            'acl': [],
+            'metadata': {},
+            'user_agent': '',
+            'remote_addr': '',
+        }
+        self._token_dao.create(dict(body), {})
+
+        with self.recorded_queries() as statements:
+            for _ in range(3):
+                self._token_dao.create(dict(body), {})
+
+        assert_that(statements, not_(has_item(contains_string('auth_tenant'))))
+
     @fixtures.db.token()
     @fixtures.db.token()
     @fixtures.db.token()
@@ -57,6 +86,38 @@ class TestTokenDAO(base.DAOTestCase):
         result = self._token_dao.get(token['uuid'])
         assert_that(result, equal_to(token))
 
+    @fixtures.db.token()
+    @fixtures.db.token()
+    @fixtures.db.token()
+    def test_list(self, token_1, token_2, _):
+        result = self._token_dao.list_(
+            uuids=[token_1['uuid'], token_2['uuid'], 'unknown']
+        )
+        assert_that(result, contains_inanyorder(token_1, token_2))
+
+        result = self._token_dao.list_(uuids=[])
+        assert_that(result, empty())
+
+    @fixtures.db.token(auth_id=USER_UUID)
+    @fixtures.db.token(auth_id=USER_UUID, expiration=3600)
+    @fixtures.db.token()
+    def test_list_sessions(self, token_1, token_2, _):
+        result = self._token_dao.list_sessions(USER_UUID)
+
+        assert_that(
+            result,
+            contains_inanyorder(
+                {
+                    'session_uuid': token_1['session_uuid'],
+                    'expire_t': token_1['expire_t'],
+                },
+                {
+                    'session_uuid': token_2['session_uuid'],
+                    'expire_t': token_2['expire_t'],
+                },
+            ),
+        )
+
     @fixtures.db.token()
     def test_delete(self, token):
         self._token_dao.delete(token['uuid'])
@@ -65,6 +126,22 @@ class TestTokenDAO(base.DAOTestCase):
         )
         self._token_dao.delete(token['uuid'])  # No error on delete unknown
 
+    def test_is_partitioned(self):
+        assert_that(self._token_dao.is_partitioned(), equal_to(False))
+
+    @fixtures.db.token(expiration=3600)
+    @fixtures.db.token()
+    def test_list_expirations(self, token_1, token_2):
+        result = list(self._token_dao.list_expirations(batch_size=1))
+
+        assert_that(
+            result,
+            has_items(
+                (token_1['uuid'], token_1['expire_t']),
+                (token_2['uuid'], token_2['expire_t']),
+            ),
+        )
+
     @fixtures.db.token(expiration=0)
     @fixtures.db.token(expiration=0)
     @fixtures.db.token()
@@ -111,3 +188,78 @@ class TestTokenDAO(base.DAOTestCase):
                 not_(has_items(has_properties(uuid=token_3['uuid']))),
             ),
         )
+
+    @fixtures.db.token(expiration=0)
+    @fixtures.db.token(expiration=0, metadata={'tenant_uuid': TENANT_UUID})
+    def test_delete_expired_tokens_and_sessions_in_batches(self, token_1, token_2):
+        tokens, sessions = self._token_dao.delete_expired_tokens_and_sessions(1)
+        assert_that(tokens, has_length(1))
+        assert_that(sessions, contains(has_entries(uuid=tokens[0]['session_uuid'])))
+
+        tokens, sessions = self._token_dao.delete_expired_tokens_and_sessions(1)
+        assert_that(tokens, has_length(1))
+        assert_that(sessions, has_length(1))
+
+        tokens, sessions = self._token_dao.delete_expired_tokens_and_sessions(1)
+        assert_that(tokens, empty())
+        assert_that(sessions, empty())
+
+    @fixtures.db.token(expiration=0)
+    @fixtures.db.token(expiration=0)
+    def test_delete_expired_tokens_and_sessions_by_uuid(self, token_1, token_2):
+        tokens, sessions = self._token_dao.delete_expired_tokens_and_sessions(
+            token_uuids=[token_1['uuid']]
+        )
+
+        assert_that(tokens, contains(has_entries(uuid=token_1['uuid'])))
+        assert_that(sessions, contains(has_entries(uuid=token_1['session_uuid'])))
+
+        tokens = self.session.query(models.Token).all()
+        assert_that(tokens, has_items(has_properties(uuid=token_2['uuid'])))
+
+    @fixtures.db.token()
+    @fixtures.db.token()
+    def test_mark_tokens_and_sessions_that_expire_soon_by_uuid(self, token_1, token_2):
+        tokens, sessions = self._token_dao.mark_tokens_and_sessions_that_expire_soon(
+            600, token_uuids=[token_1['uuid']]
+        )
+
+        assert_that(tokens, contains(has_entries(uuid=token_1['uuid'])))
+        assert_that(sessions, contains(has_entries(uuid=token_1['session_uuid'])))
+
+    @fixtures.db.token(metadata={'tenant_uuid': TENANT_UUID, 'uuid': USER_UUID})
+    @fixtures.db.token(metadata={'uuid': USER_UUID})
+    @fixtures.db.token(expiration=3600)
+    def test_mark_tokens_and_sessions_that_expire_soon(self, token_1, token_2, token_3):
+        tokens, sessions = self._token_dao.mark_tokens_and_sessions_that_expire_soon(
+            600
+        )
+
+        assert_that(
+            tokens,
+            all_of(
+                has_items(
+                    has_entries(
+                        uuid=token_1['uuid'],
+                        auth_id=token_1['auth_id'],
+                        session_uuid=token_1['session_uuid'],
+                        tenant_uuid=TENANT_UUID,
+                    ),
+                    has_entries(uuid=token_2['uuid'], tenant_uuid=None),
+                ),
+                not_(has_items(has_entries(uuid=token_3['uuid']))),
+            ),
+        )
+        assert_that(
+            sessions,
+            has_items(
+                has_entries(uuid=token_1['session_uuid']),
+                has_entries(uuid=token_2['session_uuid']),
+            ),
+        )
+
+        tokens, sessions = self._token_dao.mark_tokens_and_sessions_that_expire_soon(
+            600
+        )
+        assert_that(tokens, empty())
+        assert_that(sessions, empty())
@@ -0,0 +1,76 @@
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import time
+import uuid
+
+from hamcrest import assert_that, contains, contains_inanyorder, empty, has_entries
+
+from wazo_auth.database.models import TokenSigningKey
+
+from ..helpers import base
+
+
+def new_key(created_at):
+    return {'kid': str(uuid.uuid4()), 'private_key': 'secret', 'created_at': created_at}
+
+
+class TestTokenSigningDAO(base.DAOTestCase):
+    def setUp(self):
+        super().setUp()
+        # The keys are committed by rotate_key
+        self.addCleanup(self._delete_keys)
+
+    def _delete_keys(self):
+        with self.session.get_bind().begin() as connection:
+            connection.execute(TokenSigningKey.__table__.delete())
+
+    def test_rotate_key(self):
+        now = int(time.time())
+        key_1, key_2, key_3 = new_key(now - 200), new_key(now - 100), new_key(now)
+
+        result = self._token_signing_dao.rotate_key(key_1, 60, 2)
+        assert_that(result, contains(has_entries(kid=key_1['kid'])))
+
+        result = self._token_signing_dao.rotate_key(new_key(now - 190), 60, 2)
+        assert_that(result, contains(has_entries(kid=key_1['kid'])))
+
+        self._token_signing_dao.rotate_key(key_2, 60, 2)
+        result = self._token_signing_dao.rotate_key(key_3, 60, 2)
+        assert_that(
+            result,
+            contains(has_entries(kid=key_3['kid']), has_entries(kid=key_2['kid'])),
+        )
+        assert_that(
+            self._token_signing_dao.list_keys(),
+            contains(
+                has_entries(kid=key_3['kid'], private_key='secret', created_at=now),
+                has_entries(kid=key_2['kid']),
+            ),
+        )
+
+    def test_revocations(self):
+        now = int(time.time())
+        token_uuid, session_uuid = str(uuid.uuid4()), str(uuid.uuid4())
+
+        self._token_signing_dao.add_revocation('expired', now - 1)
+        self._token_signing_dao.add_revocation(token_uuid, now + 60)
+        self._token_signing_dao.add_revocation(token_uuid, now + 60)
+        self._token_signing_dao.add_revocation(session_uuid, now + 120)
+
+        assert_that(
+            self._token_signing_dao.list_revocations(),
+            contains_inanyorder(
+                has_entries(uuid=token_uuid, expire_t=now + 60),
+                has_entries(uuid=session_uuid, expire_t=now + 120),
+            ),
+        )
+        assert_that(
+            self._token_signing_dao.list_revocations(revoked_since=now - 10),
+            contains_inanyorder(
+                has_entries(uuid=token_uuid), has_entries(uuid=session_uuid)
+            ),
+        )
+        assert_that(
+            self._token_signing_dao.list_revocations(revoked_since=now + 10), empty()
+        )
@@ -11,6 +11,7 @@ from hamcrest import (
     empty,
     equal_to,
     has_entries,
+    has_items,
     has_properties,
     none,
     not_,
@@ -22,12 +23,15 @@ from xivo_test_helpers.hamcrest.raises import raises
 from xivo_test_helpers.mock import ANY_UUID
 from wazo_auth import exceptions
 from wazo_auth.database import models
+from wazo_auth.database.queries.base import TenantScope
 from xivo_test_helpers.hamcrest.uuid_ import uuid_
 
 from ..helpers import fixtures, base
 from ..helpers.constants import UNKNOWN_UUID
 
 USER_UUID = '00000000-0000-4000-9000-111111111111'
+TENANT_UUID = '00000000-0000-4000-9000-000000000001'
+SUB_TENANT_UUID = '00000000-0000-4000-9000-000000000002'
 
 
 class TestUserDAO(base.DAOTestCase):
@@ -544,6 +548,34 @@ class TestUserDAO(base.DAOTestCase):
             ),
         )
 
+    @fixtures.db.tenant(uuid=TENANT_UUID)
+    @fixtures.db.tenant(uuid=SUB_TENANT_UUID, parent_uuid=TENANT_UUID)
+    @fixtures.db.user(tenant_uuid=TENANT_UUID)
+    @fixtures.db.user(tenant_uuid=SUB_TENANT_UUID)
+    @fixtures.db.user()
+    def test_user_list_with_tenant_scope(self, _, __, user, sub_user, top_user):
+        result = self._user_dao.list_(tenant_uuids=TenantScope(TENANT_UUID))
+        assert_that(
+            result,
+            contains_inanyorder(has_entries(uuid=user), has_entries(uuid=sub_user)),
+        )
+
+        result = self._user_dao.count(tenant_uuids=TenantScope(SUB_TENANT_UUID))
+        assert_that(result, equal_to(1))
+
+        result = self._user_dao.list_(tenant_uuids=TenantScope())
+        assert_that(
+            result,
+            has_items(
+                has_entries(uuid=user),
+                has_entries(uuid=sub_user),
+                has_entries(uuid=top_user),
+            ),
+        )
+
+        result = self._user_dao.list_(tenant_uuids=TenantScope(UNKNOWN_UUID))
+        assert_that(result, empty())
+
     @fixtures.db.user(username='a')
     @fixtures.db.user(username='b')
     @fixtures.db.user(username='c')
@@ -631,6 +663,28 @@ class TestUserDAO(base.DAOTestCase):
         assert_that(hash_, not_(none()))
         assert_that(salt, not_(none()))
 
+    @fixtures.db.user(username='foobar', purpose='internal')
+    def test_get_login(self, user_uuid):
+        assert_that(
+            calling(self._user_dao.get_login).with_args('not-foobar'),
+            raises(exceptions.UnknownUsernameException),
+        )
+
+        result = self._user_dao.get_login('foobar')
+
+        assert_that(
+            result,
+            has_entries(
+                uuid=user_uuid,
+                username='foobar',
+                tenant_uuid=self.top_tenant_uuid,
+                purpose='internal',
+                enabled=True,
+                password_hash=not_(none()),
+                password_salt=not_(none()),
+            ),
+        )
+
     def _email_exists(self, address):
         filter_ = models.Email.address == address
         return (
@@ -10,6 +10,7 @@ import time
 import unittest
 
 from contextlib import contextmanager
+from sqlalchemy import event
 from hamcrest import (
     assert_that,
     calling,
@@ -27,10 +28,12 @@ from xivo_test_helpers.bus import BusClient
 from wazo_auth import bootstrap
 from wazo_auth.database import queries, helpers
 from wazo_auth.database.queries import (
+    base,
     group,
     policy,
     tenant,
     token,
+    token_signing,
     user,
     refresh_token,
     session,
@@ -97,8 +100,10 @@ class DAOTestCase(unittest.TestCase):
         self._refresh_token_dao = refresh_token.RefreshTokenDAO()
         self._tenant_dao = tenant.TenantDAO()
         self._token_dao = token.TokenDAO()
+        self._token_signing_dao = token_signing.TokenSigningDAO()
         self._session_dao = session.SessionDAO()
 
+        base.BaseDAO.reset_top_tenant_uuid()
         self.top_tenant_uuid = self._tenant_dao.find_top_tenant()
         self._remove_unrelated_default_autocreate_objects()
 
@@ -116,6 +121,20 @@ class DAOTestCase(unittest.TestCase):
     def session(self):
         return helpers.get_db_session()
 
+    @contextmanager
+    def recorded_queries(self):
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = self.session.get_bind()
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+
 
 class AuthLaunchingTestCase(AssetLaunchingTestCase):
 
@@ -12,6 +12,7 @@ from mock import ANY
 from hamcrest import (
     assert_that,
     calling,
+    contains,
     contains_inanyorder,
     empty,
     equal_to,
@@ -19,6 +20,7 @@ from hamcrest import (
     has_key,
     is_,
     not_,
+    not_none,
     raises,
 )
 
@@ -326,6 +328,49 @@ class TestCore(WazoAuthTestCase):
             raises(requests.HTTPError, pattern='400'),
         )
 
+    @fixtures.http.policy(name='fooer', acl=['foo'])
+    def test_that_many_tokens_can_be_validated_at_once(self, policy):
+        self.client.users.add_policy(self.user['uuid'], policy['uuid'])
+        token = self._post_token('foo', 'bar')['token']
+        expired_token = self._post_token('foo', 'bar', expiration=1)['token']
+        time.sleep(2)
+
+        url = 'http://{}:{}/0.1/tokens/validate'.format(self.auth_host, self.auth_port)
+        body = {
+            'tokens': [
+                {'token': token},
+                {'token': token, 'scope': 'foo'},
+                {'token': token, 'scope': 'bar'},
+                {'token': token, 'tenant': UNKNOWN_TENANT},
+                {'token': expired_token},
+                {'token': 'abcdef'},
+            ]
+        }
+        response = requests.post(url, json=body)
+
+        assert_that(response.status_code, equal_to(200))
+        assert_that(
+            response.json()['data'],
+            contains(
+                has_entries(token=token, valid=True, utc_expires_at=not_none()),
+                has_entries(token=token, valid=True),
+                has_entries(token=token, valid=False),
+                has_entries(token=token, valid=False),
+                has_entries(token=expired_token, valid=False, utc_expires_at=None),
+                has_entries(token='abcdef', valid=False, utc_expires_at=None),
+            ),
+        )
+
+    def test_that_validating_too_many_tokens_returns_400(self):
+        url = 'http://{}:{}/0.1/tokens/validate'.format(self.auth_host, self.auth_port)
+
+        response = requests.post(url, json={'tokens': []})
+        assert_that(response.status_code, equal_to(400))
+
+        body = {'tokens': [{'token': 'abcdef'}] * 501}
+        response = requests.post(url, json=body)
+        assert_that(response.status_code, equal_to(400))
+
     def test_query_after_database_restart(self):
         token = self._post_token('foo', 'bar')['token']
 
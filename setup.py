@@ -23,6 +23,8 @@ setup(
         'console_scripts': [
             'wazo-auth = wazo_auth.main:main',
             'wazo-auth-bootstrap = wazo_auth.bootstrap:main',
+            'wazo-auth-calibrate-password-hash = wazo_auth.calibrate:main',
+            'wazo-auth-partition-tokens = wazo_auth.partition_tokens:main',
             'wazo-auth-wait=wazo_auth.wait:main',
         ],
         'wazo_auth.backends': [
@@ -5,10 +5,12 @@ from wazo_auth.interfaces import (
     BaseAuthenticationBackend,
     BaseMetadata,
     DEFAULT_XIVO_UUID,
+    LoginContext,
 )
 
 __all__ = [
     'BaseAuthenticationBackend',
     'BaseMetadata',
     'DEFAULT_XIVO_UUID',
+    'LoginContext',
 ]
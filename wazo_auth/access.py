@@ -0,0 +1,205 @@
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import itertools
+import re
+
+from functools import lru_cache, partial
+
+ACCESS_CHECK_CACHE_SIZE = 1024
+# Under this size a single alternation regex is faster (see benchmarks/)
+ACCESS_TREE_MIN_SIZE = 200
+_LITERAL_AUTH_ID_REGEX = re.compile(r'^[\w-]*$')
+
+
+class AccessCheck:
+    def __init__(self, auth_id, acl):
+        self.auth_id = auth_id
+        positive_acl = set()
+        negative_acl = set()
+        for access in acl:
+            if access.startswith('!'):
+                negative_acl.add(access[1:])
+            else:
+                positive_acl.add(access)
+
+        self._positive = AccessTree(auth_id, positive_acl)
+        self._negative = AccessTree(auth_id, negative_acl)
+
+    def matches_required_access(self, required_access):
+        if required_access is None:
+            return True
+
+        if self._negative.matches(required_access):
+            return False
+
+        return self._positive.matches(required_access)
+
+    def matches_required_accesses(self, required_accesses):
+        return {
+            required_access: self.matches_required_access(required_access)
+            for required_access in required_accesses
+        }
+
+
+class AccessTree:
+    """Match dotted accesses against a set of ACL entries
+
+    The entries are stored in a trie of segments where "*" matches exactly one
+    segment, "#" matches one or more segments and "me" also matches the auth_id.
+    The cost of a match depends on the number of segments of the required
+    access instead of the number of entries.
+
+    The few entries that cannot be expressed as segments (ie. "foo*", "#bar")
+    are matched using their regex. Small ACLs are matched using a single regex.
+    """
+
+    def __init__(self, auth_id, acl):
+        self._auth_id = str(auth_id)
+        self._auth_id_is_literal = _LITERAL_AUTH_ID_REGEX.match(self._auth_id)
+        self._root = None
+        self._acl = sorted(acl)
+        self._full_regex = None
+        self._compile_full_regex = partial(_compile, self._acl, auth_id)
+
+        if len(self._acl) < ACCESS_TREE_MIN_SIZE:
+            self._regex = _compile(self._acl, auth_id)
+            return
+
+        self._root = _Node()
+        unsupported_acl = []
+        for access in self._acl:
+            segment_choices = self._segment_choices(access)
+            if segment_choices is None:
+                unsupported_acl.append(access)
+                continue
+
+            for segments in itertools.product(*segment_choices):
+                self._root.insert(segments)
+
+        self._regex = _compile(unsupported_acl, auth_id)
+
+    def matches(self, required_access):
+        if '\n' in required_access:
+            # "$" and "." behave differently around line breaks
+            if self._full_regex is None:
+                self._full_regex = self._compile_full_regex()
+            return bool(self._full_regex and self._full_regex.match(required_access))
+
+        if self._root is not None and self._root.matches(required_access.split('.')):
+            return True
+
+        return bool(self._regex and self._regex.match(required_access))
+
+    def _segment_choices(self, access):
+        if '\\' in access or '\n' in access:
+            return None
+
+        segments = access.split('.')
+        for segment in segments:
+            if segment in ('*', '#'):
+                continue
+            if '*' in segment or '#' in segment:
+                return None
+
+        choices = [(segment,) for segment in segments]
+        for i in _me_positions(segments):
+            if not self._auth_id_is_literal:
+                return None
+            choices[i] = ('me', self._auth_id)
+        return choices
+
+
+class _Node:
+    __slots__ = ('children', 'star', 'hash', 'loop', 'terminal')
+
+    def __init__(self, loop=False):
+        self.children = {}
+        self.star = None
+        self.hash = None
+        self.loop = loop
+        self.terminal = False
+
+    def insert(self, segments):
+        node = self
+        for segment in segments:
+            if segment == '*':
+                if node.star is None:
+                    node.star = _Node()
+                node = node.star
+            elif segment == '#':
+                if node.hash is None:
+                    node.hash = _Node(loop=True)
+                node = node.hash
+            else:
+                child = node.children.get(segment)
+                if child is None:
+                    child = node.children[segment] = _Node()
+                node = child
+        node.terminal = True
+
+    def matches(self, segments, start=0):
+        node = self
+        for i in range(start, len(segments)):
+            if node.star is not None and node.star.matches(segments, i + 1):
+                return True
+            if node.hash is not None and node.hash.matches(segments, i + 1):
+                return True
+            if node.loop and node.matches(segments, i + 1):
+                return True
+            node = node.children.get(segments[i])
+            if node is None:
+                return False
+        return node.terminal
+
+
+def _me_positions(segments):
+    # Same positions as the "\\.me\\." replacement of the regex transformation
+    positions = []
+    i = 1
+    while i < len(segments) - 1:
+        if segments[i] == 'me':
+            positions.append(i)
+            i += 2
+        else:
+            i += 1
+
+    if len(segments) > 1 and segments[-1] == 'me':
+        positions.append(len(segments) - 1)
+
+    return positions
+
+
+def _compile(acl, auth_id):
+    if not acl:
+        return None
+
+    patterns = (access_to_pattern(access, auth_id) for access in acl)
+    return re.compile('^(?:{})$'.format('|'.join(patterns)))
+
+
+@lru_cache(maxsize=ACCESS_CHECK_CACHE_SIZE)
+def get_access_check(auth_id, acl):
+    return AccessCheck(auth_id, acl)
+
+
+def access_to_regex(access, auth_id):
+    return re.compile('^{}$'.format(access_to_pattern(access, auth_id)))
+
+
+def access_to_pattern(access, auth_id):
+    access_regex = re.escape(access)
+    access_regex = access_regex.replace('\\*', '[^.]*?').replace('\\#', '.*?')
+    return _transform_access_me_to_uuid_or_me(access_regex, auth_id)
+
+
+def _transform_access_me_to_uuid_or_me(access_regex, auth_id):
+    access_regex = access_regex.replace(
+        '\\.me\\.', '\\.(me|{auth_id})\\.'.format(auth_id=auth_id)
+    )
+    if access_regex.endswith('\\.me'):
+        access_regex = '{access_start}\\.(me|{auth_id})'.format(
+            access_start=access_regex[:-4],
+            auth_id=auth_id,
+        )
+    return access_regex
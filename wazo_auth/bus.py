@@ -8,6 +8,9 @@ from threading import Thread
 from kombu import Connection
 from kombu import Exchange
 from kombu import Producer
+from kombu import Queue
+from kombu import binding
+from kombu.mixins import ConsumerMixin
 from xivo_bus import Marshaler
 from xivo_bus import LongLivedPublisher
 from xivo_bus import PublishingQueue
@@ -29,6 +32,59 @@ def publisher_thread(publisher):
         thread.join()
 
 
+@contextmanager
+def consumer_thread(consumer):
+    thread_name = 'bus_consumer_thread'
+    thread = Thread(target=consumer.run, name=thread_name)
+    thread.start()
+    try:
+        yield
+    finally:
+        logger.debug('stopping bus consumer thread')
+        consumer.stop()
+        logger.debug('joining bus consumer thread')
+        thread.join()
+
+
+class BusConsumer(ConsumerMixin):
+    """Calls the handlers subscribed to the routing key of each received event"""
+
+    def __init__(self, global_config):
+        self.config = global_config['amqp']
+        self._handlers = {}
+        self.connection = None
+
+    def subscribe(self, routing_key, handler):
+        self._handlers.setdefault(routing_key, []).append(handler)
+
+    def run(self):
+        logger.info("Running AMQP consumer")
+
+        with Connection(self.config['uri']) as connection:
+            self.connection = connection
+            super().run()
+
+    def stop(self):
+        self.should_stop = True
+
+    def get_consumers(self, Consumer, channel):
+        exchange = Exchange(
+            self.config['exchange_name'], type=self.config['exchange_type']
+        )
+        bindings = [binding(exchange, routing_key=key) for key in self._handlers]
+        queue = Queue(exclusive=True, bindings=bindings)
+        return [Consumer(queues=[queue], callbacks=[self._on_message])]
+
+    def _on_message(self, body, message):
+        routing_key = message.delivery_info['routing_key']
+        for handler in self._handlers.get(routing_key, []):
+            try:
+                handler(body.get('data', {}))
+            except Exception:
+                logger.exception('failed to handle the event %s', routing_key)
+        message.ack()
+
+
 class BusPublisher:
     def __init__(self, global_config):
         self.config = global_config['amqp']
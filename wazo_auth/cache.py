@@ -0,0 +1,107 @@
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import threading
+import time
+
+from collections import OrderedDict
+
+_INVALIDATED = object()
+
+
+class LRUCache:
+    """A thread safe, size bounded, LRU cache with an optional TTL
+
+    Each entry can also have its own expiration time (epoch), the entry is
+    evicted at the earliest of the TTL and its expiration time.
+
+    An invalidated key cannot be set again until the TTL elapses, a value read
+    from the database before the invalidation is not cached afterwards.
+    """
+
+    def __init__(self, max_size, ttl=None):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, config):
+        if not config.get('enabled', True):
+            return cls(max_size=0)
+        return cls(max_size=config['max_size'], ttl=config.get('ttl'))
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expire_at = entry
+            if expire_at is not None and now >= expire_at:
+                del self._entries[key]
+                self.misses += 1
+                return default
+
+            if value is _INVALIDATED:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, expire_at=None):
+        if self._max_size <= 0:
+            return
+
+        if self._ttl:
+            ttl_expire_at = time.time() + self._ttl
+            if expire_at is None or ttl_expire_at < expire_at:
+                expire_at = ttl_expire_at
+
+        with self._lock:
+            if self._is_invalidated(key):
+                return
+            self._set(key, value, expire_at)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate(self, key):
+        if self._max_size <= 0:
+            return
+
+        expire_at = time.time() + self._ttl if self._ttl else None
+        with self._lock:
+            self._set(key, _INVALIDATED, expire_at)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _set(self, key, value, expire_at):
+        self._entries[key] = (value, expire_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def _is_invalidated(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] is not _INVALIDATED:
+            return False
+        expire_at = entry[1]
+        return expire_at is None or time.time() < expire_at
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'max_size': self._max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
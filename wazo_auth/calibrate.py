@@ -0,0 +1,76 @@
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import argparse
+import time
+
+from wazo_auth.services.user import PBKDF2Scheme, ScryptScheme
+
+SCHEMES = ['pbkdf2_sha512', 'pbkdf2_sha256', 'scrypt']
+PASSWORD = b'calibration-password'
+SALT = b'\x00' * 64
+PBKDF2_SAMPLE_ITERATIONS = 20000
+PBKDF2_MIN_ITERATIONS = 100000
+SCRYPT_MIN_N = 2**14
+SCRYPT_MAX_N = 2**20
+
+OUTPUT = '''\
+# measured hash time on this host: {duration:.3f}s
+password_hashing:
+  scheme: {scheme}
+{params}'''
+
+
+def measure(scheme, repeat=3):
+    durations = []
+    for _ in range(repeat):
+        start = time.monotonic()
+        scheme.compute(PASSWORD, SALT)
+        durations.append(time.monotonic() - start)
+    return min(durations)
+
+
+def calibrate_pbkdf2(hash_name, target):
+    sample = PBKDF2Scheme(hash_name, PBKDF2_SAMPLE_ITERATIONS)
+    per_iteration = measure(sample) / PBKDF2_SAMPLE_ITERATIONS
+    iterations = int(target / per_iteration) // 1000 * 1000
+    return PBKDF2Scheme(hash_name, max(iterations, PBKDF2_MIN_ITERATIONS))
+
+
+def calibrate_scrypt(target, r=8, p=1):
+    scheme = ScryptScheme(SCRYPT_MIN_N, r, p)
+    while scheme.n < SCRYPT_MAX_N:
+        candidate = ScryptScheme(scheme.n * 2, r, p)
+        if measure(candidate, repeat=1) > target:
+            break
+        scheme = candidate
+    return scheme
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Suggest password hashing parameters for this host'
+    )
+    parser.add_argument('--scheme', choices=SCHEMES, default=SCHEMES[0])
+    parser.add_argument(
+        '--target',
+        type=float,
+        default=0.25,
+        help='the time to hash a password, in seconds',
+    )
+    args = parser.parse_args()
+
+    if args.scheme == 'scrypt':
+        scheme = calibrate_scrypt(args.target)
+        params = '  scrypt_n: {}\n  scrypt_r: {}\n  scrypt_p: {}\n'.format(
+            scheme.n, scheme.r, scheme.p
+        )
+    else:
+        hash_name = args.scheme[len('pbkdf2_') :]
+        scheme = calibrate_pbkdf2(hash_name, args.target)
+        params = '  pbkdf2_iterations: {}\n'.format(scheme.iterations)
+
+    print(
+        OUTPUT.format(duration=measure(scheme), scheme=args.scheme, params=params),
+        end='',
+    )
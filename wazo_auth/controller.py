@@ -5,19 +5,23 @@ import logging
 import signal
 import sys
 
+from contextlib import ExitStack
 from functools import partial
 
 from xivo import plugin_helpers
 from xivo.consul_helpers import ServiceCatalogRegistration
 from xivo.status import StatusAggregator
+from xivo_bus.resources.auth.events import TenantCreatedEvent, TenantDeletedEvent
 
 from . import bus, services, token
+from .cache import LRUCache
 from .database import queries
-from .database.helpers import db_ready, init_db
+from .database.helpers import db_ready, init_db, provide_status as db_status
 from .flask_helpers import Tenant
 from .helpers import LocalTokenRenewer
 from .http_server import api, CoreRestApi
 from .purpose import Purposes
+from .signed_token import TokenSigner
 from .service_discovery import self_check
 
 logger = logging.getLogger(__name__)
@@ -37,7 +41,15 @@ def _check_required_config_for_other_threads(config):
 
 class Controller:
     def __init__(self, config):
-        init_db(config['db_uri'], max_connections=config['rest_api']['max_threads'])
+        background_pool_config = None
+        if config['db_background_pool']['enabled']:
+            background_pool_config = config['db_background_pool']
+        init_db(
+            config['db_uri'],
+            max_connections=config['rest_api']['max_threads'],
+            pool_config=config['db_pool'],
+            background_pool_config=background_pool_config,
+        )
         self._config = config
         _check_required_config_for_other_threads(config)
         self._service_discovery_args = [
@@ -50,10 +62,33 @@ class Controller:
         ]
 
         self.status_aggregator = StatusAggregator()
+        self.status_aggregator.add_provider(db_status)
         template_formatter = services.helpers.TemplateFormatter(config)
         self._bus_publisher = bus.BusPublisher(config)
         dao = queries.DAO.from_defaults()
-        self._tenant_tree = services.helpers.TenantTree(dao.tenant)
+        self._token_cache = LRUCache.from_config(config['token_cache'])
+        tenant_visibility_cache = LRUCache.from_config(
+            config['tenant_visibility_cache']
+        )
+        acl_cache = services.helpers.ACLCache(LRUCache.from_config(config['acl_cache']))
+        token_signer = None
+        if config['signed_tokens']['enabled']:
+            token_signer = TokenSigner.from_config(
+                config['signed_tokens'], dao.token_signing
+            )
+        self._bus_consumer = None
+        if config['tenant_index']['enabled']:
+            self._tenant_tree = services.helpers.TenantIndex(
+                dao.tenant, config['tenant_index']['reload_interval']
+            )
+            self._bus_consumer = bus.BusConsumer(config)
+            for event_class in (TenantCreatedEvent, TenantDeletedEvent):
+                self._bus_consumer.subscribe(
+                    event_class.routing_key_fmt,
+                    lambda event: self._tenant_tree.invalidate(),
+                )
+        else:
+            self._tenant_tree = services.helpers.TenantTree(dao.tenant)
         self._backends = BackendsProxy()
         authentication_service = services.AuthenticationService(dao, self._backends)
         email_service = services.EmailService(
@@ -71,15 +106,51 @@ class Controller:
             self._bus_publisher,
             enabled_external_auth_plugins,
         )
-        group_service = services.GroupService(dao, self._tenant_tree)
-        policy_service = services.PolicyService(dao, self._tenant_tree)
+        group_service = services.GroupService(dao, self._tenant_tree, acl_cache)
+        policy_service = services.PolicyService(dao, self._tenant_tree, acl_cache)
         session_service = services.SessionService(
-            dao, self._tenant_tree, self._bus_publisher
+            dao,
+            self._tenant_tree,
+            self._bus_publisher,
+            self._token_cache,
+            token_signer,
+        )
+        expiry_scheduler = None
+        if config['expiry_wheel']['enabled']:
+            expiry_scheduler = token.ExpiryScheduler(
+                config['token_cleanup_interval'], config['expiry_wheel']['resolution']
+            )
+            self.status_aggregator.add_provider(expiry_scheduler.provide_status)
+        self._password_hash_executor = services.PasswordHashExecutor.from_config(
+            config['password_hash_executor']
+        )
+        if self._password_hash_executor:
+            self.status_aggregator.add_provider(
+                self._password_hash_executor.provide_status
+            )
+        self._user_service = services.UserService(
+            dao,
+            self._tenant_tree,
+            group_service,
+            encrypter=services.PasswordEncrypter.from_config(
+                config['password_hashing'], self._password_hash_executor
+            ),
+            tenant_visibility_cache=tenant_visibility_cache,
+            acl_cache=acl_cache,
+            token_signer=token_signer,
         )
-        self._user_service = services.UserService(dao, self._tenant_tree, group_service)
         self._token_service = services.TokenService(
-            config, dao, self._tenant_tree, self._bus_publisher, self._user_service
+            config,
+            dao,
+            self._tenant_tree,
+            self._bus_publisher,
+            self._user_service,
+            self._token_cache,
+            token_signer,
+            expiry_scheduler=expiry_scheduler,
         )
+        self.status_aggregator.add_provider(self._token_service.provide_status)
+        self.status_aggregator.add_provider(acl_cache.provide_status)
         self._tenant_service = services.TenantService(
             dao,
             self._tenant_tree,
@@ -87,6 +158,8 @@ class Controller:
             policy_service,
             config['all_users_policies'],
             self._bus_publisher,
+            tenant_visibility_cache,
+            acl_cache=acl_cache,
         )
         self._all_users_service = services.AllUsersService(
             group_service,
@@ -163,8 +236,17 @@ class Controller:
 
         self._rest_api = CoreRestApi(config, self._token_service, self._user_service)
 
+        lease = None
+        if config['token_cleanup_lease']['enabled']:
+            lease = token.SweeperLease(config['token_cleanup_lease']['name'])
+            self.status_aggregator.add_provider(lease.provide_status)
         self._expired_token_remover = token.ExpiredTokenRemover(
-            config, dao, self._bus_publisher
+            config,
+            dao,
+            self._bus_publisher,
+            self._token_cache,
+            expiry_scheduler=expiry_scheduler,
+            lease=lease,
         )
 
     def run(self):
@@ -173,18 +255,25 @@ class Controller:
         with db_ready(timeout=self._config['db_connect_retry_timeout_seconds']):
             self._all_users_service.update_policies()
 
-        with bus.publisher_thread(self._bus_publisher):
-            with ServiceCatalogRegistration(*self._service_discovery_args):
-                self._expired_token_remover.start()
-                local_token_renewer = self._get_local_token_renewer()
-                self._config['local_token_renewer'] = local_token_renewer
-                self._rest_api.run()
-                local_token_renewer.revoke_token()
+        with ExitStack() as stack:
+            stack.enter_context(bus.publisher_thread(self._bus_publisher))
+            if self._bus_consumer:
+                stack.enter_context(bus.consumer_thread(self._bus_consumer))
+            stack.enter_context(
+                ServiceCatalogRegistration(*self._service_discovery_args)
+            )
+            self._expired_token_remover.start()
+            local_token_renewer = self._get_local_token_renewer()
+            self._config['local_token_renewer'] = local_token_renewer
+            self._rest_api.run()
+            local_token_renewer.revoke_token()
 
     def stop(self, reason):
         logger.warning('Stopping wazo-auth: %s', reason)
         self._expired_token_remover.stop()
         self._rest_api.stop()
+        if self._password_hash_executor:
+            self._password_hash_executor.shutdown()
 
     def _get_local_token_renewer(self):
         try:
@@ -6,8 +6,10 @@ import time
 
 from contextlib import contextmanager
 from datetime import datetime, timedelta
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
 
 logger = logging.getLogger(__name__)
 
@@ -16,24 +18,130 @@ Session = scoped_session(sessionmaker())
 
 DEFAULT_POOL_SIZE = 5
 
+# Background jobs use their own pool to leave the main pool to HTTP requests
+_background_engine = None
 
-def init_db(db_uri, max_connections=15):
-    max_overflow = max_connections - DEFAULT_POOL_SIZE
-    max_overflow = 10 if max_overflow < 10 else max_overflow
-    engine = create_engine(db_uri, max_overflow=max_overflow, pool_pre_ping=True)
+
+class CheckoutStats:
+    def __init__(self):
+        self.count = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def add(self, wait, timeout=False):
+        # Unlocked, a lost update only skews the statistics
+        self.count += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        if timeout:
+            self.timeouts += 1
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'timeouts': self.timeouts,
+            'average_wait': self.total_wait / self.count if self.count else 0.0,
+            'max_wait': self.max_wait,
+        }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """A QueuePool measuring the time spent waiting for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_stats = CheckoutStats()
+
+    def _do_get(self):
+        start = time.monotonic()
+        try:
+            connection = super()._do_get()
+        except TimeoutError:
+            self.checkout_stats.add(time.monotonic() - start, timeout=True)
+            raise
+        self.checkout_stats.add(time.monotonic() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.checkout_stats = self.checkout_stats
+        return pool
+
+    def stats(self):
+        return {
+            'size': self.size(),
+            'checked_out': self.checkedout(),
+            'overflow': max(self.overflow(), 0),
+            'checkout': self.checkout_stats.to_dict(),
+        }
+
+
+def _create_engine(db_uri, pool_config, default_max_overflow):
+    max_overflow = pool_config.get('max_overflow')
+    if max_overflow is None:
+        max_overflow = default_max_overflow
+    return create_engine(
+        db_uri,
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_config.get('size') or DEFAULT_POOL_SIZE,
+        max_overflow=max_overflow,
+        pool_timeout=pool_config.get('timeout', 30),
+        pool_recycle=pool_config.get('recycle', -1),
+        pool_pre_ping=pool_config.get('pre_ping', True),
+    )
+
+
+def init_db(db_uri, max_connections=15, pool_config=None, background_pool_config=None):
+    global _background_engine
+
+    pool_config = pool_config or {}
+    pool_size = pool_config.get('size') or DEFAULT_POOL_SIZE
+    max_overflow = max(max_connections - pool_size, 10)
+    engine = _create_engine(db_uri, pool_config, max_overflow)
     Session.configure(bind=engine)
 
+    if background_pool_config:
+        _background_engine = _create_engine(
+            db_uri, background_pool_config, default_max_overflow=0
+        )
+
 
 def deinit_db():
+    global _background_engine
+
+    if _background_engine:
+        _background_engine.dispose()
+        _background_engine = None
     Session.get_bind().dispose()
     Session.remove()
     Session.configure(bind=None)
 
 
+def use_background_engine():
+    """Binds the session of the current thread to the background pool"""
+    if _background_engine is None:
+        return
+    Session.remove()
+    Session(bind=_background_engine)
+
+
+def provide_status(status):
+    pools = {'main': Session.get_bind().pool.stats()}
+    if _background_engine:
+        pools['background'] = _background_engine.pool.stats()
+    status['database_pools'] = pools
+
+
 def get_db_session():
     return Session()
 
 
+def after_commit(callback):
+    """Calls callback once the transaction of the current thread is committed"""
+    event.listen(Session(), 'after_commit', lambda session: callback(), once=True)
+
+
 def commit_or_rollback():
     try:
         Session.commit()
@@ -7,6 +7,7 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     LargeBinary,
     String,
@@ -18,7 +19,7 @@ from sqlalchemy import (
 )
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import relationship
 
 Base = declarative_base()
@@ -126,9 +127,33 @@ class Tenant(Base):
     parent_uuid = Column(String(38), ForeignKey('auth_tenant.uuid'), nullable=False)
 
 
+class TenantClosure(Base):
+
+    __tablename__ = 'auth_tenant_closure'
+    __table_args__ = (
+        Index('auth_tenant_closure__idx__descendant_uuid', 'descendant_uuid'),
+    )
+
+    ancestor_uuid = Column(
+        String(38), ForeignKey('auth_tenant.uuid', ondelete='CASCADE'), primary_key=True
+    )
+    descendant_uuid = Column(
+        String(38), ForeignKey('auth_tenant.uuid', ondelete='CASCADE'), primary_key=True
+    )
+    depth = Column(Integer, nullable=False)
+
+
 class Token(Base):
 
     __tablename__ = 'auth_token'
+    __table_args__ = (
+        Index(
+            'auth_token__idx__metadata_tenant_uuid',
+            text("(metadata->>'tenant_uuid')"),
+        ),
+        Index('auth_token__idx__metadata_uuid', text("(metadata->>'uuid')")),
+        Index('auth_token__idx__expire_t', 'expire_t'),
+    )
 
     uuid = Column(
         String(38), server_default=text('uuid_generate_v4()'), primary_key=True
@@ -141,14 +166,37 @@ class Token(Base):
     xivo_uuid = Column(String(38))
     issued_t = Column(Integer)
     expire_t = Column(Integer)
-    metadata_ = Column(Text, name='metadata')
+    metadata_ = Column(JSONB, name='metadata', server_default=text("'{}'"))
     user_agent = Column(Text)
     remote_addr = Column(Text)
     acl = Column(ARRAY(Text), nullable=False, server_default='{}')
+    expire_notice_sent = Column(Boolean, nullable=False, server_default='false')
 
     session = relationship('Session')
 
 
+class TokenSigningKey(Base):
+
+    __tablename__ = 'auth_token_signing_key'
+
+    kid = Column(String(36), primary_key=True)
+    private_key = Column(Text, nullable=False)
+    created_at = Column(Integer, nullable=False)
+
+
+class TokenRevocation(Base):
+
+    __tablename__ = 'auth_token_revocation'
+    __table_args__ = (
+        Index('auth_token_revocation__idx__expire_t', 'expire_t'),
+        Index('auth_token_revocation__idx__revoked_at', 'revoked_at'),
+    )
+
+    uuid = Column(String(38), primary_key=True)
+    expire_t = Column(Integer, nullable=False)
+    revoked_at = Column(Integer, nullable=False)
+
+
 class RefreshToken(Base):
 
     __tablename__ = 'auth_refresh_token'
@@ -9,6 +9,7 @@ from .policy import PolicyDAO
 from .session import SessionDAO
 from .tenant import TenantDAO
 from .token import TokenDAO
+from .token_signing import TokenSigningDAO
 from .user import UserDAO
 from .refresh_token import RefreshTokenDAO
 
@@ -25,6 +26,7 @@ class DAO:
         session,
         tenant,
         token,
+        token_signing,
         user,
     ):
         self.address = address
@@ -36,6 +38,7 @@ class DAO:
         self.session = session
         self.tenant = tenant
         self.token = token
+        self.token_signing = token_signing
         self.user = user
 
     @classmethod
@@ -50,5 +53,6 @@ class DAO:
             session=SessionDAO(),
             tenant=TenantDAO(),
             token=TokenDAO(),
+            token_signing=TokenSigningDAO(),
             user=UserDAO(),
         )
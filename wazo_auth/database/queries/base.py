@@ -1,10 +1,41 @@
 # Copyright 2017-2020 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+from sqlalchemy import select, true
+
 from .. import helpers
+from ..models import Tenant, TenantClosure
 from ... import exceptions
 
 
+class TenantScope:
+    """The tenants visible from a scoping tenant
+
+    A scope can be used wherever a DAO accepts a list of tenant uuids. It is
+    rendered as a subquery on the tenant closure table, the size of the
+    statement does not depend on the number of visible tenants. A scope without
+    a scoping tenant includes all tenants and does not add any predicate.
+    """
+
+    def __init__(self, tenant_uuid=None):
+        self.tenant_uuid = str(tenant_uuid) if tenant_uuid else None
+
+    def filter(self, column):
+        if self.tenant_uuid is None:
+            return true()
+
+        descendants = select([TenantClosure.descendant_uuid]).where(
+            TenantClosure.ancestor_uuid == self.tenant_uuid
+        )
+        return column.in_(descendants)
+
+
+def tenant_filter(column, tenant_uuids):
+    if isinstance(tenant_uuids, TenantScope):
+        return tenant_uuids.filter(column)
+    return column.in_(tenant_uuids)
+
+
 class QueryPaginator:
 
     _valid_directions = ['asc', 'desc']
@@ -74,6 +105,23 @@ class BaseDAO:
     _UNIQUE_CONSTRAINT_CODE = '23505'
     _FKEY_CONSTRAINT_CODE = '23503'
 
+    # The top tenant does not change once created, it is shared by all DAOs
+    _top_tenant_uuid = None
+
     @property
     def session(self):
         return helpers.get_db_session()
+
+    @staticmethod
+    def reset_top_tenant_uuid():
+        BaseDAO._top_tenant_uuid = None
+
+    def _get_top_tenant_uuid(self):
+        if BaseDAO._top_tenant_uuid is None:
+            top_tenant = (
+                self.session.query(Tenant.uuid)
+                .filter(Tenant.uuid == Tenant.parent_uuid)
+                .first()
+            )
+            BaseDAO._top_tenant_uuid = top_tenant.uuid if top_tenant else None
+        return BaseDAO._top_tenant_uuid
@@ -2,7 +2,7 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from sqlalchemy import and_, exc, text
-from .base import BaseDAO, PaginatorMixin
+from .base import BaseDAO, PaginatorMixin, tenant_filter
 from ..models import Email, Group, GroupPolicy, Policy, User, UserGroup
 from . import filters
 from ... import exceptions
@@ -61,7 +61,7 @@ class GroupDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
         if tenant_uuids is not None:
             if not tenant_uuids:
                 return 0
-            filter_ = and_(filter_, Group.tenant_uuid.in_(tenant_uuids))
+            filter_ = and_(filter_, tenant_filter(Group.tenant_uuid, tenant_uuids))
 
         filtered = kwargs.get('filtered')
         if filtered is not False:
@@ -121,7 +121,7 @@ class GroupDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
             if not tenant_uuids:
                 raise exceptions.UnknownGroupException(uuid)
 
-            filter_ = and_(filter_, Group.tenant_uuid.in_(tenant_uuids))
+            filter_ = and_(filter_, tenant_filter(Group.tenant_uuid, tenant_uuids))
 
         nb_deleted = (
             self.session.query(Group).filter(filter_).delete(synchronize_session=False)
@@ -142,7 +142,7 @@ class GroupDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
             if not tenant_uuids:
                 return []
 
-            filter_ = and_(filter_, Group.tenant_uuid.in_(tenant_uuids))
+            filter_ = and_(filter_, tenant_filter(Group.tenant_uuid, tenant_uuids))
 
         query = (
             self.session.query(Group)
@@ -207,7 +207,7 @@ class GroupDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
             if not tenant_uuids:
                 raise exceptions.UnknownGroupException(uuid)
 
-            filter_ = and_(filter_, Group.tenant_uuid.in_(tenant_uuids))
+            filter_ = and_(filter_, tenant_filter(Group.tenant_uuid, tenant_uuids))
 
         result = self.session.query(Group).filter(filter_).first()
 
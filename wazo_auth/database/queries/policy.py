@@ -1,8 +1,8 @@
 # Copyright 2017-2020 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from sqlalchemy import and_, distinct, exc, func, text
-from .base import BaseDAO, PaginatorMixin
+from sqlalchemy import and_, distinct, exc, func, join, select, text, union
+from .base import BaseDAO, PaginatorMixin, tenant_filter
 from . import filters
 from ..models import (
     Access,
@@ -10,6 +10,8 @@ from ..models import (
     GroupPolicy,
     Policy,
     Tenant,
+    User,
+    UserGroup,
     UserPolicy,
 )
 from ... import exceptions
@@ -74,7 +76,7 @@ class PolicyDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
         filter_ = self.new_search_filter(search=search)
 
         if tenant_uuids is not None:
-            filter_ = and_(filter_, Policy.tenant_uuid.in_(tenant_uuids))
+            filter_ = and_(filter_, tenant_filter(Policy.tenant_uuid, tenant_uuids))
 
         return self.session.query(Policy).filter(filter_).count()
 
@@ -100,7 +102,7 @@ class PolicyDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
     def delete(self, policy_uuid, tenant_uuids):
         filter_ = Policy.uuid == policy_uuid
         if tenant_uuids is not None:
-            filter_ = and_(filter_, Policy.tenant_uuid.in_(tenant_uuids))
+            filter_ = and_(filter_, tenant_filter(Policy.tenant_uuid, tenant_uuids))
 
         nb_deleted = (
             self.session.query(Policy).filter(filter_).delete(synchronize_session=False)
@@ -118,7 +120,7 @@ class PolicyDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
         filter_ = and_(strict_filter, search_filter)
 
         if tenant_uuids is not None:
-            filter_ = and_(filter_, Policy.tenant_uuid.in_(tenant_uuids))
+            filter_ = and_(filter_, tenant_filter(Policy.tenant_uuid, tenant_uuids))
 
         query = (
             self.session.query(
@@ -157,6 +159,41 @@ class PolicyDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
 
         return policies
 
+    def get_effective_acl(self, username, backend_policy_name=None):
+        user_policies = (
+            select([UserPolicy.policy_uuid])
+            .select_from(join(UserPolicy, User))
+            .where(User.username == username)
+        )
+        group_policies = (
+            select([GroupPolicy.policy_uuid])
+            .select_from(
+                join(
+                    GroupPolicy,
+                    UserGroup,
+                    UserGroup.group_uuid == GroupPolicy.group_uuid,
+                ).join(User)
+            )
+            .where(User.username == username)
+        )
+        policy_uuids = [user_policies, group_policies]
+        if backend_policy_name:
+            backend_policy = (
+                select([Policy.uuid])
+                .where(Policy.name == backend_policy_name)
+                .limit(1)
+                .as_scalar()
+            )
+            policy_uuids.append(select([backend_policy]))
+
+        query = (
+            self.session.query(Access.access)
+            .join(PolicyAccess)
+            .filter(PolicyAccess.policy_uuid.in_(union(*policy_uuids)))
+            .distinct()
+        )
+        return [access for access, in query.all()]
+
     def list_(self, **kwargs):
         search_filter = self.new_search_filter(**kwargs)
         strict_filter = self.new_strict_filter(**kwargs)
@@ -185,7 +222,7 @@ class PolicyDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
     ):
         filter_ = Policy.uuid == policy_uuid
         if tenant_uuids is not None:
-            filter_ = and_(filter_, Policy.tenant_uuid.in_(tenant_uuids))
+            filter_ = and_(filter_, tenant_filter(Policy.tenant_uuid, tenant_uuids))
 
         body = {
             'name': name,
@@ -252,7 +289,7 @@ class PolicyDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
             if not tenant_uuids:
                 return False
 
-            filter_ = and_(filter_, Policy.tenant_uuid.in_(tenant_uuids))
+            filter_ = and_(filter_, tenant_filter(Policy.tenant_uuid, tenant_uuids))
 
         result = self.session.query(Policy).filter(filter_).count() > 0
         self.session.flush()
@@ -6,7 +6,7 @@ from sqlalchemy import and_, exc, text
 from wazo_auth import exceptions
 
 from . import filters
-from .base import BaseDAO, PaginatorMixin
+from .base import BaseDAO, PaginatorMixin, tenant_filter
 from ..models import RefreshToken
 
 
@@ -30,7 +30,9 @@ class RefreshTokenDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
             if not tenant_uuids:
                 filter_ = and_(filter_, text('false'))
             else:
-                filter_ = and_(filter_, RefreshToken.tenant_uuid.in_(tenant_uuids))
+                filter_ = and_(
+                    filter_, tenant_filter(RefreshToken.tenant_uuid, tenant_uuids)
+                )
 
         if filtered is not False:
             strict_filter = self.new_strict_filter(**search_params)
@@ -62,7 +64,7 @@ class RefreshTokenDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
         filter_ = and_(
             RefreshToken.client_id == client_id,
             RefreshToken.user_uuid == user_uuid,
-            RefreshToken.tenant_uuid.in_(tenant_uuids),
+            tenant_filter(RefreshToken.tenant_uuid, tenant_uuids),
         )
 
         nb_deleted = (
@@ -92,7 +94,7 @@ class RefreshTokenDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
         filter_ = and_(
             RefreshToken.client_id == client_id,
             RefreshToken.user_uuid == user_uuid,
-            RefreshToken.tenant_uuid.in_(tenant_uuids),
+            tenant_filter(RefreshToken.tenant_uuid, tenant_uuids),
         )
 
         query = self.session.query(
@@ -116,7 +118,9 @@ class RefreshTokenDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
             if not tenant_uuids:
                 filter_ = and_(filter_, text('false'))
             else:
-                filter_ = and_(filter_, RefreshToken.tenant_uuid.in_(tenant_uuids))
+                filter_ = and_(
+                    filter_, tenant_filter(RefreshToken.tenant_uuid, tenant_uuids)
+                )
 
         strict_filter = self.new_strict_filter(**search_params)
         search_filter = self.new_search_filter(**search_params)
@@ -3,7 +3,7 @@
 
 from sqlalchemy import text, and_
 
-from .base import BaseDAO, PaginatorMixin
+from .base import BaseDAO, PaginatorMixin, tenant_filter
 from ..models import Session, Token
 from ...helpers import is_uuid
 
@@ -18,7 +18,7 @@ class SessionDAO(PaginatorMixin, BaseDAO):
             if not tenant_uuids:
                 return []
 
-            filter_ = and_(filter_, Session.tenant_uuid.in_(tenant_uuids))
+            filter_ = and_(filter_, tenant_filter(Session.tenant_uuid, tenant_uuids))
 
         if user_uuid is not None:
             filter_ = and_(filter_, Token.auth_id == str(user_uuid))
@@ -42,7 +42,7 @@ class SessionDAO(PaginatorMixin, BaseDAO):
         if tenant_uuids is not None:
             if not tenant_uuids:
                 return 0
-            filter_ = and_(filter_, Session.tenant_uuid.in_(tenant_uuids))
+            filter_ = and_(filter_, tenant_filter(Session.tenant_uuid, tenant_uuids))
 
         return self.session.query(Session).join(Token).filter(filter_).count()
 
@@ -50,7 +50,7 @@ class SessionDAO(PaginatorMixin, BaseDAO):
         filter_ = Session.uuid == str(session_uuid)
         if not tenant_uuids:
             return {}, {}
-        filter_ = and_(filter_, Session.tenant_uuid.in_(tenant_uuids))
+        filter_ = and_(filter_, tenant_filter(Session.tenant_uuid, tenant_uuids))
 
         session = self.session.query(Session).filter(filter_).first()
         if not session:
@@ -58,7 +58,11 @@ class SessionDAO(PaginatorMixin, BaseDAO):
 
         token_result = {}
         for token in session.tokens:
-            token_result = {'uuid': token.uuid, 'auth_id': token.auth_id}
+            token_result = {
+                'uuid': token.uuid,
+                'auth_id': token.auth_id,
+                'expire_t': token.expire_t,
+            }
             break
 
         session_result = {'uuid': session.uuid, 'tenant_uuid': session.tenant_uuid}
@@ -1,10 +1,10 @@
 # Copyright 2017-2020 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from sqlalchemy import and_, exc, text
+from sqlalchemy import String, and_, exc, literal, text
 from wazo_auth import schemas
-from .base import BaseDAO, PaginatorMixin
-from ..models import Address, Policy, Tenant, User
+from .base import BaseDAO, PaginatorMixin, tenant_filter
+from ..models import Address, Policy, Tenant, TenantClosure, User
 from . import filters
 from ... import exceptions
 
@@ -20,7 +20,7 @@ class TenantDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
         return self.count([str(tenant_uuid)]) > 0
 
     def count(self, tenant_uuids, **kwargs):
-        filter_ = Tenant.uuid.in_(tenant_uuids)
+        filter_ = tenant_filter(Tenant.uuid, tenant_uuids)
 
         filtered = kwargs.get('filtered')
         if filtered is not False:
@@ -85,15 +85,14 @@ class TenantDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
                 if constraint == 'auth_tenant_contact_uuid_fkey':
                     raise exceptions.UnknownUserException(kwargs['contact_uuid'])
             raise
+
+        self._add_to_closure(tenant.uuid, tenant.parent_uuid)
+        if tenant.uuid == tenant.parent_uuid:
+            self.reset_top_tenant_uuid()
         return tenant.uuid
 
     def find_top_tenant(self):
-        return (
-            self.session.query(Tenant)
-            .filter(Tenant.uuid == Tenant.parent_uuid)
-            .first()
-            .uuid
-        )
+        return self._get_top_tenant_uuid()
 
     def delete(self, uuid):
         tenant = self.session.query(Tenant).get(uuid)
@@ -111,6 +110,19 @@ class TenantDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
             .scalar()
         )
 
+    def is_under(self, tenant_uuid, scoping_tenant_uuid=None):
+        if scoping_tenant_uuid is None:
+            scoping_tenant_uuid = self.find_top_tenant()
+
+        query = self.session.query(TenantClosure).filter(
+            TenantClosure.ancestor_uuid == str(scoping_tenant_uuid),
+            TenantClosure.descendant_uuid == str(tenant_uuid),
+        )
+        return self.session.query(query.exists()).scalar()
+
+    def list_parents(self):
+        return self.session.query(Tenant.uuid, Tenant.parent_uuid).all()
+
     def list_visible_tenants(self, scoping_tenant_uuid=None):
         query = self._tenant_query(scoping_tenant_uuid)
         return query.all()
@@ -121,7 +133,7 @@ class TenantDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
 
         tenant_uuids = kwargs.get('tenant_uuids')
         if tenant_uuids is not None:
-            filter_ = Tenant.uuid.in_(tenant_uuids)
+            filter_ = tenant_filter(Tenant.uuid, tenant_uuids)
 
         search_filter = self.new_search_filter(**kwargs)
         strict_filter = self.new_strict_filter(**kwargs)
@@ -160,6 +172,27 @@ class TenantDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
                     raise exceptions.UnknownUserException(kwargs['contact_uuid'])
             raise
 
+    def _add_to_closure(self, tenant_uuid, parent_uuid):
+        closure = TenantClosure.__table__
+        self.session.execute(
+            closure.insert().values(
+                ancestor_uuid=tenant_uuid, descendant_uuid=tenant_uuid, depth=0
+            )
+        )
+        if tenant_uuid == parent_uuid:
+            return
+
+        ancestors = self.session.query(
+            TenantClosure.ancestor_uuid,
+            literal(tenant_uuid, String),
+            TenantClosure.depth + 1,
+        ).filter(TenantClosure.descendant_uuid == parent_uuid)
+        self.session.execute(
+            closure.insert().from_select(
+                ['ancestor_uuid', 'descendant_uuid', 'depth'], ancestors
+            )
+        )
+
     def _tenant_query(self, scoping_tenant_uuid):
         top_tenant_uuid = self.find_top_tenant()
         if scoping_tenant_uuid is None:
@@ -168,21 +201,8 @@ class TenantDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
         if scoping_tenant_uuid == top_tenant_uuid:
             return self.session.query(Tenant)
 
-        included_tenants = (
-            self.session.query(Tenant.uuid, Tenant.parent_uuid)
-            .filter(Tenant.uuid == str(scoping_tenant_uuid))
-            .cte(recursive=True)
-        )
-        included_tenants = included_tenants.union_all(
-            self.session.query(Tenant.uuid, Tenant.parent_uuid).filter(
-                and_(
-                    Tenant.parent_uuid == included_tenants.c.uuid,
-                    Tenant.uuid != Tenant.parent_uuid,
-                )
-            )
-        )
         return (
             self.session.query(Tenant)
-            .select_from(included_tenants)
-            .join(Tenant, Tenant.uuid == included_tenants.c.uuid)
+            .join(TenantClosure, TenantClosure.descendant_uuid == Tenant.uuid)
+            .filter(TenantClosure.ancestor_uuid == str(scoping_tenant_uuid))
         )
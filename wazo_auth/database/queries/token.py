@@ -1,17 +1,49 @@
 # Copyright 2017-2020 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-import json
+import re
 import time
 
+from sqlalchemy import MetaData, and_, exists, select, text
+
 from .base import BaseDAO
-from ..models import Session, Tenant, Token as TokenModel
+from ..models import Session, Token as TokenModel
 from ... import exceptions
 
+PARTITION_BOUNDS = re.compile(r"FROM \('?(-?\d+)'?\) TO \('?(-?\d+)'?\)")
+PARTITIONS_LOCK = 0x617574685F746F6B  # arbitrary, shared by all wazo-auth nodes
+
+PARTITION_TABLE_STATEMENTS = [
+    'LOCK TABLE auth_token IN ACCESS EXCLUSIVE MODE',
+    'ALTER TABLE auth_token RENAME TO auth_token_unpartitioned',
+    'ALTER TABLE auth_token_unpartitioned '
+    'RENAME CONSTRAINT auth_token_pkey TO auth_token_unpartitioned_pkey',
+    'ALTER INDEX auth_token__idx__metadata_tenant_uuid '
+    'RENAME TO auth_token_unpartitioned__idx__metadata_tenant_uuid',
+    'ALTER INDEX auth_token__idx__metadata_uuid '
+    'RENAME TO auth_token_unpartitioned__idx__metadata_uuid',
+    'ALTER INDEX auth_token__idx__expire_t '
+    'RENAME TO auth_token_unpartitioned__idx__expire_t',
+    'CREATE TABLE auth_token (LIKE auth_token_unpartitioned INCLUDING DEFAULTS) '
+    'PARTITION BY RANGE (expire_t)',
+    'ALTER TABLE auth_token ALTER COLUMN expire_t SET NOT NULL',
+    'ALTER TABLE auth_token '
+    'ADD CONSTRAINT auth_token_pkey PRIMARY KEY (uuid, expire_t)',
+    'ALTER TABLE auth_token ADD CONSTRAINT auth_token_session_uuid_fkey '
+    'FOREIGN KEY (session_uuid) REFERENCES auth_session(uuid) ON DELETE CASCADE',
+    'CREATE INDEX auth_token__idx__metadata_tenant_uuid '
+    "ON auth_token ((metadata->>'tenant_uuid'))",
+    "CREATE INDEX auth_token__idx__metadata_uuid ON auth_token ((metadata->>'uuid'))",
+    'CREATE INDEX auth_token__idx__expire_t ON auth_token (expire_t)',
+    'CREATE TABLE auth_token_default PARTITION OF auth_token DEFAULT',
+    'INSERT INTO auth_token '
+    'SELECT * FROM auth_token_unpartitioned WHERE expire_t IS NOT NULL',
+    'DROP TABLE auth_token_unpartitioned',
+]
+
 
 class TokenDAO(BaseDAO):
     def create(self, body, session_body):
-        serialized_metadata = json.dumps(body.get('metadata', {}))
         token = TokenModel(
             auth_id=body['auth_id'],
             pbx_user_uuid=body['pbx_user_uuid'],
@@ -20,7 +52,7 @@ class TokenDAO(BaseDAO):
             expire_t=int(body['expire_t']),
             user_agent=body['user_agent'],
             remote_addr=body['remote_addr'],
-            metadata_=serialized_metadata,
+            metadata_=body.get('metadata', {}),
             acl=body.get('acl') or [],
         )
 
@@ -33,28 +65,79 @@ class TokenDAO(BaseDAO):
         return token.uuid, token.session_uuid
 
     def _get_default_tenant_uuid(self):
-        filter_ = Tenant.uuid == Tenant.parent_uuid
-        return self.session.query(Tenant).filter(filter_).first().uuid
+        return self._get_top_tenant_uuid()
 
     def get(self, token_uuid):
         token = self.session.query(TokenModel).get(token_uuid)
         if token:
-            return {
-                'uuid': token.uuid,
-                'auth_id': token.auth_id,
-                'pbx_user_uuid': token.pbx_user_uuid,
-                'xivo_uuid': token.xivo_uuid,
-                'issued_t': token.issued_t,
-                'expire_t': token.expire_t,
-                'acl': token.acl,
-                'metadata': json.loads(token.metadata_) if token.metadata_ else {},
-                'session_uuid': token.session_uuid,
-                'remote_addr': token.remote_addr,
-                'user_agent': token.user_agent,
-            }
+            return self._token_to_dict(token)
 
         raise exceptions.UnknownTokenException()
 
+    def get_access(self, token_uuid):
+        token = (
+            self.session.query(
+                TokenModel.auth_id,
+                TokenModel.expire_t,
+                TokenModel.acl,
+                TokenModel.metadata_['uuid'].astext.label('user_uuid'),
+                TokenModel.metadata_['tenant_uuid'].astext.label('tenant_uuid'),
+                TokenModel.metadata_['tenants'].label('tenants'),
+            )
+            .filter(TokenModel.uuid == token_uuid)
+            .first()
+        )
+        if not token:
+            raise exceptions.UnknownTokenException()
+
+        metadata = {}
+        if token.user_uuid:
+            metadata['uuid'] = token.user_uuid
+        if token.tenant_uuid:
+            metadata['tenant_uuid'] = token.tenant_uuid
+        if token.tenants is not None:
+            metadata['tenants'] = token.tenants
+
+        return {
+            'auth_id': token.auth_id,
+            'expire_t': token.expire_t,
+            'acl': token.acl,
+            'metadata': metadata,
+        }
+
+    def list_(self, uuids):
+        if not uuids:
+            return []
+
+        filter_ = TokenModel.uuid.in_(uuids)
+        tokens = self.session.query(TokenModel).filter(filter_).all()
+        return [self._token_to_dict(token) for token in tokens]
+
+    def list_sessions(self, auth_id):
+        query = self.session.query(TokenModel.session_uuid, TokenModel.expire_t).filter(
+            TokenModel.auth_id == str(auth_id)
+        )
+        return [
+            {'session_uuid': session_uuid, 'expire_t': expire_t}
+            for session_uuid, expire_t in query.all()
+        ]
+
+    @staticmethod
+    def _token_to_dict(token):
+        return {
+            'uuid': token.uuid,
+            'auth_id': token.auth_id,
+            'pbx_user_uuid': token.pbx_user_uuid,
+            'xivo_uuid': token.xivo_uuid,
+            'issued_t': token.issued_t,
+            'expire_t': token.expire_t,
+            'acl': token.acl,
+            'metadata': token.metadata_ or {},
+            'session_uuid': token.session_uuid,
+            'remote_addr': token.remote_addr,
+            'user_agent': token.user_agent,
+        }
+
     def delete(self, token_uuid):
         filter_ = TokenModel.uuid == token_uuid
 
@@ -77,61 +160,155 @@ class TokenDAO(BaseDAO):
 
         return token_result, session_result
 
-    def get_tokens_and_session_that_expire_soon(self, _time):
-        tokens = self._get_tokens_with_expiration_less_than(time.time() + _time)
-        if not tokens:
-            return [], []
-        filter_ = TokenModel.uuid.in_([token['uuid'] for token in tokens])
-        sessions = self._get_sessions_from_token_filter(filter_)
+    def list_expirations(self, batch_size=10000):
+        query = self.session.query(TokenModel.uuid, TokenModel.expire_t)
+        for token_uuid, expire_t in query.yield_per(batch_size):
+            yield token_uuid, expire_t
+
+    def mark_tokens_and_sessions_that_expire_soon(self, _time, token_uuids=None):
+        table = TokenModel.__table__
+        filter_ = and_(
+            table.c.expire_t < time.time() + _time,
+            table.c.expire_notice_sent.is_(False),
+        )
+        if token_uuids is not None:
+            filter_ = and_(filter_, table.c.uuid.in_(token_uuids))
+        query = (
+            table.update()
+            .where(filter_)
+            .values(expire_notice_sent=True)
+            .returning(*self._expired_token_columns(table))
+        )
+        tokens = [
+            self._expired_token_to_dict(token) for token in self.session.execute(query)
+        ]
+        session_uuids = {token['session_uuid'] for token in tokens}
+        sessions = [{'uuid': session_uuid} for session_uuid in session_uuids]
         return tokens, sessions
 
-    def delete_expired_tokens_and_sessions(self):
-        tokens = self._delete_expired_tokens()
-        sessions = self._delete_expired_sessions()
+    def delete_expired_tokens_and_sessions(self, limit=None, token_uuids=None):
+        tokens = self._delete_expired_tokens(limit, token_uuids)
+        session_uuids = {token['session_uuid'] for token in tokens}
+        sessions = self._delete_orphan_sessions(session_uuids)
         self.session.flush()
         return tokens, sessions
 
-    def _get_tokens_with_expiration_less_than(self, epoch):
-        filter_ = TokenModel.expire_t < epoch
-        tokens = self.session.query(TokenModel).filter(filter_).all()
-        results = []
-        for token in tokens:
-            results.append(
-                {
-                    'uuid': token.uuid,
-                    'auth_id': token.auth_id,
-                    'session_uuid': token.session_uuid,
-                    'metadata': json.loads(token.metadata_) if token.metadata_ else {},
-                }
-            )
-        return results
+    def _delete_expired_tokens(self, limit, token_uuids=None):
+        now = time.time()
+        expired = select([TokenModel.uuid]).where(TokenModel.expire_t < now)
+        if token_uuids is not None:
+            expired = expired.where(TokenModel.uuid.in_(token_uuids))
+        if limit:
+            expired = expired.limit(limit).with_for_update(skip_locked=True)
 
-    def _get_sessions_from_token_filter(self, filter_):
-        sessions = (
-            self.session.query(Session.uuid).outerjoin(TokenModel).filter(filter_).all()
+        # The expire_t predicate prunes the partitions of a partitioned table
+        table = TokenModel.__table__
+        query = (
+            table.delete()
+            .where(and_(table.c.uuid.in_(expired), table.c.expire_t < now))
+            .returning(*self._expired_token_columns(table))
         )
-        results = []
-        for session in sessions:
-            results.append({'uuid': session.uuid})
-        return results
-
-    def _delete_expired_tokens(self):
-        results = self._get_tokens_with_expiration_less_than(time.time())
-        if not results:
-            return results
-        token_uuids = [token['uuid'] for token in results]
-        filter_ = TokenModel.uuid.in_(token_uuids)
-        self.session.query(TokenModel).filter(filter_).delete(synchronize_session=False)
-        self.session.flush()
-        return results
-
-    def _delete_expired_sessions(self):
-        filter_ = TokenModel.uuid.is_(None)
-        results = self._get_sessions_from_token_filter(filter_)
-        if not results:
-            return results
-        session_uuids = [session['uuid'] for session in results]
-        filter_ = Session.uuid.in_(session_uuids)
-        self.session.query(Session).filter(filter_).delete(synchronize_session=False)
+        return [
+            self._expired_token_to_dict(token) for token in self.session.execute(query)
+        ]
+
+    @staticmethod
+    def _expired_token_columns(table):
+        return (
+            table.c.uuid,
+            table.c.auth_id,
+            table.c.session_uuid,
+            table.c.metadata['tenant_uuid'].astext.label('tenant_uuid'),
+        )
+
+    @staticmethod
+    def _expired_token_to_dict(token):
+        return {
+            'uuid': token.uuid,
+            'auth_id': token.auth_id,
+            'session_uuid': token.session_uuid,
+            'tenant_uuid': token.tenant_uuid,
+        }
+
+    def _delete_orphan_sessions(self, session_uuids):
+        if not session_uuids:
+            return []
+
+        table = Session.__table__
+        has_tokens = exists().where(TokenModel.session_uuid == table.c.uuid)
+        query = (
+            table.delete()
+            .where(and_(table.c.uuid.in_(session_uuids), ~has_tokens))
+            .returning(table.c.uuid, table.c.tenant_uuid)
+        )
+        return [
+            {'uuid': session.uuid, 'tenant_uuid': session.tenant_uuid}
+            for session in self.session.execute(query)
+        ]
+
+    def is_partitioned(self):
+        query = text(
+            'SELECT 1 FROM pg_partitioned_table '
+            "WHERE partrelid = 'auth_token'::regclass"
+        )
+        return self.session.execute(query).scalar() is not None
+
+    def partition_table(self):
+        for statement in PARTITION_TABLE_STATEMENTS:
+            self.session.execute(text(statement))
+
+    def lock_partitions(self):
+        query = text('SELECT pg_try_advisory_xact_lock(:key)')
+        return self.session.execute(query, {'key': PARTITIONS_LOCK}).scalar()
+
+    def list_partitions(self):
+        query = text(
+            'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) '
+            'FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            "WHERE i.inhparent = 'auth_token'::regclass"
+        )
+        partitions = []
+        for name, bounds in self.session.execute(query):
+            match = PARTITION_BOUNDS.search(bounds)
+            if not match:  # the default partition
+                continue
+            start, end = match.groups()
+            partitions.append({'name': name, 'start': int(start), 'end': int(end)})
+        return sorted(partitions, key=lambda partition: partition['start'])
+
+    def create_partition(self, start, end):
+        # The tokens already in the default partition are moved before
+        # attaching, a new partition cannot overlap rows of the default one.
+        # The default partition is locked until the commit so that no token
+        # is inserted into it between the move and the attach. The parent
+        # table is locked first, in the same order as the inserts and the
+        # attach, to avoid deadlocks
+        name = 'auth_token_p{}'.format(start)
+        statements = [
+            'LOCK TABLE ONLY auth_token IN ACCESS EXCLUSIVE MODE',
+            'LOCK TABLE ONLY auth_token_default IN ACCESS EXCLUSIVE MODE',
+            'CREATE TABLE {name} (LIKE auth_token INCLUDING DEFAULTS)',
+            'WITH moved AS ('
+            'DELETE FROM auth_token_default '
+            'WHERE expire_t >= {start} AND expire_t < {end} RETURNING *'
+            ') INSERT INTO {name} SELECT * FROM moved',
+            'ALTER TABLE auth_token ATTACH PARTITION {name} '
+            'FOR VALUES FROM ({start}) TO ({end})',
+        ]
+        for statement in statements:
+            self.session.execute(
+                text(statement.format(name=name, start=int(start), end=int(end)))
+            )
+        return name
+
+    def drop_partition(self, name):
+        table = TokenModel.__table__.tometadata(MetaData(), name=name)
+        query = select(self._expired_token_columns(table))
+        tokens = [
+            self._expired_token_to_dict(token) for token in self.session.execute(query)
+        ]
+        self.session.execute(text('DROP TABLE {}'.format(name)))
+        session_uuids = {token['session_uuid'] for token in tokens}
+        sessions = self._delete_orphan_sessions(session_uuids)
         self.session.flush()
-        return results
+        return tokens, sessions
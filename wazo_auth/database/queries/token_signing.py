@@ -0,0 +1,82 @@
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import time
+
+from sqlalchemy import and_, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from .base import BaseDAO
+from ..models import TokenRevocation, TokenSigningKey
+
+KEY_ROTATION_LOCK = 0x617574685F6B6579  # arbitrary, shared by all wazo-auth nodes
+
+
+class TokenSigningDAO(BaseDAO):
+    def list_keys(self):
+        query = self.session.query(TokenSigningKey).order_by(
+            TokenSigningKey.created_at.desc()
+        )
+        return [self._key_to_dict(key) for key in query.all()]
+
+    def rotate_key(self, key, rotation_interval, retained_keys):
+        # Committed in its own transaction, a key must be stored before it signs
+        # a token whatever happens to the transaction of the caller
+        table = TokenSigningKey.__table__
+        with self.session.get_bind().begin() as connection:
+            # Nodes rotating at the same time wait for each other, only the
+            # first one adds a key
+            query = text('SELECT pg_advisory_xact_lock(:key)')
+            connection.execute(query, key=KEY_ROTATION_LOCK)
+
+            query = select([table]).order_by(table.c.created_at.desc())
+            keys = [self._key_to_dict(row) for row in connection.execute(query)]
+            if (
+                not keys
+                or key['created_at'] - keys[0]['created_at'] >= rotation_interval
+            ):
+                connection.execute(table.insert().values(**key))
+                keys.insert(0, key)
+
+            removed_kids = [removed['kid'] for removed in keys[retained_keys:]]
+            if removed_kids:
+                connection.execute(table.delete().where(table.c.kid.in_(removed_kids)))
+
+        return keys[:retained_keys]
+
+    def add_revocation(self, uuid, expire_t):
+        now = int(time.time())
+        self.session.query(TokenRevocation).filter(
+            TokenRevocation.expire_t <= now
+        ).delete(synchronize_session=False)
+
+        query = (
+            insert(TokenRevocation)
+            .values(uuid=str(uuid), expire_t=int(expire_t), revoked_at=now)
+            .on_conflict_do_nothing()
+        )
+        self.session.execute(query)
+        self.session.flush()
+
+    def list_revocations(self, revoked_since=None):
+        filter_ = TokenRevocation.expire_t > int(time.time())
+        if revoked_since is not None:
+            filter_ = and_(filter_, TokenRevocation.revoked_at >= revoked_since)
+
+        query = self.session.query(TokenRevocation).filter(filter_)
+        return [
+            {
+                'uuid': revocation.uuid,
+                'expire_t': revocation.expire_t,
+                'revoked_at': revocation.revoked_at,
+            }
+            for revocation in query.all()
+        ]
+
+    @staticmethod
+    def _key_to_dict(key):
+        return {
+            'kid': key.kid,
+            'private_key': key.private_key,
+            'created_at': key.created_at,
+        }
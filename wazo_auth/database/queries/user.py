@@ -3,7 +3,7 @@
 
 from sqlalchemy import and_, exc, text
 from sqlalchemy.orm import joinedload
-from .base import BaseDAO, PaginatorMixin
+from .base import BaseDAO, PaginatorMixin, tenant_filter
 from . import filters
 from ..models import (
     Email,
@@ -83,7 +83,7 @@ class UserDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
 
         tenant_uuids = kwargs.get('tenant_uuids')
         if tenant_uuids:
-            filter_ = User.tenant_uuid.in_(tenant_uuids)
+            filter_ = tenant_filter(User.tenant_uuid, tenant_uuids)
 
         filtered = kwargs.get('filtered')
         if filtered is not False:
@@ -217,6 +217,22 @@ class UserDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
 
         raise exceptions.UnknownUsernameException(username)
 
+    def get_login(self, username):
+        query = self.session.query(
+            User.uuid,
+            User.username,
+            User.tenant_uuid,
+            User.purpose,
+            User.enabled,
+            User.password_hash,
+            User.password_salt,
+        ).filter(User.username == username)
+
+        for row in query.all():
+            return row._asdict()
+
+        raise exceptions.UnknownUsernameException(username)
+
     def get_emails(self, user_uuid):
         result = []
 
@@ -243,7 +259,7 @@ class UserDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
 
         tenant_uuids = kwargs.get('tenant_uuids')
         if tenant_uuids is not None:
-            filter_ = and_(filter_, User.tenant_uuid.in_(tenant_uuids))
+            filter_ = and_(filter_, tenant_filter(User.tenant_uuid, tenant_uuids))
 
         tenant_uuid = kwargs.get('tenant_uuid')
         if tenant_uuid:
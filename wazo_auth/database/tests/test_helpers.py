@@ -0,0 +1,69 @@
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+
+from hamcrest import assert_that, calling, equal_to, has_entries, raises
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError
+
+from ..helpers import CheckoutStats, InstrumentedQueuePool
+
+
+class TestCheckoutStats(unittest.TestCase):
+    def test_to_dict(self):
+        stats = CheckoutStats()
+        assert_that(stats.to_dict(), has_entries(count=0, average_wait=0.0))
+
+        stats.add(0.5)
+        stats.add(1.5, timeout=True)
+
+        assert_that(
+            stats.to_dict(),
+            equal_to({'count': 2, 'timeouts': 1, 'average_wait': 1.0, 'max_wait': 1.5}),
+        )
+
+
+class TestInstrumentedQueuePool(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            'sqlite://',
+            poolclass=InstrumentedQueuePool,
+            pool_size=1,
+            max_overflow=1,
+            pool_timeout=0.01,
+        )
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_stats(self):
+        connections = [self.engine.connect(), self.engine.connect()]
+
+        assert_that(
+            self.engine.pool.stats(),
+            has_entries(
+                size=1,
+                checked_out=2,
+                overflow=1,
+                checkout=has_entries(count=2, timeouts=0),
+            ),
+        )
+
+        assert_that(calling(self.engine.connect), raises(TimeoutError))
+        assert_that(
+            self.engine.pool.stats(), has_entries(checkout=has_entries(timeouts=1))
+        )
+
+        for connection in connections:
+            connection.close()
+        assert_that(self.engine.pool.stats(), has_entries(checked_out=0, overflow=0))
+
+    def test_that_the_stats_are_kept_when_the_pool_is_recreated(self):
+        self.engine.connect().close()
+
+        self.engine.dispose()
+
+        assert_that(
+            self.engine.pool.stats(), has_entries(checkout=has_entries(count=1))
+        )
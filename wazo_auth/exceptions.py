@@ -41,6 +41,22 @@ class AuthenticationFailedException(TokenServiceException):
         return self._msg
 
 
+class PasswordHashQueueFullException(TokenServiceException):
+
+    code = 429
+
+    def __str__(self):
+        return 'Too many password verifications in progress'
+
+
+class PasswordHashTimeoutException(TokenServiceException):
+
+    code = 503
+
+    def __str__(self):
+        return 'Password verification timed out'
+
+
 class ExternalAuthAlreadyExists(APIException):
     def __init__(self, auth_type):
         msg = 'This external authentification method has already been set: "{}"'.format(
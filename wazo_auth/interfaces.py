@@ -68,6 +68,32 @@ class BaseAuthenticationBackend(metaclass=abc.ABCMeta):
         return True
 
 
+class LoginContext:
+    """The user logging in with the wazo_user backend
+
+    The user is loaded once per token creation and passed to the backend and
+    metadata plugins in args['login_context'].
+    """
+
+    def __init__(
+        self,
+        uuid,
+        username,
+        tenant_uuid,
+        purpose,
+        enabled,
+        password_hash=None,
+        password_salt=None,
+    ):
+        self.uuid = uuid
+        self.username = username
+        self.tenant_uuid = tenant_uuid
+        self.purpose = purpose
+        self.enabled = enabled
+        self.password_hash = password_hash
+        self.password_salt = password_salt
+
+
 class BaseMetadata(metaclass=abc.ABCMeta):
     def __init__(self):
         """Initialize this plugin instance from the given configuration"""
@@ -81,7 +107,7 @@ class BaseMetadata(metaclass=abc.ABCMeta):
 
         These data are used in the body of the GET and POST of the /token
         """
-        user = self._user_service.list_users(username=login)[0]
+        user = self.get_login_user(login, args)
         metadata = {
             'uuid': user['uuid'],
             'tenant_uuid': user['tenant_uuid'],
@@ -91,6 +117,16 @@ class BaseMetadata(metaclass=abc.ABCMeta):
         }
         return metadata
 
+    def get_login_user(self, login, args):
+        """returns the uuid and tenant_uuid of the user logging in
+
+        The login context loaded by the backend is used when available
+        """
+        context = args.get('login_context')
+        if context and context.username == login:
+            return {'uuid': context.uuid, 'tenant_uuid': context.tenant_uuid}
+        return self._user_service.list_users(username=login)[0]
+
     def get_xivo_uuid(self, _args):
         """returns the xivo-uuid for this given backend
 
@@ -0,0 +1,29 @@
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import argparse
+
+from wazo_auth.bootstrap import get_database_uri_from_config
+from wazo_auth.database import queries
+from wazo_auth.database.helpers import commit_or_rollback, init_db
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            'Partition the auth_token table by expiration time. '
+            'wazo-auth must be stopped on all nodes.'
+        )
+    )
+    parser.add_argument('--uri', help='the database URI, from the config by default')
+    args = parser.parse_args()
+
+    init_db(args.uri or get_database_uri_from_config())
+    dao = queries.DAO.from_defaults()
+    if dao.token.is_partitioned():
+        print('auth_token is already partitioned')
+        return
+
+    dao.token.partition_table()
+    commit_or_rollback()
+    print('auth_token is now partitioned, enable the token_partitioning section')
@@ -12,21 +12,30 @@ class WazoUser(BaseAuthenticationBackend):
     def load(self, dependencies):
         super().load(dependencies)
         self._user_service = dependencies['user_service']
-        self._group_service = dependencies['group_service']
         self._purposes = dependencies['purposes']
 
     def get_acl(self, login, args):
-        backend_acl = args.get('acl', [])
-        group_acl = self._group_service.get_acl(login)
-        user_acl = self._user_service.get_acl(login)
-        return backend_acl + group_acl + user_acl
+        backend_policy_name = args.get('backend_policy')
+        return self._user_service.get_effective_acl(login, backend_policy_name)
 
     def verify_password(self, username, password, args):
-        return self._user_service.verify_password(username, password)
+        login_context = self._get_login_context(username, args)
+        if not login_context:
+            return False
+        return self._user_service.verify_password(
+            username, password, login_context=login_context
+        )
 
     def get_metadata(self, login, args):
         metadata = {}
-        purpose = self._user_service.list_users(username=login)[0]['purpose']
+        purpose = self._get_login_context(login, args).purpose
         for plugin in self._purposes.get(purpose).metadata_plugins:
             metadata.update(plugin.get_token_metadata(login, args))
         return metadata
+
+    def _get_login_context(self, login, args):
+        login_context = args.get('login_context')
+        if not login_context or login_context.username != login:
+            login_context = self._user_service.get_login_context(login)
+            args['login_context'] = login_context
+        return login_context
@@ -1,14 +1,25 @@
 # Copyright 2020 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+from xivo.auth_verifier import extract_token_id_from_query_or_header, Unauthorized
 from xivo.status import Status
 
 from wazo_auth.http import ErrorCatchingResource
 
 
 class StatusList(ErrorCatchingResource):
-    def __init__(self, status_aggregator):
+    def __init__(self, status_aggregator, auth_client):
         self.status_aggregator = status_aggregator
+        self.auth_client = auth_client
+
+    def get(self):
+        token_id = extract_token_id_from_query_or_header()
+        if not self.auth_client.token.is_valid(
+            token_id, required_access='auth.status.read'
+        ):
+            raise Unauthorized(token_id)
+
+        return self.status_aggregator.status(), 200
 
     def head(self):
         for component in self.status_aggregator.status().values():
@@ -3,6 +3,7 @@
 
 from xivo.status import Status
 
+from wazo_auth.http import AuthClientFacade
 from .http import StatusList
 
 
@@ -13,7 +14,11 @@ class Plugin:
 
         status_aggregator.add_provider(provide_status)
 
-        api.add_resource(StatusList, '/status', resource_class_args=[status_aggregator])
+        api.add_resource(
+            StatusList,
+            '/status',
+            resource_class_args=[status_aggregator, AuthClientFacade()],
+        )
 
 
 def provide_status(status):
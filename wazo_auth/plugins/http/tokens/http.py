@@ -186,8 +186,7 @@ class Token(BaseResource):
         scope = request.args.get('scope')
         tenant = request.args.get('tenant')
 
-        token = self._token_service.get(token_uuid, scope).to_dict()
-        self._token_service.assert_has_tenant_permission(token, tenant)
+        self._token_service.check(token_uuid, scope, tenant)
 
         return '', 204
 
@@ -206,3 +205,32 @@ class TokenScopesCheck(BaseResource):
             token.to_dict(), args['tenant_uuid']
         )
         return {'scopes': scopes_statuses}, 200
+
+
+class _BaseSignedTokens(http.AuthResource):
+    def __init__(self, token_service, user_service, authentication_service):
+        self._token_service = token_service
+
+
+class TokenSigningKeys(_BaseSignedTokens):
+    @http.required_acl('auth.tokens.keys.read')
+    def get(self):
+        return {'keys': self._token_service.list_signing_keys()}, 200
+
+
+class RevokedTokens(_BaseSignedTokens):
+    @http.required_acl('auth.tokens.revoked.read')
+    def get(self):
+        return {'items': self._token_service.list_revoked_tokens()}, 200
+
+
+class TokensValidate(BaseResource):
+    def post(self):
+        try:
+            args = schemas.TokenValidateRequestSchema().load(
+                request.get_json(force=True)
+            )
+        except marshmallow.ValidationError as e:
+            return http._error(400, str(e.messages))
+
+        return {'data': self._token_service.validate_tokens(args['tokens'])}, 200
@@ -23,6 +23,15 @@ class Plugin:
             resource_class_args=args,
         )
         api.add_resource(http.RefreshTokens, '/tokens', resource_class_args=args)
+        api.add_resource(
+            http.TokensValidate, '/tokens/validate', resource_class_args=args
+        )
+        api.add_resource(
+            http.TokenSigningKeys, '/tokens/keys', resource_class_args=args
+        )
+        api.add_resource(
+            http.RevokedTokens, '/tokens/revoked', resource_class_args=args
+        )
         api.add_resource(
             http.UserRefreshTokens,
             '/users/<uuid:user_uuid>/tokens',
@@ -9,6 +9,11 @@ from xivo.mallow import fields as xfields
 
 from wazo_auth.schemas import BaseListSchema, BaseSchema
 
+MAX_VALIDATED_TOKENS = 500
+# A scope is matched in a time that does not depend on the size of the ACL,
+# checking this many scopes takes in the order of 50ms
+MAX_CHECKED_SCOPES = 10000
+
 
 class TokenRequestSchema(Schema):
     backend = fields.String(missing='wazo_user')
@@ -64,5 +69,19 @@ class RefreshTokenSchema(BaseSchema):
 
 
 class TokenScopesRequestSchema(BaseSchema):
-    scopes = xfields.List(xfields.String())
+    scopes = xfields.List(xfields.String(), validate=Length(max=MAX_CHECKED_SCOPES))
     tenant_uuid = xfields.String(missing=None)
+
+
+class TokenValidateSchema(BaseSchema):
+    token = xfields.String(validate=Length(min=1), required=True)
+    scope = xfields.String(missing=None)
+    tenant = xfields.String(missing=None)
+
+
+class TokenValidateRequestSchema(BaseSchema):
+    tokens = xfields.List(
+        xfields.Nested(TokenValidateSchema),
+        validate=Length(min=1, max=MAX_VALIDATED_TOKENS),
+        required=True,
+    )
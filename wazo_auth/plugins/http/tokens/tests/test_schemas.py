@@ -8,7 +8,7 @@ from marshmallow.exceptions import ValidationError
 from hamcrest import assert_that, calling, has_properties, has_item, not_
 from xivo_test_helpers.hamcrest.raises import raises
 
-from ..schemas import TokenRequestSchema
+from ..schemas import MAX_CHECKED_SCOPES, TokenRequestSchema, TokenScopesRequestSchema
 
 
 class TestTokenRequestSchema(TestCase):
@@ -72,3 +72,23 @@ class TestTokenRequestSchema(TestCase):
                 has_properties(field_names=has_item('_schema'))
             ),
         )
+
+
+class TestTokenScopesRequestSchema(TestCase):
+    def setUp(self):
+        self.schema = TokenScopesRequestSchema()
+
+    def test_scopes_limit(self):
+        scopes = ['confd.users.{}.read'.format(i) for i in range(MAX_CHECKED_SCOPES)]
+
+        assert_that(
+            calling(self.schema.load).with_args({'scopes': scopes}),
+            not_(raises(Exception)),
+        )
+
+        assert_that(
+            calling(self.schema.load).with_args({'scopes': scopes + ['one.more']}),
+            raises(ValidationError).matching(
+                has_properties(field_names=has_item('scopes'))
+            ),
+        )
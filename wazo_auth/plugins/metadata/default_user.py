@@ -14,7 +14,7 @@ class DefaultUser(BaseMetadata):
         self._user_service = dependencies['user_service']
 
     def get_token_metadata(self, login, args):
-        user = self._user_service.list_users(username=login)[0]
+        user = self.get_login_user(login, args)
         metadata = {
             'uuid': user['uuid'],
             'tenant_uuid': user['tenant_uuid'],
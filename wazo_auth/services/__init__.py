@@ -10,7 +10,7 @@ from .policy import PolicyService
 from .session import SessionService
 from .tenant import TenantService
 from .token import TokenService
-from .user import UserService, PasswordEncrypter
+from .user import UserService, PasswordEncrypter, PasswordHashExecutor
 
 __all__ = [
     "AllUsersService",
@@ -19,6 +19,7 @@ __all__ = [
     "ExternalAuthService",
     "GroupService",
     "PasswordEncrypter",
+    "PasswordHashExecutor",
     "PolicyService",
     "SessionService",
     "TenantService",
@@ -11,7 +11,7 @@ import marshmallow
 from xivo_bus.resources.auth import events
 
 from wazo_auth.services.helpers import BaseService
-from wazo_auth.database.helpers import commit_or_rollback
+from wazo_auth.database.helpers import commit_or_rollback, use_background_engine
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +31,7 @@ class _OAuth2Synchronizer:
         logger.debug('synchronization started')
 
     def _synchronize(self, event, state, success_cb):
+        use_background_engine()
         url = self._url_tpl.format(state=state)
         logger.debug('waiting on external authentication to complete %s...', url)
         ws = websocket.WebSocketApp(
@@ -2,21 +2,32 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from wazo_auth import exceptions
-from wazo_auth.services.helpers import BaseService
+from wazo_auth.database.helpers import after_commit
+from wazo_auth.services.helpers import ACLCache, BaseService
 
 
 class GroupService(BaseService):
+    def __init__(self, dao, tenant_tree, acl_cache=None):
+        super().__init__(dao, tenant_tree)
+        self._acl_cache = acl_cache or ACLCache()
+
     def add_policy(self, group_uuid, policy_uuid):
-        return self._dao.group.add_policy(group_uuid, policy_uuid)
+        result = self._dao.group.add_policy(group_uuid, policy_uuid)
+        after_commit(self._acl_cache.invalidate)
+        return result
 
     def add_user(self, group_uuid, user_uuid):
         if self._dao.group.is_system_managed(group_uuid):
             raise exceptions.SystemGroupForbidden(group_uuid)
 
-        return self._dao.group.add_user(group_uuid, user_uuid)
+        result = self._dao.group.add_user(group_uuid, user_uuid)
+        after_commit(self._acl_cache.invalidate)
+        return result
 
     def add_user_from_system(self, group_uuid, user_uuid):
-        return self._dao.group.add_user(group_uuid, user_uuid)
+        result = self._dao.group.add_user(group_uuid, user_uuid)
+        after_commit(self._acl_cache.invalidate)
+        return result
 
     def count(self, scoping_tenant_uuid, recurse=False, **kwargs):
         if scoping_tenant_uuid:
@@ -37,16 +48,18 @@ class GroupService(BaseService):
         return dict(uuid=uuid, **kwargs)
 
     def delete(self, group_uuid, scoping_tenant_uuid):
-        tenant_uuids = self._tenant_tree.list_visible_tenants(scoping_tenant_uuid)
+        tenant_uuids = self._get_tenant_scope(scoping_tenant_uuid)
         if self._dao.group.is_system_managed(group_uuid, tenant_uuids):
             raise exceptions.SystemGroupForbidden(group_uuid)
-        return self._dao.group.delete(group_uuid, tenant_uuids=tenant_uuids)
+        result = self._dao.group.delete(group_uuid, tenant_uuids=tenant_uuids)
+        after_commit(self._acl_cache.invalidate)
+        return result
 
     def get(self, group_uuid, scoping_tenant_uuid):
         args = {
             'uuid': group_uuid,
             'limit': 1,
-            'tenant_uuids': self._tenant_tree.list_visible_tenants(scoping_tenant_uuid),
+            'tenant_uuids': self._get_tenant_scope(scoping_tenant_uuid),
         }
 
         matching_groups = self._dao.group.list_(**args)
@@ -66,17 +79,6 @@ class GroupService(BaseService):
         for group in matching_groups:
             return group
 
-    def get_acl(self, username):
-        users = self._dao.user.list_(username=username, limit=1)
-        acl = []
-        for user in users:
-            groups = self._dao.group.list_(user_uuid=user['uuid'])
-            for group in groups:
-                policies = self.list_policies(group['uuid'])
-                for policy in policies:
-                    acl.extend(policy['acl'])
-        return acl
-
     def list_(self, scoping_tenant_uuid=None, recurse=False, **kwargs):
         if scoping_tenant_uuid:
             kwargs['tenant_uuids'] = self._get_scoped_tenant_uuids(
@@ -94,6 +96,7 @@ class GroupService(BaseService):
     def remove_policy(self, group_uuid, policy_uuid):
         nb_deleted = self._dao.group.remove_policy(group_uuid, policy_uuid)
         if nb_deleted:
+            after_commit(self._acl_cache.invalidate)
             return
 
         if not self._dao.group.exists(group_uuid):
@@ -108,6 +111,7 @@ class GroupService(BaseService):
 
         nb_deleted = self._dao.group.remove_user(group_uuid, user_uuid)
         if nb_deleted:
+            after_commit(self._acl_cache.invalidate)
             return
 
         if not self._dao.group.exists(group_uuid):
@@ -122,7 +126,7 @@ class GroupService(BaseService):
         return self._dao.group.update(group_uuid, **kwargs)
 
     def assert_group_in_subtenant(self, scoping_tenant_uuid, uuid):
-        tenant_uuids = self._tenant_tree.list_visible_tenants(scoping_tenant_uuid)
+        tenant_uuids = self._get_tenant_scope(scoping_tenant_uuid)
         exists = self._dao.group.exists(uuid, tenant_uuids=tenant_uuids)
         if not exists:
             raise exceptions.UnknownGroupException(uuid)
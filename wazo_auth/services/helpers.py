@@ -3,9 +3,14 @@
 
 import logging
 import os
+import threading
+import time
 
 from jinja2 import BaseLoader, Environment, TemplateNotFound
 
+from wazo_auth.cache import LRUCache
+from wazo_auth.database.queries.base import TenantScope
+
 logger = logging.getLogger(__name__)
 
 
@@ -17,10 +22,19 @@ class BaseService:
 
     def _get_scoped_tenant_uuids(self, scoping_tenant_uuid, recurse):
         if recurse:
-            return self._tenant_tree.list_visible_tenants(scoping_tenant_uuid)
+            return self._get_tenant_scope(scoping_tenant_uuid)
 
         return [scoping_tenant_uuid]
 
+    def _get_tenant_scope(self, scoping_tenant_uuid):
+        if scoping_tenant_uuid is None:
+            return TenantScope()
+
+        if str(scoping_tenant_uuid) == self.top_tenant_uuid:
+            return TenantScope()
+
+        return TenantScope(scoping_tenant_uuid)
+
     @property
     def top_tenant_uuid(self):
         if not self._top_tenant_uuid:
@@ -84,9 +98,160 @@ class TemplateFormatter:
 
 
 class TenantTree:
+    """The tenant hierarchy, read from the database on each call"""
+
     def __init__(self, tenant_dao):
         self._tenant_dao = tenant_dao
 
     def list_visible_tenants(self, scoping_tenant_uuid):
         visible_tenants = self._tenant_dao.list_visible_tenants(scoping_tenant_uuid)
         return [tenant.uuid for tenant in visible_tenants]
+
+    def is_under(self, tenant_uuid, scoping_tenant_uuid):
+        return self._tenant_dao.is_under(tenant_uuid, scoping_tenant_uuid)
+
+    def add(self, tenant_uuid, parent_uuid):
+        pass
+
+    def remove(self, tenant_uuid):
+        pass
+
+    def invalidate(self):
+        pass
+
+
+class TenantIndex(TenantTree):
+    """In-memory index of the tenant hierarchy
+
+    The descendants of each tenant are precomputed when the index is loaded.
+    The tenants added or removed by this process are applied once committed,
+    the index is reloaded when another process creates or deletes a tenant and
+    every reload_interval seconds in case an event was missed.
+    """
+
+    def __init__(self, tenant_dao, reload_interval=None):
+        super().__init__(tenant_dao)
+        self._reload_interval = reload_interval
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._top_tenant_uuid = None
+        self._parents = {}
+        self._children = {}
+        self._descendants = {}
+
+    def list_visible_tenants(self, scoping_tenant_uuid):
+        with self._lock:
+            self._ensure_loaded()
+            if scoping_tenant_uuid is None:
+                scoping_tenant_uuid = self._top_tenant_uuid
+            return list(self._descendants.get(str(scoping_tenant_uuid), ()))
+
+    def is_under(self, tenant_uuid, scoping_tenant_uuid):
+        with self._lock:
+            self._ensure_loaded()
+            if scoping_tenant_uuid is None:
+                scoping_tenant_uuid = self._top_tenant_uuid
+            descendants = self._descendants.get(str(scoping_tenant_uuid), ())
+            return str(tenant_uuid) in descendants
+
+    def add(self, tenant_uuid, parent_uuid):
+        tenant_uuid, parent_uuid = str(tenant_uuid), str(parent_uuid)
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            self._add(tenant_uuid, parent_uuid)
+            for ancestor_uuid in self._ancestors(parent_uuid):
+                self._descendants[ancestor_uuid].add(tenant_uuid)
+
+    def remove(self, tenant_uuid):
+        tenant_uuid = str(tenant_uuid)
+        with self._lock:
+            if tenant_uuid not in self._parents:
+                return
+            removed = self._descendants[tenant_uuid]
+            parent_uuid = self._parents[tenant_uuid]
+            self._children[parent_uuid].discard(tenant_uuid)
+            for ancestor_uuid in self._ancestors(parent_uuid):
+                self._descendants[ancestor_uuid] -= removed
+            for uuid in removed:
+                del self._parents[uuid]
+                del self._children[uuid]
+                del self._descendants[uuid]
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def reload(self):
+        tenants = self._tenant_dao.list_parents()
+        with self._lock:
+            self._top_tenant_uuid = None
+            self._parents, self._children, self._descendants = {}, {}, {}
+            for tenant_uuid, parent_uuid in tenants:
+                self._add(tenant_uuid, parent_uuid)
+            for tenant_uuid in self._parents:
+                for ancestor_uuid in self._ancestors(self._parents[tenant_uuid]):
+                    self._descendants[ancestor_uuid].add(tenant_uuid)
+            self._loaded_at = time.monotonic()
+
+    def _add(self, tenant_uuid, parent_uuid):
+        self._parents[tenant_uuid] = parent_uuid
+        self._children.setdefault(tenant_uuid, set())
+        self._descendants.setdefault(tenant_uuid, set()).add(tenant_uuid)
+        if tenant_uuid == parent_uuid:
+            self._top_tenant_uuid = tenant_uuid
+        else:
+            self._children.setdefault(parent_uuid, set()).add(tenant_uuid)
+            self._descendants.setdefault(parent_uuid, {parent_uuid})
+
+    def _ancestors(self, tenant_uuid):
+        while tenant_uuid in self._parents:
+            yield tenant_uuid
+            parent_uuid = self._parents[tenant_uuid]
+            if parent_uuid == tenant_uuid:
+                return
+            tenant_uuid = parent_uuid
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None:
+            return self.reload()
+
+        if self._reload_interval is None:
+            return
+
+        if time.monotonic() - self._loaded_at > self._reload_interval:
+            self.reload()
+
+
+class ACLCache:
+    """The effective ACL of users, by username and backend policy
+
+    The entries are stored with the version of the policies and of the group
+    and policy associations. Any change to those increments the version once
+    committed, which invalidates all entries, including the ones being computed
+    concurrently from the previous rows.
+    """
+
+    def __init__(self, cache=None):
+        self._cache = cache or LRUCache(max_size=0)
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        key = (key, self._version)
+        acl = self._cache.get(key)
+        if acl is None:
+            acl = tuple(compute())
+            self._cache.set(key, acl)
+        return list(acl)
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._cache.clear()
+
+    def provide_status(self, status):
+        status['acl_cache'] = self.stats()
+
+    def stats(self):
+        return dict(self._cache.stats(), version=self._version)
@@ -2,17 +2,24 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from wazo_auth import exceptions
-from wazo_auth.services.helpers import BaseService
+from wazo_auth.database.helpers import after_commit
+from wazo_auth.services.helpers import ACLCache, BaseService
 
 
 class PolicyService(BaseService):
+    def __init__(self, dao, tenant_tree, acl_cache=None):
+        super().__init__(dao, tenant_tree)
+        self._acl_cache = acl_cache or ACLCache()
+
     def add_access(self, policy_uuid, access, scoping_tenant_uuid):
         self._assert_in_tenant_subtree(policy_uuid, scoping_tenant_uuid)
 
-        return self._dao.policy.associate_policy_access(policy_uuid, access)
+        result = self._dao.policy.associate_policy_access(policy_uuid, access)
+        after_commit(self._acl_cache.invalidate)
+        return result
 
     def assert_policy_in_subtenant(self, scoping_tenant_uuid, uuid):
-        tenant_uuids = self._tenant_tree.list_visible_tenants(scoping_tenant_uuid)
+        tenant_uuids = self._get_tenant_scope(scoping_tenant_uuid)
         exists = self._dao.policy.exists(uuid, tenant_uuids=tenant_uuids)
         if not exists:
             raise exceptions.UnknownPolicyException(uuid)
@@ -25,9 +32,7 @@ class PolicyService(BaseService):
         if scoping_tenant_uuid:
             recurse = kwargs.get('recurse')
             if recurse:
-                kwargs['tenant_uuids'] = self._tenant_tree.list_visible_tenants(
-                    scoping_tenant_uuid
-                )
+                kwargs['tenant_uuids'] = self._get_tenant_scope(scoping_tenant_uuid)
             else:
                 kwargs['tenant_uuids'] = [scoping_tenant_uuid]
 
@@ -39,17 +44,18 @@ class PolicyService(BaseService):
     def delete(self, policy_uuid, scoping_tenant_uuid):
         args = {}
         if scoping_tenant_uuid:
-            args['tenant_uuids'] = self._tenant_tree.list_visible_tenants(
-                scoping_tenant_uuid
-            )
+            args['tenant_uuids'] = self._get_tenant_scope(scoping_tenant_uuid)
 
-        return self._dao.policy.delete(policy_uuid, **args)
+        result = self._dao.policy.delete(policy_uuid, **args)
+        after_commit(self._acl_cache.invalidate)
+        return result
 
     def delete_access(self, policy_uuid, access, scoping_tenant_uuid):
         self._assert_in_tenant_subtree(policy_uuid, scoping_tenant_uuid)
 
         nb_deleted = self._dao.policy.dissociate_policy_access(policy_uuid, access)
         if nb_deleted:
+            after_commit(self._acl_cache.invalidate)
             return
 
         if not self._dao.policy.exists(policy_uuid):
@@ -58,7 +64,7 @@ class PolicyService(BaseService):
     def get(self, policy_uuid, scoping_tenant_uuid):
         args = {
             'uuid': policy_uuid,
-            'tenant_uuids': self._tenant_tree.list_visible_tenants(scoping_tenant_uuid),
+            'tenant_uuids': self._get_tenant_scope(scoping_tenant_uuid),
         }
 
         matching_policies = self._dao.policy.get(**args)
@@ -82,20 +88,17 @@ class PolicyService(BaseService):
         args = dict(body)
         args.setdefault('config_managed', False)
         if scoping_tenant_uuid:
-            args['tenant_uuids'] = self._tenant_tree.list_visible_tenants(
-                scoping_tenant_uuid
-            )
+            args['tenant_uuids'] = self._get_tenant_scope(scoping_tenant_uuid)
 
         self._dao.policy.update(policy_uuid, **args)
+        after_commit(self._acl_cache.invalidate)
         return dict(uuid=policy_uuid, **body)
 
     def _assert_in_tenant_subtree(self, policy_uuid, scoping_tenant_uuid):
         if not scoping_tenant_uuid:
             return
 
-        visible_tenant_uuids = self._tenant_tree.list_visible_tenants(
-            scoping_tenant_uuid
-        )
+        visible_tenant_uuids = self._get_tenant_scope(scoping_tenant_uuid)
         matching_policies = self._dao.policy.get(
             uuid=policy_uuid, tenant_uuids=visible_tenant_uuids
         )
@@ -1,14 +1,22 @@
 # Copyright 2019-2020 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+from functools import partial
+
+from wazo_auth.cache import LRUCache
+from wazo_auth.database.helpers import after_commit
 from wazo_auth.services.helpers import BaseService
 from xivo_bus.resources.auth.events import SessionDeletedEvent
 
 
 class SessionService(BaseService):
-    def __init__(self, dao, tenant_tree, bus_publisher):
+    def __init__(
+        self, dao, tenant_tree, bus_publisher, token_cache=None, token_signer=None
+    ):
         super().__init__(dao, tenant_tree)
         self._bus_publisher = bus_publisher
+        self._token_cache = token_cache or LRUCache(max_size=0)
+        self._token_signer = token_signer
 
     def count(self, scoping_tenant_uuid, recurse=False, **kwargs):
         if scoping_tenant_uuid:
@@ -26,11 +34,16 @@ class SessionService(BaseService):
         return self._dao.session.list_(**kwargs)
 
     def delete(self, scoping_tenant_uuid, session_uuid):
-        tenant_uuids = self._tenant_tree.list_visible_tenants(scoping_tenant_uuid)
+        tenant_uuids = self._get_tenant_scope(scoping_tenant_uuid)
         session, token = self._dao.session.delete(session_uuid, tenant_uuids)
         if not token:
             return
 
+        self._token_cache.invalidate(token['uuid'])
+        after_commit(partial(self._token_cache.invalidate, token['uuid']))
+        if self._token_signer and token['expire_t']:
+            self._token_signer.revoke(session['uuid'], token['expire_t'])
+
         event = SessionDeletedEvent(
             uuid=session['uuid'],
             user_uuid=token['auth_id'],
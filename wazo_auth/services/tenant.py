@@ -1,9 +1,13 @@
 # Copyright 2018-2020 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+from functools import partial
+
 from xivo_bus.resources.auth import events
 from wazo_auth import exceptions
-from wazo_auth.services.helpers import BaseService
+from wazo_auth.cache import LRUCache
+from wazo_auth.database.helpers import after_commit
+from wazo_auth.services.helpers import ACLCache, BaseService
 
 
 class TenantService(BaseService):
@@ -15,16 +19,19 @@ class TenantService(BaseService):
         policy_service,
         all_users_policies,
         bus_publisher=None,
+        tenant_visibility_cache=None,
+        acl_cache=None,
     ):
         super().__init__(dao, tenant_tree)
         self._bus_publisher = bus_publisher
         self._group_service = group_service
         self._policy_service = policy_service
         self._all_users_policies = all_users_policies
+        self._tenant_visibility_cache = tenant_visibility_cache or LRUCache(max_size=0)
+        self._acl_cache = acl_cache or ACLCache()
 
     def assert_tenant_under(self, scoping_tenant_uuid, tenant_uuid):
-        visible_tenants = self.list_sub_tenants(scoping_tenant_uuid)
-        if str(tenant_uuid) not in visible_tenants:
+        if not self._tenant_tree.is_under(tenant_uuid, scoping_tenant_uuid):
             raise exceptions.UnknownTenantException(tenant_uuid)
 
     def count_policies(self, tenant_uuid, scoping_tenant_uuid, **kwargs):
@@ -39,26 +46,28 @@ class TenantService(BaseService):
         return result
 
     def count(self, scoping_tenant_uuid, **kwargs):
-        visible_tenants = self.list_sub_tenants(scoping_tenant_uuid)
-        return self._dao.tenant.count(tenant_uuids=visible_tenants, **kwargs)
+        tenant_scope = self._get_tenant_scope(scoping_tenant_uuid)
+        return self._dao.tenant.count(tenant_uuids=tenant_scope, **kwargs)
 
     def delete(self, scoping_tenant_uuid, uuid):
-        visible_tenants = self.list_sub_tenants(scoping_tenant_uuid)
-        if uuid not in visible_tenants:
+        if not self._tenant_tree.is_under(uuid, scoping_tenant_uuid):
             raise exceptions.UnknownTenantException(uuid)
 
         result = self._dao.tenant.delete(uuid)
+        after_commit(partial(self._tenant_tree.remove, uuid))
+        after_commit(self._tenant_visibility_cache.clear)
+        after_commit(self._acl_cache.invalidate)
 
+        # Other processes reload their tenant index when they receive it
         event = events.TenantDeletedEvent(uuid)
-        self._bus_publisher.publish(event)
+        after_commit(partial(self._bus_publisher.publish, event))
         return result
 
     def find_top_tenant(self):
         return self._dao.tenant.find_top_tenant()
 
     def get(self, scoping_tenant_uuid, uuid):
-        visible_tenants = self.list_sub_tenants(scoping_tenant_uuid)
-        if uuid not in visible_tenants:
+        if not self._tenant_tree.is_under(uuid, scoping_tenant_uuid):
             raise exceptions.UnknownTenantException(uuid)
 
         return self._get(uuid)
@@ -70,8 +79,8 @@ class TenantService(BaseService):
         raise exceptions.UnknownTenantException(uuid)
 
     def list_(self, scoping_tenant_uuid, **kwargs):
-        visible_tenants = self.list_sub_tenants(scoping_tenant_uuid)
-        return self._dao.tenant.list_(tenant_uuids=visible_tenants, **kwargs)
+        tenant_scope = self._get_tenant_scope(scoping_tenant_uuid)
+        return self._dao.tenant.list_(tenant_uuids=tenant_scope, **kwargs)
 
     def list_policies(self, tenant_uuid, scoping_tenant_uuid, **kwargs):
         self.assert_tenant_under(scoping_tenant_uuid, tenant_uuid)
@@ -87,9 +96,11 @@ class TenantService(BaseService):
         uuid = self._dao.tenant.create(**kwargs)
         self._dao.address.new(tenant_uuid=uuid, **kwargs['address'])
         result = self._get(uuid)
+        after_commit(partial(self._tenant_tree.add, uuid, result['parent_uuid']))
+        after_commit(self._tenant_visibility_cache.clear)
 
         event = events.TenantCreatedEvent(uuid, kwargs.get('name'))
-        self._bus_publisher.publish(event)
+        after_commit(partial(self._bus_publisher.publish, event))
 
         all_users_group = self._group_service.create(
             name=f'wazo-all-users-tenant-{uuid}', tenant_uuid=uuid, system_managed=True
@@ -109,8 +120,7 @@ class TenantService(BaseService):
         return result
 
     def update(self, scoping_tenant_uuid, tenant_uuid, **kwargs):
-        visible_tenants = self.list_sub_tenants(scoping_tenant_uuid)
-        if tenant_uuid not in visible_tenants:
+        if not self._tenant_tree.is_under(tenant_uuid, scoping_tenant_uuid):
             raise exceptions.UnknownTenantException(tenant_uuid)
 
         address_id = self._dao.tenant.get_address_id(tenant_uuid)
@@ -0,0 +1,141 @@
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+
+from hamcrest import assert_that, contains_inanyorder, empty, equal_to
+from mock import Mock, patch
+
+from wazo_auth.cache import LRUCache
+
+from ..helpers import ACLCache, TenantIndex, TenantTree
+
+TOP = 'top'
+TENANTS = [(TOP, TOP), ('a', TOP), ('b', TOP), ('a1', 'a'), ('a11', 'a1')]
+
+
+class TestTenantTree(unittest.TestCase):
+    def setUp(self):
+        self.tenant_dao = Mock()
+        self.tree = TenantTree(self.tenant_dao)
+
+    def test_list_visible_tenants(self):
+        self.tenant_dao.list_visible_tenants.return_value = [Mock(uuid='a')]
+
+        assert_that(self.tree.list_visible_tenants('a'), contains_inanyorder('a'))
+        self.tenant_dao.list_visible_tenants.assert_called_once_with('a')
+
+    def test_is_under(self):
+        self.tenant_dao.is_under.return_value = True
+
+        assert_that(self.tree.is_under('a1', 'a'), equal_to(True))
+        self.tenant_dao.is_under.assert_called_once_with('a1', 'a')
+
+
+class TestTenantIndex(unittest.TestCase):
+    def setUp(self):
+        self.tenant_dao = Mock()
+        self.tenant_dao.list_parents.return_value = list(TENANTS)
+        self.tree = TenantIndex(self.tenant_dao)
+
+    def test_list_visible_tenants(self):
+        assert_that(
+            self.tree.list_visible_tenants(TOP),
+            contains_inanyorder(TOP, 'a', 'b', 'a1', 'a11'),
+        )
+        assert_that(
+            self.tree.list_visible_tenants(None),
+            contains_inanyorder(TOP, 'a', 'b', 'a1', 'a11'),
+        )
+        assert_that(
+            self.tree.list_visible_tenants('a'), contains_inanyorder('a', 'a1', 'a11')
+        )
+        assert_that(self.tree.list_visible_tenants('b'), contains_inanyorder('b'))
+        assert_that(self.tree.list_visible_tenants('unknown'), empty())
+        self.tenant_dao.list_parents.assert_called_once_with()
+
+    def test_is_under(self):
+        assert_that(self.tree.is_under('a11', TOP))
+        assert_that(self.tree.is_under('a11', 'a'))
+        assert_that(self.tree.is_under('a', 'a'))
+        assert_that(not self.tree.is_under('a', 'a1'))
+        assert_that(not self.tree.is_under('a1', 'b'))
+        assert_that(not self.tree.is_under('unknown', TOP))
+        assert_that(not self.tree.is_under(TOP, 'unknown'))
+        assert_that(self.tree.is_under('a1', None))
+
+    def test_add(self):
+        self.tree.list_visible_tenants(TOP)
+
+        self.tree.add('a12', 'a')
+        self.tree.add('a121', 'a12')
+
+        assert_that(self.tree.is_under('a121', TOP))
+        assert_that(self.tree.is_under('a121', 'a'))
+        assert_that(not self.tree.is_under('a121', 'a1'))
+        assert_that(
+            self.tree.list_visible_tenants('a12'), contains_inanyorder('a12', 'a121')
+        )
+        self.tenant_dao.list_parents.assert_called_once_with()
+
+    def test_remove(self):
+        self.tree.list_visible_tenants(TOP)
+
+        self.tree.remove('a1')
+
+        assert_that(
+            self.tree.list_visible_tenants(TOP), contains_inanyorder(TOP, 'a', 'b')
+        )
+        assert_that(self.tree.list_visible_tenants('a'), contains_inanyorder('a'))
+        assert_that(self.tree.list_visible_tenants('a11'), empty())
+
+    def test_invalidate(self):
+        self.tree.list_visible_tenants(TOP)
+        self.tenant_dao.list_parents.return_value = TENANTS + [('c', TOP)]
+
+        self.tree.invalidate()
+
+        assert_that(self.tree.is_under('c', TOP), equal_to(True))
+        assert_that(self.tenant_dao.list_parents.call_count, equal_to(2))
+
+    def test_reload_interval(self):
+        tree = TenantIndex(self.tenant_dao, reload_interval=60)
+
+        with patch('wazo_auth.services.helpers.time.monotonic', return_value=0):
+            tree.list_visible_tenants(TOP)
+        self.tenant_dao.list_parents.return_value = TENANTS + [('c', TOP)]
+
+        with patch('wazo_auth.services.helpers.time.monotonic', return_value=30):
+            assert_that(tree.is_under('c', TOP), equal_to(False))
+        with patch('wazo_auth.services.helpers.time.monotonic', return_value=61):
+            assert_that(tree.is_under('c', TOP), equal_to(True))
+
+
+class TestACLCache(unittest.TestCase):
+    def setUp(self):
+        self.acl_cache = ACLCache(LRUCache(max_size=10))
+        self.compute = Mock(return_value=['foo.bar'])
+
+    def test_get(self):
+        assert_that(self.acl_cache.get('alice', self.compute), equal_to(['foo.bar']))
+        assert_that(self.acl_cache.get('alice', self.compute), equal_to(['foo.bar']))
+
+        self.compute.assert_called_once_with()
+
+    def test_invalidate(self):
+        self.acl_cache.get('alice', self.compute)
+
+        self.acl_cache.invalidate()
+
+        self.acl_cache.get('alice', self.compute)
+        assert_that(self.compute.call_count, equal_to(2))
+
+    def test_invalidate_during_compute(self):
+        def compute():
+            self.acl_cache.invalidate()
+            return ['foo.bar']
+
+        self.acl_cache.get('alice', compute)
+        self.acl_cache.get('alice', self.compute)
+
+        self.compute.assert_called_once_with()
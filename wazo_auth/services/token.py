@@ -4,6 +4,8 @@
 import time
 import logging
 
+from functools import partial
+
 from xivo_bus.resources.auth.events import (
     RefreshTokenCreatedEvent,
     RefreshTokenDeletedEvent,
@@ -11,7 +13,10 @@ from xivo_bus.resources.auth.events import (
     SessionDeletedEvent,
 )
 
-from wazo_auth.token import Token
+from wazo_auth.cache import LRUCache
+from wazo_auth.database.helpers import after_commit
+from wazo_auth.signed_token import is_signed_token
+from wazo_auth.token import Token, TokenAccess
 from wazo_auth.services.helpers import BaseService
 
 from ..exceptions import (
@@ -26,12 +31,25 @@ logger = logging.getLogger(__name__)
 
 
 class TokenService(BaseService):
-    def __init__(self, config, dao, tenant_tree, bus_publisher, user_service):
+    def __init__(
+        self,
+        config,
+        dao,
+        tenant_tree,
+        bus_publisher,
+        user_service,
+        token_cache=None,
+        token_signer=None,
+        expiry_scheduler=None,
+    ):
         super().__init__(dao, tenant_tree)
         self._backend_policies = config.get('backend_policies', {})
         self._default_expiration = config['default_token_lifetime']
         self._bus_publisher = bus_publisher
         self._user_service = user_service
+        self._token_cache = token_cache or LRUCache(max_size=0)
+        self._token_signer = token_signer
+        self._expiry_scheduler = expiry_scheduler
 
     def count_refresh_tokens(
         self, scoping_tenant_uuid=None, recurse=False, **search_params
@@ -75,6 +93,7 @@ class TokenService(BaseService):
         pbx_user_uuid = metadata.get('pbx_user_uuid')
         xivo_uuid = metadata['xivo_uuid']
 
+        args['backend_policy'] = self._backend_policies.get(args['backend'])
         args['acl'] = self._get_acl(args['backend'])
         args['metadata'] = metadata
 
@@ -127,7 +146,13 @@ class TokenService(BaseService):
         token_uuid, session_uuid = self._dao.token.create(
             token_payload, session_payload
         )
+        if self._expiry_scheduler:
+            self._expiry_scheduler.schedule(token_uuid, token_payload['expire_t'])
+
         token = Token(token_uuid, session_uuid=session_uuid, **token_payload)
+        if self._token_signer:
+            signed_token = self._token_signer.sign(token)
+            token = Token(signed_token, session_uuid=session_uuid, **token_payload)
 
         user_uuid = auth_id if is_uuid(auth_id) else None
         event = SessionCreatedEvent(
@@ -145,6 +170,19 @@ class TokenService(BaseService):
         return [{'uuid': uuid} for uuid in tenant_uuids]
 
     def remove_token(self, token_uuid):
+        if self._is_signed(token_uuid):
+            try:
+                claims = self._token_signer.verify(token_uuid, verify_expiration=False)
+            except UnknownTokenException:
+                return
+            self._token_signer.revoke(claims['jti'], claims['exp'])
+            token_uuid = claims['jti']
+
+        # A request reading the token before the commit must not cache it again
+        self._token_cache.invalidate(token_uuid)
+        after_commit(partial(self._token_cache.invalidate, token_uuid))
+        if self._expiry_scheduler:
+            self._expiry_scheduler.cancel(token_uuid)
         token, session = self._dao.token.delete(token_uuid)
         if not session:
             return
@@ -157,12 +195,20 @@ class TokenService(BaseService):
         self._bus_publisher.publish(event)
 
     def get(self, token_uuid, required_access):
-        token_data = self._dao.token.get(token_uuid)
-        if not token_data:
-            raise UnknownTokenException()
+        token = self._get_token(token_uuid)
 
-        id_ = token_data.pop('uuid')
-        token = Token(id_, **token_data)
+        if not token.matches_required_access(required_access):
+            raise MissingAccessTokenException(required_access)
+
+        return token
+
+    def check(self, token_uuid, required_access, tenant):
+        if self._is_signed(token_uuid):
+            token = self._get_signed_token(token_uuid)
+        else:
+            token = self._token_cache.get(token_uuid)
+            if token is None:
+                token = self._get_token_access(token_uuid)
 
         if token.is_expired():
             raise UnknownTokenException()
@@ -170,24 +216,154 @@ class TokenService(BaseService):
         if not token.matches_required_access(required_access):
             raise MissingAccessTokenException(required_access)
 
+        self._assert_metadata_has_tenant(token.metadata, tenant)
+
+    def _get_token_access(self, token_uuid):
+        access = self._dao.token.get_access(token_uuid)
+        token = TokenAccess(
+            token_uuid,
+            auth_id=access['auth_id'],
+            pbx_user_uuid=None,
+            xivo_uuid=None,
+            issued_t=None,
+            expire_t=access['expire_t'],
+            acl=access['acl'],
+            metadata=access['metadata'],
+            session_uuid=None,
+            user_agent=None,
+            remote_addr=None,
+        )
+        if not token.is_expired():
+            self._token_cache.set(token_uuid, token, expire_at=token.expire_t)
         return token
 
     def check_scopes(self, token_uuid, scopes):
-        token_data = self._dao.token.get(token_uuid)
-        if not token_data:
-            raise UnknownTokenException()
+        token = self._get_token(token_uuid)
 
-        id_ = token_data.pop('uuid')
-        token = Token(id_, **token_data)
+        scope_statuses = token.matches_required_accesses(set(scopes))
+
+        return token, scope_statuses
+
+    def validate_tokens(self, token_checks):
+        tokens = self._get_tokens(set(check['token'] for check in token_checks))
+
+        results = []
+        for check in token_checks:
+            token_uuid = check['token']
+            result = self._validate_token(
+                token_uuid,
+                tokens.get(token_uuid),
+                check.get('scope'),
+                check.get('tenant'),
+            )
+            results.append(result)
+        return results
+
+    def _validate_token(self, token_uuid, token, scope, tenant):
+        if token is None:
+            return {
+                'token': token_uuid,
+                'valid': False,
+                'expires_at': None,
+                'utc_expires_at': None,
+            }
+
+        token_data = token.to_dict()
+        valid = token.matches_required_access(scope)
+        if valid:
+            try:
+                self.assert_has_tenant_permission(token_data, tenant)
+            except MissingTenantTokenException:
+                valid = False
+
+        return {
+            'token': token_uuid,
+            'valid': valid,
+            'expires_at': token_data['expires_at'],
+            'utc_expires_at': token_data['utc_expires_at'],
+        }
+
+    def list_signing_keys(self):
+        if not self._token_signer:
+            return []
+        return self._token_signer.list_keys()
+
+    def list_revoked_tokens(self):
+        if not self._token_signer:
+            return []
+        return self._token_signer.list_revoked()
+
+    def _is_signed(self, token):
+        return self._token_signer is not None and is_signed_token(token)
+
+    def _get_token(self, token_uuid):
+        if self._is_signed(token_uuid):
+            return self._get_signed_token(token_uuid)
+
+        token = self._token_cache.get(token_uuid)
+        if token is None or isinstance(token, TokenAccess):
+            token_data = self._dao.token.get(token_uuid)
+            if not token_data:
+                raise UnknownTokenException()
+            token = self._load_token(token_data)
 
         if token.is_expired():
             raise UnknownTokenException()
 
-        scope_statuses = {
-            scope: token.matches_required_access(scope) for scope in set(scopes)
+        return token
+
+    def _get_tokens(self, token_uuids):
+        tokens = {}
+        missing_token_uuids = []
+        for token_uuid in token_uuids:
+            if self._is_signed(token_uuid):
+                try:
+                    tokens[token_uuid] = self._get_signed_token(token_uuid)
+                except UnknownTokenException:
+                    pass
+                continue
+
+            token = self._token_cache.get(token_uuid)
+            if token is None:
+                missing_token_uuids.append(token_uuid)
+            else:
+                tokens[token_uuid] = token
+
+        for token_data in self._dao.token.list_(uuids=missing_token_uuids):
+            token = self._load_token(token_data)
+            tokens[token.token] = token
+
+        return {
+            token_uuid: token
+            for token_uuid, token in tokens.items()
+            if not token.is_expired()
         }
 
-        return token, scope_statuses
+    def _get_signed_token(self, signed_token):
+        claims = self._token_signer.verify(signed_token)
+        return Token(
+            signed_token,
+            auth_id=claims['sub'],
+            pbx_user_uuid=claims['pbx_user_uuid'],
+            xivo_uuid=claims['xivo_uuid'],
+            issued_t=claims['iat'],
+            expire_t=claims['exp'],
+            acl=claims['acl'],
+            metadata=claims['metadata'],
+            session_uuid=claims['sid'],
+            user_agent=None,
+            remote_addr=None,
+        )
+
+    def _load_token(self, token_data):
+        id_ = token_data.pop('uuid')
+        token = Token(id_, **token_data)
+        if not token.is_expired():
+            self._token_cache.set(id_, token, expire_at=token.expire_t)
+        return token
+
+    def provide_status(self, status):
+        status['token_cache'] = self._token_cache.stats()
 
     def _get_acl(self, backend_name):
         policy_name = self._backend_policies.get(backend_name)
@@ -206,14 +382,20 @@ class TokenService(BaseService):
         return []
 
     def assert_has_tenant_permission(self, token, tenant):
+        self._assert_metadata_has_tenant(token['metadata'], tenant)
+
+    def _assert_metadata_has_tenant(self, metadata, tenant):
         if not tenant:
             return
 
+        if tenant == metadata.get('tenant_uuid'):
+            return
+
         # TODO: when the ldap_user gets remove all tokens will have a UUID
-        user_uuid = token['metadata'].get('uuid')
+        user_uuid = metadata.get('uuid')
         if not user_uuid:
             # Fallback on the token data since this is not a user token
-            visible_tenants = set(t['uuid'] for t in token['metadata']['tenants'])
+            visible_tenants = set(t['uuid'] for t in metadata['tenants'])
             if tenant not in visible_tenants:
                 raise MissingTenantTokenException(tenant)
             else:
@@ -3,23 +3,44 @@
 
 import binascii
 import hashlib
+import hmac
 import logging
+import multiprocessing
 import os
+import threading
+import time
 
 from wazo_auth import exceptions
-from wazo_auth.services.helpers import BaseService
+from wazo_auth.cache import LRUCache
+from wazo_auth.database.helpers import after_commit
+from wazo_auth.interfaces import LoginContext
+from wazo_auth.services.helpers import ACLCache, BaseService
 
 logger = logging.getLogger(__name__)
 
 
 class UserService(BaseService):
-    def __init__(self, dao, tenant_tree, group_service, encrypter=None):
+    def __init__(
+        self,
+        dao,
+        tenant_tree,
+        group_service,
+        encrypter=None,
+        tenant_visibility_cache=None,
+        acl_cache=None,
+        token_signer=None,
+    ):
         super().__init__(dao, tenant_tree)
         self._encrypter = encrypter or PasswordEncrypter()
+        self._token_signer = token_signer
         self._group_service = group_service
+        # (user_uuid, tenant_uuid) -> bool
+        self._tenant_visibility_cache = tenant_visibility_cache or LRUCache(max_size=0)
+        self._acl_cache = acl_cache or ACLCache()
 
     def add_policy(self, user_uuid, policy_uuid):
         self._dao.user.add_policy(user_uuid, policy_uuid)
+        after_commit(self._acl_cache.invalidate)
 
     def change_password(self, user_uuid, old_password, new_password, reset=False):
         user = self.get_user(user_uuid)
@@ -64,16 +85,26 @@ class UserService(BaseService):
 
     def delete_user(self, scoping_tenant_uuid, user_uuid):
         self.assert_user_in_subtenant(scoping_tenant_uuid, user_uuid)
+        if self._token_signer:
+            # The signed tokens of the user are verified without the database
+            for session in self._dao.token.list_sessions(user_uuid):
+                self._token_signer.revoke(session['session_uuid'], session['expire_t'])
         self._dao.user.delete(user_uuid)
+        after_commit(self._tenant_visibility_cache.clear)
+        after_commit(self._acl_cache.invalidate)
 
-    def get_acl(self, username):
-        users = self._dao.user.list_(username=username, limit=1)
-        acl = []
-        for user in users:
-            policies = self.list_policies(user['uuid'])
-            for policy in policies:
-                acl.extend(policy['acl'])
-        return acl
+    def get_effective_acl(self, username, backend_policy_name=None):
+        def compute():
+            return self._dao.policy.get_effective_acl(username, backend_policy_name)
+
+        return self._acl_cache.get((username, backend_policy_name), compute)
+
+    def get_login_context(self, username):
+        try:
+            user = self._dao.user.get_login(username)
+        except exceptions.UnknownUsernameException:
+            return None
+        return LoginContext(**user)
 
     def get_user(self, user_uuid, scoping_tenant_uuid=None):
         if scoping_tenant_uuid:
@@ -129,6 +160,7 @@ class UserService(BaseService):
     def remove_policy(self, user_uuid, policy_uuid):
         nb_deleted = self._dao.user.remove_policy(user_uuid, policy_uuid)
         if nb_deleted:
+            after_commit(self._acl_cache.invalidate)
             return
 
         if not self._dao.user.exists(user_uuid):
@@ -140,51 +172,277 @@ class UserService(BaseService):
     def update(self, scoping_tenant_uuid, user_uuid, **kwargs):
         self.assert_user_in_subtenant(scoping_tenant_uuid, user_uuid)
         self._dao.user.update(user_uuid, **kwargs)
+        after_commit(self._tenant_visibility_cache.clear)
+        after_commit(self._acl_cache.invalidate)
         return self.get_user(user_uuid)
 
     def update_emails(self, user_uuid, emails):
         return self._dao.user.update_emails(user_uuid, emails)
 
     def user_has_sub_tenant(self, user_uuid, tenant_uuid):
-        user = self.get_user(user_uuid)
-        visible_tenants = self._tenant_tree.list_visible_tenants(user['tenant_uuid'])
-        return tenant_uuid in visible_tenants
-
-    def verify_password(self, username, password, reset=False):
+        key = (user_uuid, tenant_uuid)
+        visible = self._tenant_visibility_cache.get(key)
+        if visible is None:
+            user = self.get_user(user_uuid)
+            visible = self._tenant_tree.is_under(tenant_uuid, user['tenant_uuid'])
+            self._tenant_visibility_cache.set(key, visible)
+        return visible
+
+    def verify_password(self, username, password, reset=False, login_context=None):
         if reset:
             return True
 
-        try:
-            hash_, salt = self._dao.user.get_credentials(username)
-        except exceptions.UnknownUsernameException:
+        login_context = login_context or self.get_login_context(username)
+        if not login_context or not login_context.enabled:
             return False
 
+        hash_ = login_context.password_hash
+        salt = login_context.password_salt
         if not hash_ or not salt:
             return False
 
-        return hash_ == self._encrypter.compute_password_hash(password, salt)
+        if not self._encrypter.verify_password(password, salt, hash_):
+            return False
+
+        if self._encrypter.needs_rehash(hash_):
+            logger.info('updating the password hash of user %s', login_context.uuid)
+            salt, hash_ = self._encrypter.encrypt_password(password)
+            self._dao.user.change_password(login_context.uuid, salt, hash_)
+
+        return True
 
     def assert_user_in_subtenant(self, scoping_tenant_uuid, user_uuid):
-        tenant_uuids = self._tenant_tree.list_visible_tenants(scoping_tenant_uuid)
+        tenant_uuids = self._get_tenant_scope(scoping_tenant_uuid)
         user_exists = self._dao.user.exists(user_uuid, tenant_uuids=tenant_uuids)
         if not user_exists:
             raise exceptions.UnknownUserException(user_uuid)
 
 
+class PBKDF2Scheme:
+
+    name = 'pbkdf2'
+
+    def __init__(self, hash_name='sha512', iterations=250000):
+        self.hash_name = hash_name
+        self.iterations = iterations
+
+    @classmethod
+    def from_params(cls, hash_name, params):
+        if hash_name not in hashlib.algorithms_available:
+            raise ValueError('unknown pbkdf2 hash: {}'.format(hash_name))
+        if params.keys() != {'i'} or params['i'] < 1:
+            raise ValueError('invalid pbkdf2 parameters: {}'.format(params))
+        return cls(hash_name, params['i'])
+
+    @property
+    def prefix(self):
+        return '${}-{}$i={}$'.format(self.name, self.hash_name, self.iterations)
+
+    def compute(self, password_bytes, salt):
+        dk = hashlib.pbkdf2_hmac(self.hash_name, password_bytes, salt, self.iterations)
+        return binascii.hexlify(dk).decode('utf-8')
+
+
+class ScryptScheme:
+
+    name = 'scrypt'
+    _dklen = 64
+
+    def __init__(self, n=16384, r=8, p=1):
+        self.n = n
+        self.r = r
+        self.p = p
+
+    @classmethod
+    def from_params(cls, params):
+        n, r, p = params.get('n', 0), params.get('r', 0), params.get('p', 0)
+        # n must be a power of 2 greater than 1
+        if params.keys() != {'n', 'r', 'p'} or n < 2 or n & (n - 1) or r < 1 or p < 1:
+            raise ValueError('invalid scrypt parameters: {}'.format(params))
+        return cls(n, r, p)
+
+    @property
+    def prefix(self):
+        return '${}$n={},r={},p={}$'.format(self.name, self.n, self.r, self.p)
+
+    def compute(self, password_bytes, salt):
+        dk = hashlib.scrypt(
+            password_bytes,
+            salt=salt,
+            n=self.n,
+            r=self.r,
+            p=self.p,
+            maxmem=256 * self.r * (self.n + self.p),
+            dklen=self._dklen,
+        )
+        return binascii.hexlify(dk).decode('utf-8')
+
+
+# Hashes stored before the scheme was included
+LEGACY_SCHEME = PBKDF2Scheme('sha512', 250000)
+
+
+def new_hash_scheme(name, **params):
+    if name.startswith('pbkdf2_'):
+        return PBKDF2Scheme(name[len('pbkdf2_') :], params.get('iterations', 250000))
+    if name == 'scrypt':
+        return ScryptScheme(**params)
+    raise ValueError('unknown password hash scheme: {}'.format(name))
+
+
+def parse_password_hash(hash_):
+    """returns the scheme and the digest of a stored password hash
+
+    The stored value is either "$<scheme>$<params>$<digest>" or a digest
+    computed with the legacy scheme
+    """
+    if not hash_.startswith('$'):
+        return LEGACY_SCHEME, hash_
+
+    _, name, raw_params, digest = hash_.split('$')
+    params = dict(param.split('=') for param in raw_params.split(','))
+    params = {key: int(value) for key, value in params.items()}
+    if name.startswith('pbkdf2-'):
+        return PBKDF2Scheme.from_params(name[len('pbkdf2-') :], params), digest
+    if name == 'scrypt':
+        return ScryptScheme.from_params(params), digest
+    raise ValueError('unknown password hash scheme: {}'.format(name))
+
+
 class PasswordEncrypter:
 
     _salt_len = 64
-    _hash_algo = 'sha512'
-    _iterations = 250000
+
+    def __init__(self, executor=None, scheme=None):
+        self._executor = executor
+        self._scheme = scheme or LEGACY_SCHEME
+
+    @classmethod
+    def from_config(cls, config, executor=None):
+        name = config['scheme']
+        if name == 'scrypt':
+            params = {
+                'n': config['scrypt_n'],
+                'r': config['scrypt_r'],
+                'p': config['scrypt_p'],
+            }
+        else:
+            params = {'iterations': config['pbkdf2_iterations']}
+        return cls(executor, new_hash_scheme(name, **params))
 
     def encrypt_password(self, password):
         salt = os.urandom(self._salt_len)
         hash_ = self.compute_password_hash(password, salt)
         return salt, hash_
 
-    def compute_password_hash(self, password, salt):
-        password_bytes = password.encode('utf-8')
-        dk = hashlib.pbkdf2_hmac(
-            self._hash_algo, password_bytes, salt, self._iterations
-        )
-        return binascii.hexlify(dk).decode('utf-8')
+    def compute_password_hash(self, password, salt, scheme=None):
+        scheme = scheme or self._scheme
+        return scheme.prefix + self._compute(scheme, password, salt)
+
+    def needs_rehash(self, hash_):
+        return not hash_.startswith(self._scheme.prefix)
+
+    def verify_password(self, password, salt, hash_):
+        try:
+            scheme, digest = parse_password_hash(hash_)
+        except ValueError:
+            logger.warning('unsupported password hash format')
+            return False
+        return hmac.compare_digest(digest, self._compute(scheme, password, salt))
+
+    def _compute(self, scheme, password, salt):
+        args = (password.encode('utf-8'), bytes(salt))
+        if self._executor:
+            return self._executor.submit(scheme.compute, *args)
+        return scheme.compute(*args)
+
+
+class PasswordHashExecutor:
+    """Computes password hashes in a pool of worker processes
+
+    The HTTP threads wait for the result. When max_queue_size hashes are
+    already waiting for a worker, new requests are rejected immediately
+    instead of holding an HTTP thread.
+    """
+
+    def __init__(self, workers=None, max_queue_size=50, timeout=10):
+        self._workers = workers or os.cpu_count() or 1
+        self._max_queue_size = max_queue_size
+        self._timeout = timeout
+        self._slots = threading.BoundedSemaphore(self._workers + max_queue_size)
+        self._pool = multiprocessing.get_context('spawn').Pool(self._workers)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+
+    @classmethod
+    def from_config(cls, config):
+        if not config['enabled']:
+            return None
+        return cls(config['workers'], config['max_queue_size'], config['timeout'])
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise exceptions.PasswordHashQueueFullException()
+
+        start = time.monotonic()
+        with self._lock:
+            self._pending += 1
+
+        # The slot is held until the worker is done, even after a timeout
+        def done(_):
+            self._done(start)
+
+        try:
+            result = self._pool.apply_async(
+                fn, args, callback=done, error_callback=done
+            )
+        except Exception:
+            self._done(start)
+            raise
+
+        try:
+            return result.get(timeout=self._timeout)
+        except multiprocessing.TimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            raise exceptions.PasswordHashTimeoutException()
+
+    def provide_status(self, status):
+        status['password_hash_executor'] = self.stats()
+
+    def shutdown(self):
+        # A worker can still be busy with a hash that timed out, it is
+        # terminated instead of being left behind when wazo-auth stops
+        self._pool.terminate()
+        self._pool.join()
+
+    def stats(self):
+        with self._lock:
+            completed = self._completed
+            return {
+                'workers': self._workers,
+                'max_queue_size': self._max_queue_size,
+                'queue_depth': max(self._pending - self._workers, 0),
+                'pending': self._pending,
+                'completed': completed,
+                'rejected': self._rejected,
+                'timeouts': self._timeouts,
+                'latency_avg': self._total_latency / completed if completed else 0.0,
+                'latency_max': self._max_latency,
+            }
+
+    def _done(self, start):
+        latency = time.monotonic() - start
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+            self._total_latency += latency
+            self._max_latency = max(self._max_latency, latency)
+        self._slots.release()
@@ -0,0 +1,294 @@
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import base64
+import binascii
+import json
+import logging
+import threading
+import time
+import uuid
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+from .exceptions import UnknownTokenException
+
+logger = logging.getLogger(__name__)
+
+ALGORITHM = 'EdDSA'
+KEY_RELOAD_INTERVAL = 60
+UNKNOWN_KEY_RELOAD_INTERVAL = 1
+# Revocations are committed after their revoked_at is set, the revocations
+# revoked shortly before the previous synchronization are fetched again
+REVOCATION_SYNC_MARGIN = 60
+
+
+def is_signed_token(token):
+    return token.count('.') == 2
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data):
+    padding = '=' * (-len(data) % 4)
+    return base64.urlsafe_b64decode(data + padding)
+
+
+def _raw_private_bytes(private_key):
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PrivateFormat.Raw,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+
+
+def _raw_public_bytes(public_key):
+    return public_key.public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw,
+    )
+
+
+class SigningKey:
+    def __init__(self, kid, private_key, created_at):
+        self.kid = kid
+        self.private_key = Ed25519PrivateKey.from_private_bytes(_b64decode(private_key))
+        self.public_key = self.private_key.public_key()
+        self.created_at = created_at
+
+
+class SigningKeyRing:
+    """The Ed25519 keys used to sign tokens, shared by all nodes in the database
+
+    A new key is generated when the current one is older than the rotation
+    interval. Previous keys are kept to verify tokens signed before the
+    rotation until they are pushed out by newer keys. The keys are reloaded
+    periodically and when a token signed with an unknown key is verified, to
+    include the keys created by other nodes.
+    """
+
+    def __init__(self, dao, rotation_interval, retained_keys):
+        self._dao = dao
+        self._rotation_interval = rotation_interval
+        self._retained_keys = max(retained_keys, 1)
+        self._lock = threading.Lock()
+        self._keys = []
+        self._loaded_at = None
+
+    def current(self):
+        with self._lock:
+            if self._is_stale(KEY_RELOAD_INTERVAL) or self._current_is_expired():
+                self._load()
+            if self._current_is_expired():
+                self._rotate()
+            return self._keys[0]
+
+    def get(self, kid):
+        key = self._find(kid)
+        if key is None and self._is_stale(UNKNOWN_KEY_RELOAD_INTERVAL):
+            with self._lock:
+                self._load()
+            key = self._find(kid)
+        return key
+
+    def list_(self):
+        with self._lock:
+            if self._is_stale(KEY_RELOAD_INTERVAL):
+                self._load()
+            return list(self._keys)
+
+    def rotate(self):
+        with self._lock:
+            self._rotate()
+
+    def _find(self, kid):
+        for key in self._keys:
+            if key.kid == kid:
+                return key
+
+    def _is_stale(self, interval):
+        if self._loaded_at is None:
+            return True
+        return time.monotonic() - self._loaded_at >= interval
+
+    def _current_is_expired(self):
+        if not self._keys:
+            return True
+        return time.time() - self._keys[0].created_at >= self._rotation_interval
+
+    def _load(self):
+        self._set_keys(self._dao.list_keys())
+
+    def _rotate(self):
+        key = {
+            'kid': str(uuid.uuid4()),
+            'private_key': _b64encode(_raw_private_bytes(Ed25519PrivateKey.generate())),
+            'created_at': int(time.time()),
+        }
+        keys = self._dao.rotate_key(key, self._rotation_interval, self._retained_keys)
+        self._set_keys(keys)
+        if self._keys[0].kid == key['kid']:
+            logger.info('token signing key rotated, new key id: %s', key['kid'])
+
+    def _set_keys(self, keys):
+        self._keys = [SigningKey(**key) for key in keys]
+        self._loaded_at = time.monotonic()
+
+
+class RevocationList:
+    """Token and session uuids that must be refused until they expire
+
+    The revocations are stored in the database, the revocations made by other
+    nodes are fetched at most every sync_interval seconds.
+    """
+
+    def __init__(self, dao, sync_interval):
+        self._dao = dao
+        self._sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._revoked = {}
+        self._synced_at = None
+        self._revoked_since = None
+
+    def __contains__(self, uuid_):
+        self._sync()
+        expire_at = self._revoked.get(uuid_)
+        return expire_at is not None and expire_at > time.time()
+
+    def add(self, uuid_, expire_at):
+        self._dao.add_revocation(uuid_, expire_at)
+        self._revoked[uuid_] = expire_at
+
+    def list_(self):
+        return [
+            {'uuid': revocation['uuid'], 'expire_t': revocation['expire_t']}
+            for revocation in self._dao.list_revocations()
+        ]
+
+    def _sync(self):
+        now = time.monotonic()
+        if self._synced_at is not None and now - self._synced_at < self._sync_interval:
+            return
+
+        with self._lock:
+            if (
+                self._synced_at is not None
+                and now - self._synced_at < self._sync_interval
+            ):
+                return
+
+            started_at = time.time()
+            revocations = self._dao.list_revocations(revoked_since=self._revoked_since)
+            revoked = {
+                revoked_uuid: expire_at
+                for revoked_uuid, expire_at in self._revoked.items()
+                if expire_at > started_at
+            }
+            for revocation in revocations:
+                revoked[revocation['uuid']] = revocation['expire_t']
+            self._revoked = revoked
+            self._revoked_since = started_at - REVOCATION_SYNC_MARGIN
+            self._synced_at = now
+
+
+class TokenSigner:
+    """Build and verify self-contained tokens
+
+    The tokens are JSON Web Tokens signed with Ed25519 (EdDSA), only the public
+    keys are published to the services verifying them. The claims include the
+    token ACL, any service holding the public keys can check the scopes.
+    """
+
+    def __init__(self, key_ring, revocation_list):
+        self._key_ring = key_ring
+        self._revocation_list = revocation_list
+
+    @classmethod
+    def from_config(cls, config, dao):
+        key_ring = SigningKeyRing(
+            dao,
+            config['key_rotation_interval'],
+            config['retained_keys'],
+        )
+        revocation_list = RevocationList(dao, config['revocation_sync_interval'])
+        return cls(key_ring, revocation_list)
+
+    def sign(self, token):
+        key = self._key_ring.current()
+        header = {'alg': ALGORITHM, 'typ': 'JWT', 'kid': key.kid}
+        claims = {
+            'jti': token.token,
+            'sub': token.auth_id,
+            'tenant': token.metadata.get('tenant_uuid'),
+            'sid': token.session_uuid,
+            'iat': int(token.issued_t),
+            'exp': int(token.expire_t),
+            'acl': list(token.acl),
+            'xivo_uuid': token.xivo_uuid,
+            'pbx_user_uuid': token.pbx_user_uuid,
+            'metadata': token.metadata,
+        }
+        signing_input = '{}.{}'.format(
+            _b64encode(json.dumps(header).encode('utf-8')),
+            _b64encode(json.dumps(claims).encode('utf-8')),
+        )
+        signature = key.private_key.sign(signing_input.encode('ascii'))
+        return '{}.{}'.format(signing_input, _b64encode(signature))
+
+    def verify(self, signed_token, verify_expiration=True):
+        try:
+            encoded_header, encoded_claims, signature = signed_token.split('.')
+            header = json.loads(_b64decode(encoded_header))
+            if header.get('alg') != ALGORITHM:
+                raise UnknownTokenException()
+
+            key = self._key_ring.get(header.get('kid'))
+            if not key:
+                raise UnknownTokenException()
+
+            signing_input = '{}.{}'.format(encoded_header, encoded_claims)
+            key.public_key.verify(_b64decode(signature), signing_input.encode('ascii'))
+
+            claims = json.loads(_b64decode(encoded_claims))
+        except (
+            AttributeError,
+            TypeError,
+            ValueError,
+            binascii.Error,
+            InvalidSignature,
+        ):
+            raise UnknownTokenException()
+
+        if verify_expiration and claims['exp'] < time.time():
+            raise UnknownTokenException()
+
+        if claims['jti'] in self._revocation_list:
+            raise UnknownTokenException()
+
+        if claims['sid'] in self._revocation_list:
+            raise UnknownTokenException()
+
+        return claims
+
+    def revoke(self, uuid_, expire_at):
+        self._revocation_list.add(uuid_, expire_at)
+
+    def list_keys(self):
+        return [
+            {
+                'kty': 'OKP',
+                'crv': 'Ed25519',
+                'alg': ALGORITHM,
+                'use': 'sig',
+                'kid': key.kid,
+                'x': _b64encode(_raw_public_bytes(key.public_key)),
+            }
+            for key in self._key_ring.list_()
+        ]
+
+    def list_revoked(self):
+        return self._revocation_list.list_()
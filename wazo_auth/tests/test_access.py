@@ -0,0 +1,121 @@
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import random
+import unittest
+
+from hamcrest import assert_that, equal_to, same_instance
+from mock import patch
+
+from ..access import AccessCheck, access_to_regex, get_access_check
+
+AUTH_ID = '2b4c5a3e-5cc6-4a37-8a3b-d1d9c4e5c1f0'
+ACCESS_SEGMENTS = ['a', 'b', 'me', '*', '#', '', 'a*', '#b', 'a\\b']
+REQUIRED_ACCESS_SEGMENTS = ['a', 'b', 'me', '', 'x', '*', 'a\nb']
+
+
+def match_one_by_one(auth_id, acl, required_access):
+    negative_acl = [access[1:] for access in acl if access.startswith('!')]
+    positive_acl = [access for access in acl if not access.startswith('!')]
+    for access in negative_acl:
+        if access_to_regex(access, auth_id).match(required_access):
+            return False
+    for access in positive_acl:
+        if access_to_regex(access, auth_id).match(required_access):
+            return True
+    return False
+
+
+def generate_corpus(auth_id, seed, count):
+    rnd = random.Random(seed)
+    access_segments = ACCESS_SEGMENTS + [auth_id]
+    required_access_segments = REQUIRED_ACCESS_SEGMENTS + [auth_id]
+
+    def access(segments, max_length):
+        length = rnd.randint(1, max_length)
+        return '.'.join(rnd.choice(segments) for _ in range(length))
+
+    for _ in range(count):
+        acl = [
+            '{}{}'.format('!' if rnd.random() < 0.3 else '', access(access_segments, 5))
+            for _ in range(rnd.randint(0, 6))
+        ]
+        required_accesses = [access(required_access_segments, 6) for _ in range(20)]
+        yield acl, required_accesses
+
+
+class TestAccessCheck(unittest.TestCase):
+    def assert_equivalent(self, auth_id, acl, required_accesses):
+        access_check = AccessCheck(auth_id, acl)
+        results = access_check.matches_required_accesses(required_accesses)
+
+        for required_access in required_accesses:
+            expected = match_one_by_one(auth_id, acl, required_access)
+            assert_that(
+                access_check.matches_required_access(required_access),
+                equal_to(expected),
+                '{} {} {}'.format(auth_id, acl, required_access),
+            )
+            assert_that(
+                results[required_access],
+                equal_to(expected),
+                'batch {} {} {}'.format(auth_id, acl, required_access),
+            )
+
+    def test_equivalence_corpus_with_trie(self):
+        with patch('wazo_auth.access.ACCESS_TREE_MIN_SIZE', 0):
+            for auth_id in [AUTH_ID, '123', 'abc.def', '']:
+                for acl, required_accesses in generate_corpus(auth_id, 42, 500):
+                    self.assert_equivalent(auth_id, acl, required_accesses)
+
+    def test_equivalence_corpus_with_regex(self):
+        for acl, required_accesses in generate_corpus(AUTH_ID, 43, 200):
+            self.assert_equivalent(AUTH_ID, acl, required_accesses)
+
+    def test_matches_the_same_accesses_as_each_access_regex(self):
+        acl = [
+            'confd.users.*.read',
+            'confd.users.me.#',
+            'calld.#',
+            '!calld.calls.*.delete',
+            '!auth.users.me.password.edit',
+            'auth.users.me.#',
+            'foo.#.me',
+            'foo.#.me.bar',
+            '!*.bar',
+        ]
+        required_accesses = [
+            'confd.users.42.read',
+            'confd.users.42.foo.read',
+            'confd.users.me.lines.read',
+            'confd.users.{}.lines.read'.format(AUTH_ID),
+            'calld.calls.42.delete',
+            'calld.calls.42.read',
+            'auth.users.me.password.edit',
+            'auth.users.{}.password.edit'.format(AUTH_ID),
+            'auth.users.me.tokens.read',
+            'foo.bar.me',
+            'foo.bar.{}'.format(AUTH_ID),
+            'foo.bar.toto.me.bar',
+            'foo.bar',
+            'other.bar',
+            'other',
+            '',
+        ]
+        with patch('wazo_auth.access.ACCESS_TREE_MIN_SIZE', 0):
+            self.assert_equivalent(AUTH_ID, acl, required_accesses)
+        self.assert_equivalent(AUTH_ID, acl, required_accesses)
+
+    def test_empty_acl(self):
+        access_check = AccessCheck(AUTH_ID, [])
+
+        assert_that(access_check.matches_required_access('foo'), equal_to(False))
+        assert_that(access_check.matches_required_access(None), equal_to(True))
+
+    def test_get_access_check_is_memoized(self):
+        acl = ('foo.#', '!foo.bar')
+
+        result_1 = get_access_check(AUTH_ID, acl)
+        result_2 = get_access_check(AUTH_ID, tuple(acl))
+
+        assert_that(result_1, same_instance(result_2))
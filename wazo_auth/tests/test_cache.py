@@ -0,0 +1,81 @@
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import time
+import unittest
+
+from hamcrest import assert_that, equal_to, has_entries, none
+from mock import patch
+
+from ..cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = LRUCache(max_size=2, ttl=30)
+
+    def test_get_set(self):
+        assert_that(self.cache.get('a'), none())
+
+        self.cache.set('a', 42)
+
+        assert_that(self.cache.get('a'), equal_to(42))
+        assert_that(self.cache.stats(), has_entries(hits=1, misses=1, size=1))
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+
+        assert_that(self.cache.get('a'), equal_to(1))
+        assert_that(self.cache.get('b'), none())
+        assert_that(self.cache.get('c'), equal_to(3))
+
+    def test_entry_expires_after_ttl(self):
+        now = time.time()
+        with patch('wazo_auth.cache.time.time', return_value=now):
+            self.cache.set('a', 1)
+
+        with patch('wazo_auth.cache.time.time', return_value=now + 31):
+            assert_that(self.cache.get('a'), none())
+
+    def test_entry_expires_at_its_expiration_before_ttl(self):
+        now = time.time()
+        with patch('wazo_auth.cache.time.time', return_value=now):
+            self.cache.set('a', 1, expire_at=now + 5)
+
+        with patch('wazo_auth.cache.time.time', return_value=now + 4):
+            assert_that(self.cache.get('a'), equal_to(1))
+
+        with patch('wazo_auth.cache.time.time', return_value=now + 5):
+            assert_that(self.cache.get('a'), none())
+
+    def test_delete(self):
+        self.cache.set('a', 1)
+
+        self.cache.delete('a')
+        self.cache.delete('unknown')
+
+        assert_that(self.cache.get('a'), none())
+
+    def test_invalidate(self):
+        now = time.time()
+        self.cache.set('a', 1)
+
+        with patch('wazo_auth.cache.time.time', return_value=now):
+            self.cache.invalidate('a')
+            self.cache.set('a', 1)
+
+        assert_that(self.cache.get('a'), none())
+
+        with patch('wazo_auth.cache.time.time', return_value=now + 31):
+            self.cache.set('a', 2)
+            assert_that(self.cache.get('a'), equal_to(2))
+
+    def test_disabled(self):
+        cache = LRUCache.from_config({'enabled': False, 'max_size': 10})
+
+        cache.set('a', 1)
+
+        assert_that(cache.get('a'), none())
@@ -1,13 +1,31 @@
 # Copyright 2017-2020 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from hamcrest import assert_that, contains, calling, equal_to, has_entries, not_, raises
+import multiprocessing
+import time
+
+from hamcrest import (
+    assert_that,
+    contains,
+    contains_inanyorder,
+    calling,
+    equal_to,
+    has_entries,
+    has_properties,
+    not_,
+    not_none,
+    raises,
+    starts_with,
+)
 from ..schemas import BaseSchema
 from marshmallow import fields
-from mock import Mock, patch, sentinel as s
+from mock import Mock, call, patch, sentinel as s
 from unittest import TestCase
 
+from wazo_auth.cache import LRUCache
 from wazo_auth.config import _DEFAULT_CONFIG
+from wazo_auth.interfaces import LoginContext
+from wazo_auth.signed_token import TokenSigner
 from .. import exceptions, services
 from ..database import queries
 from ..database.queries import (
@@ -20,6 +38,7 @@ from ..database.queries import (
     session,
     tenant,
     token,
+    token_signing,
     user,
 )
 
@@ -37,6 +56,7 @@ class BaseServiceTestCase(TestCase):
         self.session_dao = Mock(session.SessionDAO)
         self.tenant_dao = Mock(tenant.TenantDAO)
         self.token_dao = Mock(token.TokenDAO)
+        self.token_signing_dao = Mock(token_signing.TokenSigningDAO)
         self.user_dao = Mock(user.UserDAO)
         self.encrypter = Mock(services.PasswordEncrypter)
         self.encrypter.encrypt_password.return_value = s.salt, s.hash_
@@ -53,6 +73,7 @@ class BaseServiceTestCase(TestCase):
             session=self.session_dao,
             tenant=self.tenant_dao,
             token=self.token_dao,
+            token_signing=self.token_signing_dao,
             user=self.user_dao,
         )
 
@@ -131,7 +152,32 @@ class TestGroupService(BaseServiceTestCase):
     def setUp(self):
         super().setUp()
         self._tenant_tree = Mock()
-        self.service = services.GroupService(self.dao, self._tenant_tree)
+        self.acl_cache = Mock()
+        self.service = services.GroupService(
+            self.dao, self._tenant_tree, self.acl_cache
+        )
+
+    @patch('wazo_auth.services.group.after_commit')
+    def test_association_changes_invalidate_the_acl_cache(self, after_commit):
+        self.group_dao.is_system_managed.return_value = False
+        self.group_dao.remove_policy.return_value = 1
+        self.group_dao.remove_user.return_value = 1
+
+        for change in [
+            lambda: self.service.add_policy(s.group_uuid, s.policy_uuid),
+            lambda: self.service.add_user(s.group_uuid, s.user_uuid),
+            lambda: self.service.remove_policy(s.group_uuid, s.policy_uuid),
+            lambda: self.service.remove_user(s.group_uuid, s.user_uuid),
+            lambda: self.service.delete(s.group_uuid, None),
+        ]:
+            self.acl_cache.reset_mock()
+
+            change()
+
+            self.acl_cache.invalidate.assert_not_called()
+            (on_commit,), _ = after_commit.call_args
+            on_commit()
+            self.acl_cache.invalidate.assert_called_once_with()
 
     def test_remove_policy(self):
         def when(nb_deleted, group_exists=True, policy_exists=True):
@@ -248,6 +294,8 @@ class TestUserService(BaseServiceTestCase):
             self.tenant_tree,
             self.group_service,
             encrypter=self.encrypter,
+            tenant_visibility_cache=LRUCache(max_size=10),
+            acl_cache=services.helpers.ACLCache(LRUCache(max_size=10)),
         )
 
     def test_change_password(self):
@@ -373,3 +421,510 @@ class TestUserService(BaseServiceTestCase):
 
         self.user_dao.create.assert_called_once_with(**expected_db_params)
         assert_that(result, equal_to(self.user_dao.create.return_value))
+
+    def test_list_users_tenant_scope(self):
+        self.service.list_users(scoping_tenant_uuid=s.tenant_uuid, recurse=True)
+
+        tenant_scope = self.user_dao.list_.call_args[1]['tenant_uuids']
+        assert_that(tenant_scope, has_properties(tenant_uuid=str(s.tenant_uuid)))
+
+        self.service.list_users(scoping_tenant_uuid=self.top_tenant_uuid, recurse=True)
+
+        tenant_scope = self.user_dao.list_.call_args[1]['tenant_uuids']
+        assert_that(tenant_scope, has_properties(tenant_uuid=None))
+        self.tenant_tree.list_visible_tenants.assert_not_called()
+
+    def test_delete_user_revokes_the_signed_tokens(self):
+        token_signer = Mock(TokenSigner)
+        self.service._token_signer = token_signer
+        self.token_dao.list_sessions.return_value = [
+            {'session_uuid': s.session_1, 'expire_t': s.expire_1},
+            {'session_uuid': s.session_2, 'expire_t': s.expire_2},
+        ]
+
+        with patch.object(self.service, 'assert_user_in_subtenant'):
+            self.service.delete_user(None, s.user_uuid)
+
+        self.token_dao.list_sessions.assert_called_once_with(s.user_uuid)
+        assert_that(
+            token_signer.revoke.call_args_list,
+            contains(call(s.session_1, s.expire_1), call(s.session_2, s.expire_2)),
+        )
+        self.user_dao.delete.assert_called_once_with(s.user_uuid)
+
+    def test_user_has_sub_tenant_is_cached(self):
+        self.user_dao.list_.return_value = [{'tenant_uuid': s.tenant_uuid}]
+        self.tenant_tree.is_under.side_effect = lambda uuid, _: uuid == s.sub
+
+        assert_that(self.service.user_has_sub_tenant(s.user_uuid, s.sub))
+        assert_that(not_(self.service.user_has_sub_tenant(s.user_uuid, s.other)))
+        self.user_dao.list_.reset_mock()
+
+        assert_that(self.service.user_has_sub_tenant(s.user_uuid, s.sub))
+        assert_that(not_(self.service.user_has_sub_tenant(s.user_uuid, s.other)))
+        self.user_dao.list_.assert_not_called()
+
+    @patch('wazo_auth.services.user.after_commit')
+    def test_user_has_sub_tenant_invalidated_on_user_changes(self, after_commit):
+        self.user_dao.list_.return_value = [{'tenant_uuid': s.tenant_uuid}]
+        self.tenant_tree.is_under.return_value = True
+
+        for change in [
+            lambda: self.service.update(None, s.user_uuid, username='foo'),
+            lambda: self.service.delete_user(None, s.user_uuid),
+        ]:
+            self.service.user_has_sub_tenant(s.user_uuid, s.sub)
+            after_commit.reset_mock()
+            change()
+            for (on_commit,), _ in after_commit.call_args_list:
+                on_commit()
+            self.user_dao.list_.reset_mock()
+
+            self.service.user_has_sub_tenant(s.user_uuid, s.sub)
+
+            self.user_dao.list_.assert_called_once_with(uuid=s.user_uuid)
+
+    def test_verify_password_with_a_login_context(self):
+        self.encrypter.verify_password.return_value = True
+        self.encrypter.needs_rehash.return_value = False
+        context = LoginContext(
+            s.uuid, s.username, s.tenant_uuid, 'user', True, s.hash_, s.salt
+        )
+
+        result = self.service.verify_password(
+            s.username, s.password, login_context=context
+        )
+
+        assert_that(result, equal_to(True))
+        self.encrypter.verify_password.assert_called_once_with(
+            s.password, s.salt, s.hash_
+        )
+        self.user_dao.get_login.assert_not_called()
+
+        context.enabled = False
+        result = self.service.verify_password(
+            s.username, s.password, login_context=context
+        )
+        assert_that(result, equal_to(False))
+
+    def test_verify_password_rehash(self):
+        self.user_dao.get_login.return_value = {
+            'uuid': s.uuid,
+            'username': s.username,
+            'tenant_uuid': s.tenant_uuid,
+            'purpose': 'user',
+            'enabled': True,
+            'password_hash': s.old_hash,
+            'password_salt': s.old_salt,
+        }
+        self.encrypter.verify_password.return_value = True
+        self.encrypter.needs_rehash.return_value = False
+
+        assert_that(self.service.verify_password(s.username, s.password))
+        self.user_dao.change_password.assert_not_called()
+
+        self.encrypter.needs_rehash.return_value = True
+
+        assert_that(self.service.verify_password(s.username, s.password))
+        self.encrypter.encrypt_password.assert_called_once_with(s.password)
+        self.user_dao.change_password.assert_called_once_with(s.uuid, s.salt, s.hash_)
+
+        self.encrypter.verify_password.return_value = False
+        self.user_dao.change_password.reset_mock()
+
+        assert_that(not_(self.service.verify_password(s.username, s.password)))
+        self.user_dao.change_password.assert_not_called()
+
+    def test_get_effective_acl_is_cached(self):
+        self.policy_dao.get_effective_acl.return_value = ['foo.bar']
+
+        acl = self.service.get_effective_acl(s.username, s.policy_name)
+        assert_that(acl, contains('foo.bar'))
+        acl = self.service.get_effective_acl(s.username, s.policy_name)
+        assert_that(acl, contains('foo.bar'))
+
+        self.policy_dao.get_effective_acl.assert_called_once_with(
+            s.username, s.policy_name
+        )
+
+    @patch('wazo_auth.services.user.after_commit')
+    def test_get_effective_acl_invalidated_on_policy_changes(self, after_commit):
+        self.policy_dao.get_effective_acl.return_value = []
+        self.user_dao.remove_policy.return_value = 1
+
+        for change in [
+            lambda: self.service.add_policy(s.user_uuid, s.policy_uuid),
+            lambda: self.service.remove_policy(s.user_uuid, s.policy_uuid),
+        ]:
+            self.service.get_effective_acl(s.username)
+            change()
+            self.policy_dao.get_effective_acl.reset_mock()
+
+            # A login before the commit would read the previous policies
+            self.service.get_effective_acl(s.username)
+            self.policy_dao.get_effective_acl.assert_not_called()
+
+            (on_commit,), _ = after_commit.call_args
+            on_commit()
+            self.service.get_effective_acl(s.username)
+
+            self.policy_dao.get_effective_acl.assert_called_once_with(s.username, None)
+
+
+class TestTenantService(BaseServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tenant_tree = Mock()
+        self.bus_publisher = Mock()
+        self.tenant_visibility_cache = LRUCache(max_size=10)
+        self.service = services.TenantService(
+            self.dao,
+            self.tenant_tree,
+            Mock(),
+            Mock(),
+            {},
+            self.bus_publisher,
+            self.tenant_visibility_cache,
+        )
+
+    @patch('wazo_auth.services.tenant.after_commit')
+    def test_new_updates_the_tenant_tree_and_cache(self, after_commit):
+        self.tenant_visibility_cache.set((s.user_uuid, s.tenant_uuid), False)
+        self.tenant_dao.create.return_value = s.tenant_uuid
+        self.tenant_dao.list_.return_value = [
+            {'uuid': s.tenant_uuid, 'parent_uuid': s.parent_uuid}
+        ]
+
+        self.service.new(name='foo', address={})
+
+        key = (s.user_uuid, s.tenant_uuid)
+        assert_that(self.tenant_visibility_cache.get(key), not_none())
+        self.tenant_tree.add.assert_not_called()
+        self.bus_publisher.publish.assert_not_called()
+
+        for (on_commit,), _ in after_commit.call_args_list:
+            on_commit()
+        assert_that(self.tenant_visibility_cache.get(key), equal_to(None))
+        self.tenant_tree.add.assert_called_once_with(s.tenant_uuid, s.parent_uuid)
+        self.bus_publisher.publish.assert_called_once()
+
+    @patch('wazo_auth.services.tenant.after_commit')
+    def test_delete_updates_the_tenant_tree_and_cache(self, after_commit):
+        self.tenant_visibility_cache.set((s.user_uuid, s.tenant_uuid), True)
+
+        self.service.delete(s.tenant_uuid, s.tenant_uuid)
+
+        key = (s.user_uuid, s.tenant_uuid)
+        assert_that(self.tenant_visibility_cache.get(key), not_none())
+        self.tenant_tree.remove.assert_not_called()
+        self.bus_publisher.publish.assert_not_called()
+
+        for (on_commit,), _ in after_commit.call_args_list:
+            on_commit()
+        assert_that(self.tenant_visibility_cache.get(key), equal_to(None))
+        self.tenant_tree.remove.assert_called_once_with(s.tenant_uuid)
+        self.bus_publisher.publish.assert_called_once()
+
+
+class TestTokenService(BaseServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tenant_tree = Mock()
+        self.bus_publisher = Mock()
+        self.user_service = Mock()
+        self.token_cache = LRUCache(max_size=10)
+        self.service = services.TokenService(
+            _DEFAULT_CONFIG,
+            self.dao,
+            self.tenant_tree,
+            self.bus_publisher,
+            self.user_service,
+            self.token_cache,
+        )
+        self.token_dao.get.side_effect = self._token_data
+        self.token_dao.list_.side_effect = lambda uuids: [
+            self._token_data(uuid) for uuid in uuids if uuid != s.unknown
+        ]
+
+    @staticmethod
+    def _token_data(token_uuid):
+        return {
+            'uuid': token_uuid,
+            'auth_id': s.auth_id,
+            'pbx_user_uuid': None,
+            'xivo_uuid': None,
+            'issued_t': time.time(),
+            'expire_t': time.time() + 120,
+            'acl': ['foo.bar'],
+            'metadata': {'uuid': s.user_uuid},
+            'session_uuid': s.session_uuid,
+            'remote_addr': '',
+            'user_agent': '',
+        }
+
+    def test_new_token_passes_the_backend_policy_to_the_backend(self):
+        config = dict(_DEFAULT_CONFIG, backend_policies={'foo': 'foo_policy'})
+        service = services.TokenService(
+            config, self.dao, self.tenant_tree, self.bus_publisher, self.user_service
+        )
+        self.policy_dao.get.return_value = [{'name': 'foo_policy', 'acl': ['foo.#']}]
+        self.token_dao.create.return_value = s.token_uuid, s.session_uuid
+        backend = Mock()
+        backend.get_acls.return_value = ['foo.#']
+        backend.get_metadata.return_value = {
+            'auth_id': 'alice',
+            'uuid': s.user_uuid,
+            'xivo_uuid': s.xivo_uuid,
+        }
+        args = {'backend': 'foo', 'user_agent': '', 'remote_addr': ''}
+
+        service.new_token(backend, 'alice', args)
+
+        assert_that(args, has_entries(backend_policy='foo_policy', acl=['foo.#']))
+
+    def test_get_uses_the_cache(self):
+        token_1 = self.service.get(s.token_uuid, 'foo.bar')
+        token_2 = self.service.get(s.token_uuid, None)
+
+        assert_that(token_1, equal_to(token_2))
+        self.token_dao.get.assert_called_once_with(s.token_uuid)
+        assert_that(self.token_cache.stats(), has_entries(hits=1, misses=1))
+
+    def test_get_checks_the_access_of_a_cached_token(self):
+        self.service.get(s.token_uuid, None)
+
+        assert_that(
+            calling(self.service.get).with_args(s.token_uuid, 'other'),
+            raises(exceptions.MissingAccessTokenException),
+        )
+
+    def test_remove_token_invalidates_the_cache(self):
+        self.token_dao.delete.return_value = {}, {}
+        self.service.get(s.token_uuid, None)
+
+        self.service.remove_token(s.token_uuid)
+        self.service.get(s.token_uuid, None)
+
+        assert_that(self.token_dao.get.call_count, equal_to(2))
+
+    @patch('wazo_auth.services.token.after_commit')
+    def test_remove_token_is_not_cached_again_before_the_commit(self, after_commit):
+        self.token_dao.delete.return_value = {}, {}
+
+        self.service.remove_token(s.token_uuid)
+        self.service.get(s.token_uuid, None)
+        (on_commit,), _ = after_commit.call_args
+        on_commit()
+        self.service.get(s.token_uuid, None)
+
+        assert_that(self.token_dao.get.call_count, equal_to(2))
+
+    def test_validate_tokens(self):
+        self.service.get(s.cached, None)
+
+        result = self.service.validate_tokens(
+            [
+                {'token': s.cached, 'scope': 'foo.bar', 'tenant': None},
+                {'token': s.token_uuid, 'scope': 'other', 'tenant': None},
+                {'token': s.unknown, 'scope': None, 'tenant': None},
+                {'token': s.token_uuid, 'scope': None, 'tenant': None},
+            ]
+        )
+
+        assert_that(
+            result,
+            contains(
+                has_entries(token=s.cached, valid=True, utc_expires_at=not_none()),
+                has_entries(token=s.token_uuid, valid=False),
+                has_entries(token=s.unknown, valid=False, utc_expires_at=None),
+                has_entries(token=s.token_uuid, valid=True),
+            ),
+        )
+        assert_that(self.token_dao.list_.call_count, equal_to(1))
+        assert_that(
+            self.token_dao.list_.call_args[1]['uuids'],
+            contains_inanyorder(s.token_uuid, s.unknown),
+        )
+
+    def test_get_signed_token_without_database(self):
+        token_signer = Mock(TokenSigner)
+        token_signer.verify.return_value = {
+            'jti': s.token_uuid,
+            'sub': s.auth_id,
+            'sid': s.session_uuid,
+            'iat': time.time(),
+            'exp': time.time() + 120,
+            'acl': ['foo.bar'],
+            'xivo_uuid': None,
+            'pbx_user_uuid': None,
+            'metadata': {},
+        }
+        self.service._token_signer = token_signer
+
+        token = self.service.get('header.claims.signature', 'foo.bar')
+
+        assert_that(token.token, equal_to('header.claims.signature'))
+        self.token_dao.get.assert_not_called()
+
+    def test_remove_signed_token_revokes_it(self):
+        token_signer = Mock(TokenSigner)
+        token_signer.verify.return_value = {'jti': s.token_uuid, 'exp': s.expire_t}
+        self.service._token_signer = token_signer
+        self.token_dao.delete.return_value = {}, {}
+
+        self.service.remove_token('header.claims.signature')
+
+        token_signer.revoke.assert_called_once_with(s.token_uuid, s.expire_t)
+        self.token_dao.delete.assert_called_once_with(s.token_uuid)
+
+    def test_check_fetches_only_the_token_access(self):
+        self.token_dao.get_access.return_value = {
+            'auth_id': s.auth_id,
+            'expire_t': time.time() + 120,
+            'acl': ['foo.bar'],
+            'metadata': {'uuid': s.user_uuid, 'tenant_uuid': s.tenant_uuid},
+        }
+
+        self.service.check(s.token_uuid, 'foo.bar', s.tenant_uuid)
+
+        self.token_dao.get_access.assert_called_once_with(s.token_uuid)
+        self.token_dao.get.assert_not_called()
+        self.user_service.user_has_sub_tenant.assert_not_called()
+        assert_that(
+            calling(self.service.check).with_args(s.token_uuid, 'other', None),
+            raises(exceptions.MissingAccessTokenException),
+        )
+
+    def test_check_caches_the_token_access(self):
+        self.token_dao.get_access.return_value = {
+            'auth_id': s.auth_id,
+            'expire_t': time.time() + 120,
+            'acl': ['foo.bar'],
+            'metadata': {'uuid': s.user_uuid},
+        }
+
+        self.service.check(s.token_uuid, 'foo.bar', None)
+        self.service.check(s.token_uuid, 'foo.bar', None)
+
+        self.token_dao.get_access.assert_called_once_with(s.token_uuid)
+
+        token = self.service.get(s.token_uuid, None)
+
+        self.token_dao.get.assert_called_once_with(s.token_uuid)
+        assert_that(token.session_uuid, equal_to(s.session_uuid))
+
+    def test_check_uses_the_cached_token(self):
+        self.service.get(s.token_uuid, None)
+        self.user_service.user_has_sub_tenant.return_value = False
+
+        self.service.check(s.token_uuid, 'foo.bar', None)
+
+        self.token_dao.get_access.assert_not_called()
+        assert_that(
+            calling(self.service.check).with_args(s.token_uuid, None, s.tenant_uuid),
+            raises(exceptions.MissingTenantTokenException),
+        )
+
+
+class TestPasswordEncrypter(TestCase):
+    def test_legacy_hash(self):
+        salt = b'salt'
+        legacy_hash = services.user.LEGACY_SCHEME.compute(b'secret', salt)
+        encrypter = services.PasswordEncrypter()
+
+        assert_that(encrypter.verify_password('secret', salt, legacy_hash))
+        assert_that(not_(encrypter.verify_password('other', salt, legacy_hash)))
+        assert_that(encrypter.needs_rehash(legacy_hash))
+
+        hash_ = encrypter.compute_password_hash('secret', salt)
+        assert_that(hash_, equal_to('$pbkdf2-sha512$i=250000$' + legacy_hash))
+        assert_that(not_(encrypter.needs_rehash(hash_)))
+
+    def test_schemes(self):
+        pbkdf2 = services.user.PBKDF2Scheme('sha256', 1000)
+        scrypt = services.user.ScryptScheme(n=1024, r=8, p=1)
+        encrypter = services.PasswordEncrypter(scheme=scrypt)
+
+        salt, hash_ = encrypter.encrypt_password('secret')
+
+        assert_that(hash_, starts_with('$scrypt$n=1024,r=8,p=1$'))
+        assert_that(encrypter.verify_password('secret', salt, hash_))
+        assert_that(not_(encrypter.verify_password('other', salt, hash_)))
+
+        pbkdf2_hash = encrypter.compute_password_hash('secret', salt, pbkdf2)
+        assert_that(pbkdf2_hash, starts_with('$pbkdf2-sha256$i=1000$'))
+        assert_that(encrypter.verify_password('secret', salt, pbkdf2_hash))
+        assert_that(encrypter.needs_rehash(pbkdf2_hash))
+
+        assert_that(not_(encrypter.verify_password('secret', salt, '$foo$x=1$00')))
+
+    def test_corrupted_hash(self):
+        encrypter = services.PasswordEncrypter()
+        salt = b'salt'
+
+        corrupted_hashes = [
+            '$pbkdf2-sha512$$00',
+            '$pbkdf2-sha512$n=1000$00',
+            '$pbkdf2-sha512$i=0$00',
+            '$pbkdf2-sha512$i=1000,n=1$00',
+            '$pbkdf2-unknown$i=1000$00',
+            '$pbkdf2-sha512$i=foo$00',
+            '$scrypt$n=1024,r=8$00',
+            '$scrypt$n=1024,r=8,p=1,x=1$00',
+            '$scrypt$n=1000,r=8,p=1$00',
+            '$scrypt$n=1024,r=8,p=1',
+            '$scrypt$n=1024,r=8,p=1$00$00',
+        ]
+        for hash_ in corrupted_hashes:
+            assert_that(not_(encrypter.verify_password('secret', salt, hash_)), hash_)
+
+    def test_from_config(self):
+        config = dict(_DEFAULT_CONFIG['password_hashing'], scheme='pbkdf2_sha256')
+
+        encrypter = services.PasswordEncrypter.from_config(config)
+
+        hash_ = encrypter.compute_password_hash('secret', b'salt')
+        assert_that(hash_, starts_with('$pbkdf2-sha256$i=250000$'))
+
+
+class TestPasswordHashExecutor(TestCase):
+    def test_compute_password_hash(self):
+        executor = services.PasswordHashExecutor(workers=1, timeout=30)
+        self.addCleanup(executor.shutdown)
+        encrypter = services.PasswordEncrypter(executor)
+        salt = b'salt'
+
+        result = encrypter.compute_password_hash('secret', salt)
+
+        expected = services.PasswordEncrypter().compute_password_hash('secret', salt)
+        assert_that(result, equal_to(expected))
+        assert_that(executor.stats(), has_entries(completed=1, pending=0, rejected=0))
+
+    def test_timeout_and_full_queue(self):
+        executor = services.PasswordHashExecutor(
+            workers=1, max_queue_size=0, timeout=0.5
+        )
+        self.addCleanup(executor.shutdown)
+
+        assert_that(
+            calling(executor.submit).with_args(time.sleep, 2),
+            raises(exceptions.PasswordHashTimeoutException),
+        )
+
+        assert_that(
+            calling(executor.submit).with_args(time.sleep, 0),
+            raises(exceptions.PasswordHashQueueFullException),
+        )
+        assert_that(executor.stats(), has_entries(pending=1, rejected=1, timeouts=1))
+
+    def test_shutdown_terminates_the_busy_workers(self):
+        executor = services.PasswordHashExecutor(workers=1, timeout=0.5)
+        assert_that(
+            calling(executor.submit).with_args(time.sleep, 30),
+            raises(exceptions.PasswordHashTimeoutException),
+        )
+        workers = multiprocessing.active_children()
+
+        executor.shutdown()
+
+        assert_that(workers, contains(has_properties(exitcode=not_none())))
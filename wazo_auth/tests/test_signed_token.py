@@ -0,0 +1,217 @@
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import time
+import unittest
+import uuid
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+from hamcrest import (
+    assert_that,
+    calling,
+    contains,
+    empty,
+    equal_to,
+    has_entries,
+    has_key,
+    has_length,
+    not_,
+    raises,
+)
+from mock import patch
+
+from ..exceptions import UnknownTokenException
+from ..signed_token import (
+    RevocationList,
+    SigningKeyRing,
+    TokenSigner,
+    _b64decode,
+    is_signed_token,
+)
+from ..token import Token
+
+
+class InMemoryTokenSigningDAO:
+    def __init__(self):
+        self.keys = []
+        self.revocations = {}
+
+    def list_keys(self):
+        return sorted(self.keys, key=lambda key: key['created_at'], reverse=True)
+
+    def rotate_key(self, key, rotation_interval, retained_keys):
+        keys = self.list_keys()
+        if not keys or key['created_at'] - keys[0]['created_at'] >= rotation_interval:
+            keys.insert(0, key)
+        self.keys = keys[:retained_keys]
+        return list(self.keys)
+
+    def add_revocation(self, uuid, expire_t):
+        now = int(time.time())
+        self.revocations = {
+            revoked_uuid: revocation
+            for revoked_uuid, revocation in self.revocations.items()
+            if revocation['expire_t'] > now
+        }
+        self.revocations.setdefault(
+            uuid, {'uuid': uuid, 'expire_t': int(expire_t), 'revoked_at': now}
+        )
+
+    def list_revocations(self, revoked_since=None):
+        now = int(time.time())
+        return [
+            revocation
+            for revocation in self.revocations.values()
+            if revocation['expire_t'] > now
+            and (revoked_since is None or revocation['revoked_at'] >= revoked_since)
+        ]
+
+
+def new_token(expire_t=None, acl=None):
+    now = time.time()
+    return Token(
+        str(uuid.uuid4()),
+        auth_id=str(uuid.uuid4()),
+        pbx_user_uuid=None,
+        xivo_uuid=str(uuid.uuid4()),
+        issued_t=now,
+        expire_t=expire_t or now + 120,
+        acl=acl or ['foo.#'],
+        metadata={'tenant_uuid': str(uuid.uuid4())},
+        session_uuid=str(uuid.uuid4()),
+        user_agent='',
+        remote_addr='',
+    )
+
+
+class TestTokenSigner(unittest.TestCase):
+    def setUp(self):
+        self.dao = InMemoryTokenSigningDAO()
+        self.signer = self.new_signer()
+
+    def new_signer(self, rotation_interval=3600, retained_keys=2, sync_interval=0):
+        key_ring = SigningKeyRing(self.dao, rotation_interval, retained_keys)
+        return TokenSigner(key_ring, RevocationList(self.dao, sync_interval))
+
+    def test_sign_and_verify(self):
+        token = new_token()
+
+        signed_token = self.signer.sign(token)
+
+        assert_that(is_signed_token(signed_token))
+        assert_that(
+            self.signer.verify(signed_token),
+            has_entries(
+                jti=token.token,
+                sub=token.auth_id,
+                sid=token.session_uuid,
+                tenant=token.metadata['tenant_uuid'],
+                exp=int(token.expire_t),
+            ),
+        )
+
+    def test_acl_is_included_in_the_claims(self):
+        token = new_token(acl=['foo.#', '!foo.bar'])
+
+        claims = self.signer.verify(self.signer.sign(token))
+
+        assert_that(claims['acl'], contains('foo.#', '!foo.bar'))
+
+    def test_verify_tampered_token(self):
+        header, claims, signature = self.signer.sign(new_token()).split('.')
+        other_claims = self.signer.sign(new_token()).split('.')[1]
+
+        for tampered_token in [
+            '.'.join([header, other_claims, signature]),
+            '.'.join([header, claims, signature[:-2]]),
+            '.'.join([header, claims, '']),
+            '.'.join(['e30', claims, signature]),
+            'a.b.c',
+        ]:
+            assert_that(
+                calling(self.signer.verify).with_args(tampered_token),
+                raises(UnknownTokenException),
+                tampered_token,
+            )
+
+    def test_verify_expired_token(self):
+        signed_token = self.signer.sign(new_token(expire_t=time.time() - 10))
+
+        assert_that(
+            calling(self.signer.verify).with_args(signed_token),
+            raises(UnknownTokenException),
+        )
+        assert_that(
+            calling(self.signer.verify).with_args(
+                signed_token, verify_expiration=False
+            ),
+            not_(raises(UnknownTokenException)),
+        )
+
+    def test_revoke(self):
+        token_1, token_2 = new_token(), new_token()
+        signed_token_1 = self.signer.sign(token_1)
+        signed_token_2 = self.signer.sign(token_2)
+
+        self.signer.revoke(token_1.token, token_1.expire_t)
+        self.signer.revoke(token_2.session_uuid, token_2.expire_t)
+
+        for signed_token in [signed_token_1, signed_token_2]:
+            assert_that(
+                calling(self.signer.verify).with_args(signed_token),
+                raises(UnknownTokenException),
+            )
+        assert_that(
+            calling(self.new_signer().verify).with_args(signed_token_1),
+            raises(UnknownTokenException),
+        )
+
+    def test_revoked_entries_are_removed_when_expired(self):
+        self.signer.revoke('expired', time.time() - 1)
+        self.signer.revoke('revoked', time.time() + 60)
+        self.signer.revoke('other', time.time() + 60)
+
+        assert_that(self.signer.list_revoked(), has_length(2))
+
+    def test_key_rotation(self):
+        signer = self.new_signer(rotation_interval=0, retained_keys=2)
+        signed_token = signer.sign(new_token())
+
+        signer.sign(new_token())
+        assert_that(signer.verify(signed_token), not_(empty()))
+
+        signer.sign(new_token())
+        assert_that(
+            calling(signer.verify).with_args(signed_token),
+            raises(UnknownTokenException),
+        )
+        assert_that(signer.list_keys(), has_length(2))
+
+    def test_keys_are_shared_between_instances(self):
+        signed_token = self.signer.sign(new_token())
+
+        other_signer = self.new_signer()
+
+        assert_that(other_signer.verify(signed_token), not_(empty()))
+        assert_that(other_signer.list_keys(), equal_to(self.signer.list_keys()))
+
+    def test_keys_created_by_another_instance_are_reloaded(self):
+        other_signer = self.new_signer()
+        assert_that(other_signer.list_keys(), empty())
+
+        signed_token = self.signer.sign(new_token())
+
+        with patch('wazo_auth.signed_token.UNKNOWN_KEY_RELOAD_INTERVAL', 0):
+            assert_that(other_signer.verify(signed_token), not_(empty()))
+
+    def test_only_the_public_key_is_published(self):
+        header, claims, signature = self.signer.sign(new_token()).split('.')
+
+        (key,) = self.signer.list_keys()
+
+        assert_that(key, has_entries(kty='OKP', crv='Ed25519', alg='EdDSA'))
+        assert_that(key, not_(has_key('d')))
+        public_key = Ed25519PublicKey.from_public_bytes(_b64decode(key['x']))
+        public_key.verify(
+            _b64decode(signature), '{}.{}'.format(header, claims).encode('ascii')
+        )
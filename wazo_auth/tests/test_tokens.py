@@ -5,9 +5,19 @@ import unittest
 import time
 import uuid
 
-from hamcrest import assert_that, equal_to
+from hamcrest import (
+    assert_that,
+    calling,
+    equal_to,
+    has_entries,
+    not_,
+    raises,
+    same_instance,
+)
+from mock import MagicMock, Mock, patch
 
 from wazo_auth import token
+from wazo_auth.cache import LRUCache
 
 
 def new_uuid():
@@ -32,24 +42,28 @@ class TestToken(unittest.TestCase):
         self.user_agent = 'user-agent'
         self.remote_addr = '192.168.1.1'
 
-        self.token = token.Token(
-            self.id_,
-            auth_id=self.auth_id,
-            pbx_user_uuid=self.pbx_user_uuid,
-            xivo_uuid=self.xivo_uuid,
-            issued_t=self.issued_at,
-            expire_t=self.expires_at,
-            acl=self.acl,
-            metadata=self.metadata,
-            session_uuid=self.session_uuid,
-            user_agent=self.user_agent,
-            remote_addr=self.remote_addr,
-        )
+        self.token = self.new_token()
         self.utc_issued_at = '2016-11-24T18:17:51.535370'
         self.utc_expires_at = '2016-11-24T18:18:33.535370'
 
+    def new_token(self, **kwargs):
+        token_args = {
+            'auth_id': self.auth_id,
+            'pbx_user_uuid': self.pbx_user_uuid,
+            'xivo_uuid': self.xivo_uuid,
+            'issued_t': self.issued_at,
+            'expire_t': self.expires_at,
+            'acl': self.acl,
+            'metadata': self.metadata,
+            'session_uuid': self.session_uuid,
+            'user_agent': self.user_agent,
+            'remote_addr': self.remote_addr,
+        }
+        token_args.update(kwargs)
+        return token.Token(self.id_, **token_args)
+
     def test_matches_required_accesss_when_user_access_ends_with_hashtag(self):
-        self.token.acl = ['foo.bar.#']
+        self.token = self.new_token(acl=['foo.bar.#'])
 
         assert_that(self.token.matches_required_access('foo.bar'), equal_to(False))
         assert_that(self.token.matches_required_access('foo.bar.toto'))
@@ -59,7 +73,7 @@ class TestToken(unittest.TestCase):
         )
 
     def test_matches_required_accesss_when_user_access_has_not_special_character(self):
-        self.token.acl = ['foo.bar.toto']
+        self.token = self.new_token(acl=['foo.bar.toto'])
 
         assert_that(self.token.matches_required_access('foo.bar.toto'))
         assert_that(
@@ -70,7 +84,7 @@ class TestToken(unittest.TestCase):
         )
 
     def test_matches_required_accesss_when_user_access_has_asterisks(self):
-        self.token.acl = ['foo.*.*']
+        self.token = self.new_token(acl=['foo.*.*'])
 
         assert_that(self.token.matches_required_access('foo.bar.toto'))
         assert_that(
@@ -81,7 +95,7 @@ class TestToken(unittest.TestCase):
         )
 
     def test_matches_required_accesss_with_multiple_accesses(self):
-        self.token.acl = ['foo', 'foo.bar.toto', 'other.#']
+        self.token = self.new_token(acl=['foo', 'foo.bar.toto', 'other.#'])
 
         assert_that(self.token.matches_required_access('foo'))
         assert_that(self.token.matches_required_access('foo.bar'), equal_to(False))
@@ -92,7 +106,7 @@ class TestToken(unittest.TestCase):
         assert_that(self.token.matches_required_access('other.bar.toto'))
 
     def test_matches_required_accesss_when_user_access_has_hashtag_in_middle(self):
-        self.token.acl = ['foo.bar.#.titi']
+        self.token = self.new_token(acl=['foo.bar.#.titi'])
 
         assert_that(self.token.matches_required_access('foo.bar'), equal_to(False))
         assert_that(self.token.matches_required_access('foo.bar.toto'), equal_to(False))
@@ -102,8 +116,7 @@ class TestToken(unittest.TestCase):
         assert_that(self.token.matches_required_access('foo.bar.toto.tata.titi'))
 
     def test_matches_required_accesss_when_user_access_ends_with_me(self):
-        self.token.acl = ['foo.#.me']
-        self.token.auth_id = '123'
+        self.token = self.new_token(acl=['foo.#.me'], auth_id='123')
 
         assert_that(self.token.matches_required_access('foo.bar'), equal_to(False))
         assert_that(self.token.matches_required_access('foo.bar.me'), equal_to(True))
@@ -118,8 +131,7 @@ class TestToken(unittest.TestCase):
         )
 
     def test_matches_required_accesss_when_user_access_has_me_in_middle(self):
-        self.token.acl = ['foo.#.me.bar']
-        self.token.auth_id = '123'
+        self.token = self.new_token(acl=['foo.#.me.bar'], auth_id='123')
 
         assert_that(self.token.matches_required_access('foo.bar.123'), equal_to(False))
         assert_that(self.token.matches_required_access('foo.bar.me'), equal_to(False))
@@ -131,53 +143,481 @@ class TestToken(unittest.TestCase):
         assert_that(self.token.matches_required_access('foo.bar.toto.me.bar'))
 
     def test_does_not_match_required_accesss_when_negating(self):
-        self.token.acl = ['!foo.me.bar']
+        self.token = self.new_token(acl=['!foo.me.bar'])
 
         assert_that(self.token.matches_required_access('foo.me.bar'), equal_to(False))
 
     def test_does_not_match_required_accesss_when_negating_multiple_identical_accesses(
         self,
     ):
-        self.token.acl = ['foo.me.bar', '!foo.me.bar', 'foo.me.bar']
+        self.token = self.new_token(acl=['foo.me.bar', '!foo.me.bar', 'foo.me.bar'])
 
         assert_that(self.token.matches_required_access('foo.me.bar'), equal_to(False))
 
     def test_does_not_match_required_accesss_when_negating_ending_hashtag(self):
-        self.token.acl = ['!foo.me.bar.#', 'foo.me.bar.123']
+        self.token = self.new_token(acl=['!foo.me.bar.#', 'foo.me.bar.123'])
 
         assert_that(
             self.token.matches_required_access('foo.me.bar.123'), equal_to(False)
         )
 
     def test_does_not_match_required_accesss_when_negating_hashtag_sublevel(self):
-        self.token.acl = ['foo.#', '!foo.me.bar.#', 'foo.me.bar.123']
+        self.token = self.new_token(acl=['foo.#', '!foo.me.bar.#', 'foo.me.bar.123'])
 
         assert_that(
             self.token.matches_required_access('foo.me.bar.123'), equal_to(False)
         )
 
     def test_matches_required_access_when_negating_specific(self):
-        self.token.acl = ['foo.*.bar', '!foo.123.bar']
+        self.token = self.new_token(acl=['foo.*.bar', '!foo.123.bar'])
 
         assert_that(self.token.matches_required_access('foo.me.bar'))
         assert_that(self.token.matches_required_access('foo.123.bar'), equal_to(False))
 
     def test_does_not_match_required_access_when_negating_toplevel(self):
-        self.token.acl = ['!*.bar', 'foo.bar']
+        self.token = self.new_token(acl=['!*.bar', 'foo.bar'])
 
         assert_that(self.token.matches_required_access('foo.bar'), equal_to(False))
 
     def test_is_expired_when_time_is_in_the_future(self):
-        self.token.expire_t = time.time() + 60
+        self.token = self.new_token(expire_t=time.time() + 60)
 
         self.assertFalse(self.token.is_expired())
 
     def test_is_expired_when_time_is_in_the_past(self):
-        self.token.expire_t = time.time() - 60
+        self.token = self.new_token(expire_t=time.time() - 60)
 
         self.assertTrue(self.token.is_expired())
 
     def test_is_expired_when_no_expiration(self):
-        self.token.expire_t = None
+        self.token = self.new_token(expire_t=None)
 
         self.assertFalse(self.token.is_expired())
+
+    def test_is_immutable(self):
+        assert_that(
+            calling(setattr).with_args(self.token, 'acl', ['#']),
+            raises(AttributeError),
+        )
+        assert_that(
+            calling(setattr).with_args(self.token, 'other', 42),
+            raises(AttributeError),
+        )
+        assert_that(self.token.acl, equal_to(('confd',)))
+
+    def test_to_dict(self):
+        result = self.token.to_dict()
+
+        assert_that(
+            result,
+            has_entries(
+                token=self.id_,
+                auth_id=self.auth_id,
+                acl=['confd'],
+                acls=['confd'],
+                utc_issued_at=self.utc_issued_at,
+                utc_expires_at=self.utc_expires_at,
+                metadata=self.metadata,
+            ),
+        )
+
+    def test_to_dict_is_computed_once(self):
+        build_dict = self.token._build_dict
+        with patch.object(token.Token, '_build_dict') as build:
+            build.return_value = build_dict()
+            self.token.to_dict()
+            self.token.to_dict()
+
+        build.assert_called_once_with()
+
+    def test_that_modifying_to_dict_leaves_the_token_unchanged(self):
+        result_1 = self.token.to_dict()
+        result_1['token'] = 'modified'
+        result_1['acl'].append('#')
+        result_1['acls'].append('#')
+        result_1['metadata']['uuid'] = 'modified'
+        result_2 = self.token.to_dict()
+
+        assert_that(result_2, not_(same_instance(result_1)))
+        assert_that(
+            result_2,
+            has_entries(
+                token=self.id_, acl=['confd'], acls=['confd'], metadata=self.metadata
+            ),
+        )
+        assert_that(self.token.acl, equal_to(('confd',)))
+        assert_that(self.token.metadata, not_(has_entries(uuid='modified')))
+
+
+class TestTimingWheel(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000000.0
+        self.wheel = token.TimingWheel(resolution=1.0, now=self.now)
+
+    def test_timers_fire_at_their_deadline_on_each_level(self):
+        for delay in [1, 63, 64, 100, 4096, 5000, 300000]:
+            self.wheel.add(delay, self.now + delay - 0.5, 'payload')
+
+        for delay in [1, 63, 64, 100, 4096, 5000, 300000]:
+            assert_that(self.wheel.advance(self.now + delay - 1), equal_to([]))
+            assert_that(
+                self.wheel.advance(self.now + delay), equal_to([(delay, 'payload')])
+            )
+        assert_that(len(self.wheel), equal_to(0))
+
+    def test_that_a_past_deadline_fires_on_the_next_advance(self):
+        self.wheel.add('key', self.now - 10, 'payload')
+
+        assert_that(self.wheel.advance(self.now), equal_to([]))
+        assert_that(self.wheel.advance(self.now + 1), equal_to([('key', 'payload')]))
+
+    def test_remove(self):
+        self.wheel.add('key', self.now + 100)
+        self.wheel.remove('key')
+        self.wheel.remove('unknown')
+
+        assert_that(len(self.wheel), equal_to(0))
+        assert_that(self.wheel.advance(self.now + 200), equal_to([]))
+
+    def test_timers_fire_on_time_across_rollovers(self):
+        for i in range(1000):
+            self.wheel.add(i, self.now + i * 10 + 0.5, self.now + i * 10)
+
+        late = 0
+        for second in range(1, 10002):
+            for _, expire_t in self.wheel.advance(self.now + second):
+                if self.now + second - expire_t > 1:
+                    late += 1
+        assert_that(late, equal_to(0))
+        assert_that(len(self.wheel), equal_to(0))
+
+    def test_remove_after_a_cascade(self):
+        self.wheel.add('key', self.now + 5000)
+        self.wheel.advance(self.now + 4990)
+
+        self.wheel.remove('key')
+
+        assert_that(len(self.wheel), equal_to(0))
+        assert_that(self.wheel.advance(self.now + 5100), equal_to([]))
+
+    def test_add_replaces_the_previous_timer(self):
+        self.wheel.add('key', self.now + 10, 'first')
+        self.wheel.add('key', self.now + 20, 'second')
+
+        assert_that(self.wheel.advance(self.now + 10), equal_to([]))
+        assert_that(self.wheel.advance(self.now + 20), equal_to([('key', 'second')]))
+
+
+class TestExpiryScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = token.ExpiryScheduler(notice_delay=60)
+
+    def test_notice_then_expire(self):
+        now = time.time()
+        self.scheduler.schedule('token', now + 120, now=now)
+
+        assert_that(self.scheduler.due(now + 59), equal_to(([], [])))
+        assert_that(self.scheduler.due(now + 61), equal_to((['token'], [])))
+        assert_that(self.scheduler.due(now + 119), equal_to(([], [])))
+        assert_that(self.scheduler.due(now + 121), equal_to(([], ['token'])))
+        assert_that(len(self.scheduler), equal_to(0))
+
+    def test_that_a_token_expiring_soon_is_only_scheduled_for_expiration(self):
+        now = time.time()
+        self.scheduler.schedule('token', now + 30, now=now)
+
+        assert_that(self.scheduler.due(now + 31), equal_to(([], ['token'])))
+
+    def test_cancel(self):
+        now = time.time()
+        self.scheduler.schedule('token', now + 120, now=now)
+        self.scheduler.cancel('token')
+
+        assert_that(self.scheduler.due(now + 121), equal_to(([], [])))
+
+
+class TestSweeperLease(unittest.TestCase):
+    def setUp(self):
+        self.lease = token.SweeperLease('wazo-auth:node-1')
+        self.engine = self.lease._engine = MagicMock()
+        self.connection = self.engine.connect.return_value
+
+    def test_acquire(self):
+        self.connection.execute.return_value.scalar.return_value = True
+
+        assert_that(self.lease.acquire(), equal_to(True))
+        assert_that(self.lease.held, equal_to(True))
+        assert_that(self.lease.acquire(), equal_to(True))
+        self.engine.connect.assert_called_once_with()
+
+    def test_acquire_when_held_by_another_node(self):
+        self.connection.execute.return_value.scalar.return_value = False
+
+        assert_that(self.lease.acquire(), equal_to(False))
+        assert_that(self.lease.held, equal_to(False))
+        self.connection.close.assert_called_once_with()
+
+    def test_acquire_after_losing_the_connection(self):
+        self.lease._connection = lost = Mock()
+        lost.execute.side_effect = Exception('connection lost')
+        self.connection.execute.return_value.scalar.return_value = False
+
+        assert_that(self.lease.acquire(), equal_to(False))
+        lost.close.assert_called_once_with()
+
+    def test_provide_status(self):
+        self.connection.execute.return_value.scalar.side_effect = [
+            False,
+            'wazo-auth:node-2',
+        ]
+        self.lease.acquire()
+        self.engine.reset_mock()
+        status = {}
+
+        self.lease.provide_status(status)
+
+        assert_that(
+            status,
+            has_entries(
+                expired_token_remover=has_entries(
+                    lease_held=False, lease_holder='wazo-auth:node-2'
+                )
+            ),
+        )
+        self.engine.connect.assert_not_called()
+
+    def test_provide_status_when_held(self):
+        self.connection.execute.return_value.scalar.return_value = True
+        self.lease.acquire()
+        status = {}
+
+        self.lease.provide_status(status)
+
+        assert_that(
+            status,
+            has_entries(
+                expired_token_remover=has_entries(
+                    lease_held=True, lease_holder='wazo-auth:node-1'
+                )
+            ),
+        )
+
+
+class TestExpiredTokenRemover(unittest.TestCase):
+    def setUp(self):
+        self.dao = Mock()
+        self.bus_publisher = Mock()
+        self.token_cache = LRUCache(max_size=10)
+        self.config = {
+            'token_cleanup_interval': 60.0,
+            'token_cleanup_batch_size': 2,
+            'token_partitioning': {'enabled': False},
+            'debug': False,
+        }
+        self.remover = token.ExpiredTokenRemover(
+            self.config, self.dao, self.bus_publisher, self.token_cache
+        )
+
+    @patch('wazo_auth.token.Session', Mock())
+    def test_tokens_cleanup_in_batches(self):
+        batches = [
+            ([self._token('a', 's1'), self._token('b', 's2')], [{'uuid': 's1'}]),
+            ([self._token('c', 's2')], [{'uuid': 's2'}]),
+        ]
+        self.dao.token.delete_expired_tokens_and_sessions.side_effect = batches
+        self.token_cache.set('a', 'cached')
+
+        self.remover._tokens_cleanup(deadline=time.monotonic() + 60)
+
+        assert_that(
+            self.dao.token.delete_expired_tokens_and_sessions.call_count, equal_to(2)
+        )
+        assert_that(self.token_cache.get('a'), equal_to(None))
+        assert_that(self.bus_publisher.publish.call_count, equal_to(2))
+
+    @patch('wazo_auth.token.Session', Mock())
+    def test_tokens_cleanup_stops_at_the_deadline(self):
+        batch = [self._token('a', 's1'), self._token('b', 's2')], []
+        self.dao.token.delete_expired_tokens_and_sessions.return_value = batch
+
+        self.remover._tokens_cleanup(deadline=time.monotonic())
+
+        self.dao.token.delete_expired_tokens_and_sessions.assert_called_once_with(
+            2, token_uuids=None
+        )
+
+    @patch('wazo_auth.token.Session', Mock())
+    def test_tokens_cleanup_cancels_the_timers_of_the_removed_tokens(self):
+        scheduler = Mock()
+        config = dict(
+            self.config,
+            expiry_wheel={'resolution': 0.01, 'safety_net_interval': 600},
+        )
+        remover = token.ExpiredTokenRemover(
+            config, self.dao, self.bus_publisher, expiry_scheduler=scheduler
+        )
+        batch = [self._token('a', 's1')], [{'uuid': 's1'}]
+        self.dao.token.delete_expired_tokens_and_sessions.return_value = batch
+
+        remover._tokens_cleanup(deadline=time.monotonic() + 60)
+
+        scheduler.cancel.assert_called_once_with('a')
+
+    def test_publish_event(self):
+        tokens = [self._token('a', 's1'), self._token('b', 's2')]
+        sessions = [{'uuid': 's2'}, {'uuid': 's3'}]
+        event_class = Mock()
+
+        self.remover._publish_event(tokens, sessions, event_class)
+
+        event_class.assert_any_call(uuid='s2', user_uuid='alice', tenant_uuid='tenant')
+        event_class.assert_any_call(uuid='s3', user_uuid=None, tenant_uuid=None)
+        assert_that(self.bus_publisher.publish.call_count, equal_to(2))
+
+    @patch('wazo_auth.token.Session', Mock())
+    def test_wait_runs_the_due_cleanup_and_notice(self):
+        scheduler = Mock()
+        scheduler.due.side_effect = [(['a'], []), ([], ['b'])]
+        config = {
+            'token_cleanup_interval': 60.0,
+            'token_cleanup_batch_size': 2,
+            'token_partitioning': {'enabled': False},
+            'expiry_wheel': {'resolution': 0.01, 'safety_net_interval': 600},
+            'debug': False,
+        }
+        remover = token.ExpiredTokenRemover(
+            config, self.dao, self.bus_publisher, expiry_scheduler=scheduler
+        )
+        self.dao.token.mark_tokens_and_sessions_that_expire_soon.return_value = [], []
+        self.dao.token.delete_expired_tokens_and_sessions.return_value = [], []
+
+        remover._wait(time.monotonic() + 0.015)
+
+        self.dao.token.mark_tokens_and_sessions_that_expire_soon.assert_called_once_with(
+            60.0, token_uuids=['a']
+        )
+        self.dao.token.delete_expired_tokens_and_sessions.assert_called_once_with(
+            2, token_uuids=['b']
+        )
+
+    @patch('wazo_auth.token.Session', Mock())
+    def test_wait_ignores_the_due_timers_without_the_lease(self):
+        scheduler = Mock()
+        scheduler.due.return_value = ['a'], ['b']
+        lease = Mock(held=False)
+        config = {
+            'token_cleanup_interval': 60.0,
+            'token_cleanup_batch_size': 2,
+            'token_partitioning': {'enabled': False},
+            'expiry_wheel': {'resolution': 0.01, 'safety_net_interval': 600},
+            'debug': False,
+        }
+        remover = token.ExpiredTokenRemover(
+            config,
+            self.dao,
+            self.bus_publisher,
+            expiry_scheduler=scheduler,
+            lease=lease,
+        )
+
+        remover._wait(time.monotonic() + 0.015)
+
+        scheduler.due.assert_called()
+        self.dao.token.mark_tokens_and_sessions_that_expire_soon.assert_not_called()
+        self.dao.token.delete_expired_tokens_and_sessions.assert_not_called()
+
+    def test_that_only_the_lease_holder_sweeps(self):
+        lease = Mock()
+
+        def acquire():
+            remover._tombstone.set()
+            return False
+
+        lease.acquire.side_effect = acquire
+        remover = token.ExpiredTokenRemover(
+            self.config, self.dao, self.bus_publisher, lease=lease
+        )
+        remover._sweep = Mock()
+
+        remover._loop()
+
+        remover._sweep.assert_not_called()
+        lease.release.assert_called_once_with()
+
+    def test_that_the_lease_holder_sweeps(self):
+        lease = Mock()
+
+        def acquire():
+            remover._tombstone.set()
+            return True
+
+        lease.acquire.side_effect = acquire
+        remover = token.ExpiredTokenRemover(
+            self.config, self.dao, self.bus_publisher, lease=lease
+        )
+        remover._sweep = Mock()
+
+        remover._loop()
+
+        remover._sweep.assert_called_once()
+
+    def test_missing_partitions(self):
+        config = {
+            'token_cleanup_interval': 60.0,
+            'token_cleanup_batch_size': 2,
+            'token_partitioning': {
+                'enabled': True,
+                'interval': 3600,
+                'precreated_partitions': 2,
+            },
+            'debug': False,
+        }
+        remover = token.ExpiredTokenRemover(config, self.dao, self.bus_publisher)
+        partitions = [{'name': 'auth_token_p3600', 'start': 3600, 'end': 7200}]
+
+        result = remover._missing_partitions(partitions, now=5000)
+
+        assert_that(list(result), equal_to([(7200, 10800), (10800, 14400)]))
+
+    @patch('wazo_auth.token.Session', Mock())
+    def test_partitions_maintenance(self):
+        config = {
+            'token_cleanup_interval': 60.0,
+            'token_cleanup_batch_size': 2,
+            'token_partitioning': {
+                'enabled': True,
+                'interval': 3600,
+                'precreated_partitions': 0,
+            },
+            'debug': False,
+        }
+        remover = token.ExpiredTokenRemover(
+            config, self.dao, self.bus_publisher, self.token_cache
+        )
+        now = int(time.time()) // 3600 * 3600
+        self.dao.token.is_partitioned.return_value = True
+        self.dao.token.lock_partitions.return_value = True
+        self.dao.token.list_partitions.return_value = [
+            {'name': 'expired', 'start': now - 3600, 'end': now},
+        ]
+        self.dao.token.drop_partition.return_value = (
+            [self._token('a', 's1')],
+            [{'uuid': 's1'}],
+        )
+        self.token_cache.set('a', 'cached')
+
+        remover._partitions_maintenance()
+
+        self.dao.token.create_partition.assert_called_once_with(now, now + 3600)
+        self.dao.token.drop_partition.assert_called_once_with('expired')
+        assert_that(self.token_cache.get('a'), equal_to(None))
+        assert_that(self.bus_publisher.publish.call_count, equal_to(1))
+
+    @staticmethod
+    def _token(uuid, session_uuid):
+        return {
+            'uuid': uuid,
+            'auth_id': 'alice',
+            'session_uuid': session_uuid,
+            'tenant_uuid': 'tenant',
+        }
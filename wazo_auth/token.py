@@ -1,17 +1,23 @@
 # Copyright 2015-2020 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import copy
 import logging
+import math
 import os
-import re
+import socket
 import time
 import threading
 
 from datetime import datetime
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
 
 from xivo_bus.resources.auth.events import SessionDeletedEvent, SessionExpireSoonEvent
 
-from wazo_auth.database.helpers import Session
+from wazo_auth.access import get_access_check
+from wazo_auth.cache import LRUCache
+from wazo_auth.database.helpers import Session, use_background_engine
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +25,23 @@ DEFAULT_XIVO_UUID = os.getenv('XIVO_UUID')
 
 
 class Token:
+    __slots__ = (
+        'token',
+        'auth_id',
+        'pbx_user_uuid',
+        'xivo_uuid',
+        'issued_t',
+        'expire_t',
+        'acl',
+        'metadata',
+        'session_uuid',
+        'user_agent',
+        'remote_addr',
+        'refresh_token',
+        '_dict',
+        '_access_check',
+    )
+
     def __init__(
         self,
         id_,
@@ -34,18 +57,27 @@ class Token:
         remote_addr,
         refresh_token=None,
     ):
-        self.token = id_
-        self.auth_id = auth_id
-        self.pbx_user_uuid = pbx_user_uuid
-        self.xivo_uuid = xivo_uuid
-        self.issued_t = issued_t
-        self.expire_t = expire_t
-        self.acl = acl
-        self.metadata = metadata
-        self.session_uuid = session_uuid
-        self.user_agent = user_agent
-        self.remote_addr = remote_addr
-        self.refresh_token = refresh_token
+        set_ = super().__setattr__
+        set_('token', id_)
+        set_('auth_id', auth_id)
+        set_('pbx_user_uuid', pbx_user_uuid)
+        set_('xivo_uuid', xivo_uuid)
+        set_('issued_t', issued_t)
+        set_('expire_t', expire_t)
+        set_('acl', tuple(acl))
+        set_('metadata', metadata)
+        set_('session_uuid', session_uuid)
+        set_('user_agent', user_agent)
+        set_('remote_addr', remote_addr)
+        set_('refresh_token', refresh_token)
+        set_('_dict', None)
+        set_('_access_check', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Token is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('Token is immutable')
 
     def __eq__(self, other):
         return (
@@ -78,6 +110,17 @@ class Token:
         return datetime.utcfromtimestamp(t).isoformat()
 
     def to_dict(self):
+        if self._dict is None:
+            super().__setattr__('_dict', self._build_dict())
+        # Only the formatted values are shared, the callers get their own
+        # copy of the nested containers
+        result = dict(self._dict)
+        result['acls'] = list(self.acl)
+        result['acl'] = list(self.acl)
+        result['metadata'] = copy.deepcopy(self.metadata)
+        return result
+
+    def _build_dict(self):
         result = {
             'token': self.token,
             'auth_id': self.auth_id,
@@ -87,9 +130,6 @@ class Token:
             'expires_at': self._format_local_time(self.expire_t),
             'utc_issued_at': self._format_utc_time(self.issued_t),
             'utc_expires_at': self._format_utc_time(self.expire_t),
-            'acls': self.acl,
-            'acl': self.acl,
-            'metadata': self.metadata,
             'session_uuid': self.session_uuid,
             'remote_addr': self.remote_addr,
             'user_agent': self.user_agent,
@@ -105,51 +145,283 @@ class Token:
         if required_access is None:
             return True
 
-        positive_user_acl = set()
-        negative_user_acl = set()
-
-        for user_access in self.acl:
-            if user_access.startswith('!'):
-                negative_user_acl.add(user_access[1:])
+        return self._get_access_check().matches_required_access(required_access)
+
+    def matches_required_accesses(self, required_accesses):
+        return self._get_access_check().matches_required_accesses(required_accesses)
+
+    def _get_access_check(self):
+        if self._access_check is None:
+            access_check = get_access_check(self.auth_id, self.acl)
+            super().__setattr__('_access_check', access_check)
+        return self._access_check
+
+
+class TokenAccess(Token):
+    """The fields of a token needed to check its access, fetched by HEAD /token
+
+    The other fields are None, it is cached as a token but a full token is
+    fetched when one is required.
+    """
+
+    __slots__ = ()
+
+
+class TimingWheel:
+    """A hierarchical timing wheel
+
+    Level 0 has one slot per tick, each level above covers a whole turn of the
+    level below in each slot. Timers are moved down to a lower level when the
+    wheel reaches their slot, adding, removing and firing a timer is O(1).
+    """
+
+    _bits = 6
+    _slots = 1 << _bits
+    _mask = _slots - 1
+    _levels = 4
+
+    def __init__(self, resolution=1.0, now=None):
+        self._resolution = resolution
+        self._current_tick = self._tick(time.time() if now is None else now)
+        self._wheels = [[{} for _ in range(self._slots)] for _ in range(self._levels)]
+        self._locations = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._locations)
+
+    def add(self, key, deadline, payload=None):
+        with self._lock:
+            self._remove(key)
+            # Rounded up, a timer never fires before its deadline
+            tick = max(math.ceil(deadline / self._resolution), self._current_tick + 1)
+            self._add(key, tick, payload)
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def advance(self, now):
+        """returns the (key, payload) of the timers expired at now"""
+        fired = []
+        target_tick = self._tick(now)
+        with self._lock:
+            while self._current_tick < target_tick:
+                self._current_tick += 1
+                for level in range(1, self._levels):
+                    if self._current_tick & ((1 << (self._bits * level)) - 1):
+                        break
+                    self._cascade(level)
+                fired.extend(self._pop(0, self._current_tick & self._mask))
+        return fired
+
+    def _tick(self, t):
+        return int(t // self._resolution)
+
+    def _add(self, key, tick, payload):
+        # Timers beyond the last level wait in its furthest slot
+        span = 1 << (self._bits * self._levels)
+        placement = min(tick, self._current_tick + span - 1)
+        delta = placement - self._current_tick
+        level = 0
+        while delta >= 1 << (self._bits * (level + 1)):
+            level += 1
+        slot = (placement >> (self._bits * level)) & self._mask
+        self._wheels[level][slot][key] = (tick, payload)
+        self._locations[key] = level, slot
+
+    def _cascade(self, level):
+        slot = (self._current_tick >> (self._bits * level)) & self._mask
+        timers = self._wheels[level][slot]
+        self._wheels[level][slot] = {}
+        for key, (tick, payload) in timers.items():
+            self._add(key, tick, payload)
+
+    def _pop(self, level, slot):
+        timers = self._wheels[level][slot]
+        self._wheels[level][slot] = {}
+        for key in timers:
+            del self._locations[key]
+        return [(key, payload) for key, (_, payload) in timers.items()]
+
+    def _remove(self, key):
+        location = self._locations.pop(key, None)
+        if location:
+            level, slot = location
+            del self._wheels[level][slot][key]
+
+
+class ExpiryScheduler:
+    """Schedules the expire soon notice and the removal of each token
+
+    Each token has a single timer, set at the notice time and then moved to
+    the expiration time when the notice is due.
+    """
+
+    NOTICE = 'notice'
+    EXPIRE = 'expire'
+
+    def __init__(self, notice_delay, resolution=1.0):
+        self._notice_delay = notice_delay
+        self._wheel = TimingWheel(resolution)
+
+    def __len__(self):
+        return len(self._wheel)
+
+    def schedule(self, token_uuid, expire_t, now=None):
+        now = time.time() if now is None else now
+        notice_t = expire_t - self._notice_delay
+        if notice_t > now:
+            self._wheel.add(token_uuid, notice_t, (self.NOTICE, expire_t))
+        else:
+            self._wheel.add(token_uuid, expire_t, (self.EXPIRE, expire_t))
+
+    def cancel(self, token_uuid):
+        self._wheel.remove(token_uuid)
+
+    def provide_status(self, status):
+        status['expiry_scheduler'] = {'timers': len(self._wheel)}
+
+    def due(self, now=None):
+        """returns the uuids of the tokens due for the notice and the removal"""
+        now = time.time() if now is None else now
+        notice, expire = [], []
+        for token_uuid, (stage, expire_t) in self._wheel.advance(now):
+            if stage == self.NOTICE:
+                notice.append(token_uuid)
+                self._wheel.add(token_uuid, expire_t, (self.EXPIRE, expire_t))
             else:
-                positive_user_acl.add(user_access)
+                expire.append(token_uuid)
+        return notice, expire
+
+
+class SweeperLease:
+    """Elects a single expired token remover among the nodes of a cluster
+
+    The lease is a PostgreSQL advisory lock held on a dedicated connection,
+    it is released by the database when the connection of the holder is lost.
+    The connection's application_name identifies the holder. The status
+    reports the holder found by the last failed acquisition, it does not
+    query the database.
+    """
+
+    _lock_keys = {'namespace': 0x77617A6F, 'id': 1}
+    _holder_query = text(
+        'SELECT a.application_name FROM pg_locks l '
+        'JOIN pg_stat_activity a ON a.pid = l.pid '
+        "WHERE l.locktype = 'advisory' AND l.granted "
+        'AND l.classid = :namespace AND l.objid = :id AND l.objsubid = 2'
+    )
+
+    def __init__(self, name=None):
+        default_name = 'wazo-auth:{}:{}'.format(socket.gethostname(), os.getpid())
+        self.name = (name or default_name)[:63]
+        self._engine = None
+        self._connection = None
+        self._holder = None
+
+    @property
+    def held(self):
+        return self._connection is not None
+
+    def acquire(self):
+        """returns True when this node holds the lease"""
+        if self._connection is not None:
+            try:
+                self._connection.execute('SELECT 1')
+                return True
+            except Exception:
+                logger.warning('lost the expired token remover lease')
+                self.release()
+
+        try:
+            connection = self._get_engine().connect()
+        except Exception:
+            logger.warning('failed to connect to acquire the lease', exc_info=True)
+            return False
 
-        for negative_access in negative_user_acl:
-            negative_access_regex = self._transform_access_to_regex(negative_access)
-            if re.match(negative_access_regex, required_access):
-                return False
+        try:
+            query = text('SELECT pg_try_advisory_lock(:namespace, :id)')
+            acquired = connection.execute(query, **self._lock_keys).scalar()
+        except Exception:
+            acquired = False
 
-        for positive_access in positive_user_acl:
-            positive_access_regex = self._transform_access_to_regex(positive_access)
-            if re.match(positive_access_regex, required_access):
-                return True
-        return False
+        if not acquired:
+            self._holder = self._find_holder(connection)
+            connection.close()
+            return False
 
-    def _transform_access_to_regex(self, access):
-        access_regex = re.escape(access)
-        access_regex = access_regex.replace('\\*', '[^.]*?').replace('\\#', '.*?')
-        access_regex = self._transform_access_me_to_uuid_or_me(access_regex)
-        return re.compile('^{}$'.format(access_regex))
+        logger.info('%s holds the expired token remover lease', self.name)
+        self._connection = connection
+        self._holder = self.name
+        return True
 
-    def _transform_access_me_to_uuid_or_me(self, access_regex):
-        access_regex = access_regex.replace(
-            '\\.me\\.', '\\.(me|{auth_id})\\.'.format(auth_id=self.auth_id)
-        )
-        if access_regex.endswith('\\.me'):
-            access_regex = '{access_start}\\.(me|{auth_id})'.format(
-                access_start=access_regex[:-4],
-                auth_id=self.auth_id,
+    def release(self):
+        if self._connection is None:
+            return
+
+        try:
+            self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+        self._holder = None
+
+    def provide_status(self, status):
+        status['expired_token_remover'] = {
+            'lease_held': self.held,
+            'lease_holder': self._holder,
+        }
+
+    def _find_holder(self, connection):
+        try:
+            return connection.execute(self._holder_query, **self._lock_keys).scalar()
+        except Exception:
+            return None
+
+    def _get_engine(self):
+        if self._engine is None:
+            self._engine = create_engine(
+                Session.get_bind().url,
+                poolclass=NullPool,
+                connect_args={'application_name': self.name},
             )
-        return access_regex
+        return self._engine
 
 
 class ExpiredTokenRemover:
-    def __init__(self, config, dao, bus_publisher):
+    def __init__(
+        self,
+        config,
+        dao,
+        bus_publisher,
+        token_cache=None,
+        expiry_scheduler=None,
+        lease=None,
+    ):
         self._dao = dao
         self._bus_publisher = bus_publisher
+        self._token_cache = token_cache or LRUCache(max_size=0)
+        self._expiry_scheduler = expiry_scheduler
+        self._lease = lease
         self._cleanup_interval = config['token_cleanup_interval']
+        self._batch_size = config['token_cleanup_batch_size']
         self._debug = config['debug']
 
+        # With a scheduler, the periodic sweep only catches the tokens created
+        # by other nodes or before the scheduler was loaded
+        self._sweep_interval = self._cleanup_interval
+        if expiry_scheduler:
+            self._sweep_interval = config['expiry_wheel']['safety_net_interval']
+            self._poll_interval = config['expiry_wheel']['resolution']
+
+        self._partition_interval = None
+        if config['token_partitioning']['enabled']:
+            self._partition_interval = config['token_partitioning']['interval']
+            self._precreated_partitions = config['token_partitioning'][
+                'precreated_partitions'
+            ]
+
         self._tombstone = threading.Event()
         self._thread = threading.Thread(target=self._loop)
         self._thread.daemon = True
@@ -163,44 +435,165 @@ class ExpiredTokenRemover:
         self._tombstone.clear()
 
     def _loop(self):
+        use_background_engine()
+        expirations_loaded = False
+
         while not self._tombstone.is_set():
             started = time.monotonic()
 
-            self._tokens_cleanup()
-            self._tokens_notice()
+            # Only the lease holder sweeps, the other nodes take over when the
+            # holder's connection is lost
+            if self._lease is None or self._lease.acquire():
+                if self._expiry_scheduler and not expirations_loaded:
+                    self._load_expirations()
+                    expirations_loaded = True
+                self._sweep(started)
+            else:
+                expirations_loaded = False
 
-            elapsed = time.monotonic() - started
+            self._wait(started + self._sweep_interval)
 
-            if elapsed >= self._cleanup_interval:
-                log_level = logging.WARNING
-            else:
-                log_level = logging.DEBUG
-            logger.log(log_level, "ExpiredTokenRemover tooks %s seconds", elapsed)
+        if self._lease:
+            self._lease.release()
+
+    def _sweep(self, started):
+        if self._partition_interval:
+            self._partitions_maintenance()
+
+        # With a backlog, the whole interval is spent removing tokens and
+        # the next iteration starts immediately
+        self._tokens_cleanup(deadline=started + self._cleanup_interval)
+        self._tokens_notice()
+
+        elapsed = time.monotonic() - started
+
+        if elapsed >= self._cleanup_interval:
+            log_level = logging.WARNING
+        else:
+            log_level = logging.DEBUG
+        logger.log(log_level, "ExpiredTokenRemover tooks %s seconds", elapsed)
+
+    def _wait(self, until):
+        if not self._expiry_scheduler:
+            remaining = until - time.monotonic()
+            if remaining > 0:
+                self._tombstone.wait(remaining)
+            return
+
+        while time.monotonic() < until:
+            if self._tombstone.wait(self._poll_interval):
+                return
+            # The wheel is advanced on every node to drop the timers of the
+            # tokens created here, only the lease holder acts on them
+            notice, expire = self._expiry_scheduler.due()
+            if self._lease is not None and not self._lease.held:
+                continue
+            # Only the due tokens are queried, the others are left to the sweep
+            if expire:
+                self._tokens_cleanup(
+                    deadline=time.monotonic() + self._cleanup_interval,
+                    token_uuids=expire,
+                )
+            if notice:
+                self._tokens_notice(token_uuids=notice)
 
-            if elapsed < self._cleanup_interval:
-                self._tombstone.wait(self._cleanup_interval - elapsed)
+    def _load_expirations(self):
+        loaded = 0
+        try:
+            for token_uuid, expire_t in self._dao.token.list_expirations():
+                self._expiry_scheduler.schedule(token_uuid, expire_t)
+                loaded += 1
+        except Exception:
+            logger.warning('failed to load token expirations', exc_info=self._debug)
+        finally:
+            Session.close()
+        logger.debug('scheduled the expiration of %s tokens', loaded)
 
-    def _tokens_cleanup(self):
+    def _partitions_maintenance(self):
+        now = int(time.time())
+        expired = []
         try:
-            tokens, sessions = self._dao.token.delete_expired_tokens_and_sessions()
+            if not self._dao.token.is_partitioned():
+                logger.warning('auth_token is not partitioned, maintenance disabled')
+                self._partition_interval = None
+                return
+            # Only one node maintains the partitions at a time
+            if self._dao.token.lock_partitions():
+                partitions = self._dao.token.list_partitions()
+                for start, end in self._missing_partitions(partitions, now):
+                    self._dao.token.create_partition(start, end)
+                expired = [p['name'] for p in partitions if p['end'] <= now]
             Session.commit()
         except Exception:
             Session.rollback()
-            logger.warning(
-                'failed to remove expired tokens and sessions', exc_info=self._debug
-            )
+            logger.warning('failed to create token partitions', exc_info=self._debug)
             return
         finally:
             Session.close()
 
-        self._publish_event(tokens, sessions, SessionDeletedEvent)
+        for name in expired:
+            try:
+                if not self._dao.token.lock_partitions():
+                    return
+                tokens, sessions = self._dao.token.drop_partition(name)
+                Session.commit()
+            except Exception:
+                Session.rollback()
+                logger.warning(
+                    'failed to drop token partition %s', name, exc_info=self._debug
+                )
+                return
+            finally:
+                Session.close()
+
+            self._forget(tokens)
+            self._publish_event(tokens, sessions, SessionDeletedEvent)
+            logger.debug('dropped token partition %s', name)
+
+    def _missing_partitions(self, partitions, now):
+        first = now // self._partition_interval * self._partition_interval
+        for i in range(self._precreated_partitions + 1):
+            start = first + i * self._partition_interval
+            end = start + self._partition_interval
+            if not any(p['start'] < end and p['end'] > start for p in partitions):
+                yield start, end
+
+    def _tokens_cleanup(self, deadline, token_uuids=None):
+        removed = 0
+        while not self._tombstone.is_set():
+            try:
+                tokens, sessions = self._dao.token.delete_expired_tokens_and_sessions(
+                    self._batch_size, token_uuids=token_uuids
+                )
+                Session.commit()
+            except Exception:
+                Session.rollback()
+                logger.warning(
+                    'failed to remove expired tokens and sessions', exc_info=self._debug
+                )
+                return
+            finally:
+                Session.close()
+
+            self._forget(tokens)
+            self._publish_event(tokens, sessions, SessionDeletedEvent)
+
+            removed += len(tokens)
+            if len(tokens) < self._batch_size:
+                return
+            if time.monotonic() >= deadline:
+                logger.info('removed %s expired tokens, more are remaining', removed)
+                return
 
-    def _tokens_notice(self):
+    def _tokens_notice(self, token_uuids=None):
         try:
-            tokens, sessions = self._dao.token.get_tokens_and_session_that_expire_soon(
-                self._cleanup_interval
+            token_dao = self._dao.token
+            tokens, sessions = token_dao.mark_tokens_and_sessions_that_expire_soon(
+                self._cleanup_interval, token_uuids=token_uuids
             )
+            Session.commit()
         except Exception:
+            Session.rollback()
             logger.warning(
                 'failed to get tokens and sessions that expire soon',
                 exc_info=self._debug,
@@ -211,18 +604,25 @@ class ExpiredTokenRemover:
 
         self._publish_event(tokens, sessions, SessionExpireSoonEvent)
 
+    def _forget(self, tokens):
+        # The timers of the tokens removed by the sweep would fire for nothing
+        for token in tokens:
+            self._token_cache.delete(token['uuid'])
+            if self._expiry_scheduler:
+                self._expiry_scheduler.cancel(token['uuid'])
+
     def _publish_event(self, tokens, sessions, event_class):
+        tokens_by_session = {token['session_uuid']: token for token in tokens}
         for session in sessions:
             event_args = {
                 'uuid': session['uuid'],
                 'user_uuid': None,
                 'tenant_uuid': None,
             }
-            for token in tokens:
-                if token['session_uuid'] == session['uuid']:
-                    event_args['user_uuid'] = token['auth_id']
-                    event_args['tenant_uuid'] = token['metadata'].get('tenant_uuid')
-                    break
+            token = tokens_by_session.get(session['uuid'])
+            if token:
+                event_args['user_uuid'] = token['auth_id']
+                event_args['tenant_uuid'] = token['tenant_uuid']
             else:
                 logger.warning(
                     'session without token associated: {}'.format(session['uuid'])